@@ -7,6 +7,7 @@ from jose import JWTError, jwt
 from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import decode_token
+from app.core.token_revocation import revocation_store
 from app.models.user import User
 from app.services.user_service import get_user_by_email
 
@@ -24,7 +25,11 @@ async def get_current_user(
     )
     
     payload = decode_token(token)
-    if payload is None:
+    if payload is None or payload.get("type") == "refresh":
+        raise credentials_exception
+    
+    session_id = payload.get("sid")
+    if session_id and await revocation_store.is_session_revoked(session_id):
         raise credentials_exception
     
     email: str = payload.get("sub")
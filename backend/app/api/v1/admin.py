@@ -3,9 +3,7 @@ from fastapi import APIRouter, Depends, Query, HTTPException, File, UploadFile,
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case, extract, or_
 from datetime import datetime, timedelta
-import json
 import os
-from pathlib import Path
 
 from app.api import deps
 from app.models.user import User, UserRole
@@ -20,6 +18,7 @@ from app.schemas.content import (
 from app.schemas.report import (
     ReportGenerateRequest, ReportResponse, ReportListResponse, ReportProgressResponse
 )
+from app.services.system_settings import load_settings, save_settings
 from app.tasks.report_tasks import generate_report_task
 
 router = APIRouter()
@@ -287,71 +286,6 @@ async def get_analytics(
     }
 
 
-# Settings file path
-SETTINGS_FILE = Path("/app/config/system_settings.json")
-
-
-def load_settings() -> dict:
-    """Load system settings from file"""
-    if SETTINGS_FILE.exists():
-        with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    else:
-        # Return default settings
-        return {
-            "general": {
-                "siteName": "AI Tutor System",
-                "siteDescription": "AI 기반 교육 챗봇 시스템",
-                "maintenanceMode": False,
-                "allowRegistration": True,
-                "defaultUserRole": "user",
-                "sessionTimeout": 60
-            },
-            "ai": {
-                "defaultModel": "claude-3-sonnet",
-                "maxTokens": 4000,
-                "temperature": 0.7,
-                "ragEnabled": True,
-                "ragTopK": 5,
-                "streamingEnabled": True
-            },
-            "security": {
-                "passwordMinLength": 8,
-                "passwordRequireUppercase": True,
-                "passwordRequireNumbers": True,
-                "passwordRequireSpecial": True,
-                "maxLoginAttempts": 5,
-                "lockoutDuration": 30,
-                "twoFactorEnabled": False
-            },
-            "notifications": {
-                "emailEnabled": False,
-                "emailHost": "",
-                "emailPort": 587,
-                "emailUsername": "",
-                "emailFromAddress": "",
-                "slackEnabled": False,
-                "slackWebhookUrl": ""
-            },
-            "storage": {
-                "maxFileSize": 10,
-                "allowedFileTypes": ["pdf", "docx", "txt", "md"],
-                "storageQuota": 50,
-                "autoCleanupEnabled": False,
-                "cleanupAfterDays": 90
-            }
-        }
-
-
-def save_settings(settings_data: dict):
-    """Save system settings to file"""
-    # Create directory if it doesn't exist
-    SETTINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(settings_data, f, indent=2, ensure_ascii=False)
-
-
 @router.get("/settings", response_model=dict)
 async def get_system_settings(
     *,
@@ -395,6 +329,27 @@ async def clear_cache(
     return {"message": "Cache cleared successfully", "timestamp": datetime.utcnow()}
 
 
+@router.post("/rag/deduplicate", response_model=dict)
+async def deduplicate_rag_index(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_super_admin_user)
+) -> Any:
+    """
+    Collapse chunks ingested more than once for the same document.
+    Requires super_admin role.
+    """
+    from app.services import rag_document_service
+    from app.services.vector_service import vector_service
+    
+    try:
+        result = await vector_service.deduplicate()
+        documents_updated = rag_document_service.remove_points(db, result.pop("documents"))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {**result, "documents_updated": documents_updated, "timestamp": datetime.utcnow()}
+
+
 @router.post("/backup", response_model=dict)
 async def backup_database(
     *,
@@ -1,19 +1,41 @@
 from datetime import timedelta
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.database import get_db
-from app.core.security import create_access_token, create_refresh_token, verify_password
-from app.schemas.auth import Token, LoginRequest
+from app.core.security import (
+    create_access_token, create_refresh_token, verify_password, decode_token, new_session_id
+)
+from app.core.token_revocation import revocation_store
+from app.schemas.auth import Token, LoginRequest, RefreshTokenRequest
 from app.schemas.user import User, UserCreate
 from app.services.user_service import get_user_by_email, create_user
 from app.api.deps import get_current_active_user
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _decode_refresh_token(refresh_token: str) -> dict:
+    payload = decode_token(refresh_token)
+    if (
+        payload is None
+        or payload.get("type") != "refresh"
+        or not payload.get("jti")
+        or not payload.get("sid")
+        or not payload.get("sub")
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
 @router.post("/signup", response_model=User)
 async def signup(
     user_create: UserCreate,
@@ -47,8 +69,9 @@ async def login(
         )
     
     # Create tokens
-    access_token = create_access_token(data={"sub": user.email})
-    refresh_token = create_refresh_token(data={"sub": user.email})
+    session_id = new_session_id()
+    access_token = create_access_token(data={"sub": user.email}, session_id=session_id)
+    refresh_token = create_refresh_token(data={"sub": user.email}, session_id=session_id)
     
     return {
         "access_token": access_token,
@@ -57,6 +80,73 @@ async def login(
     }
 
 
+@router.post("/refresh", response_model=Token)
+async def refresh(
+    request: RefreshTokenRequest,
+    db: Session = Depends(get_db)
+):
+    """Exchange a refresh token for a new token pair (rotation)"""
+    payload = _decode_refresh_token(request.refresh_token)
+    session_id = payload["sid"]
+    
+    try:
+        if await revocation_store.is_session_revoked(session_id):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Session has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        
+        # Each refresh token is single use; a replay means it leaked
+        if not await revocation_store.consume_refresh_token(payload["jti"], payload["exp"]):
+            await revocation_store.revoke_session(session_id, payload["exp"])
+            logger.warning(f"Refresh token reuse detected for {payload['sub']}, session revoked")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token has already been used",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Token revocation store unavailable: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Token refresh temporarily unavailable"
+        )
+    
+    user = get_user_by_email(db, email=payload["sub"])
+    if not user or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    return {
+        "access_token": create_access_token(data={"sub": user.email}, session_id=session_id),
+        "refresh_token": create_refresh_token(data={"sub": user.email}, session_id=session_id),
+        "token_type": "bearer"
+    }
+
+
+@router.post("/logout")
+async def logout(request: RefreshTokenRequest):
+    """Revoke the session the refresh token belongs to"""
+    payload = _decode_refresh_token(request.refresh_token)
+    
+    try:
+        await revocation_store.revoke_session(payload["sid"], payload["exp"])
+    except Exception as e:
+        logger.error(f"Failed to revoke session: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Logout temporarily unavailable"
+        )
+    
+    return {"message": "Logged out successfully"}
+
+
 @router.get("/me", response_model=User)
 async def get_current_user_info(
     current_user: User = Depends(get_current_active_user)
@@ -1,33 +1,98 @@
 """
 RAG (Retrieval-Augmented Generation) API endpoints
 """
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from uuid import uuid4
+import json
+import os
+from celery.result import AsyncResult
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from ...api import deps
-from ...models.user import User
+from ...core.celery_app import celery_app
+from ...core.config import settings
+from ...models.user import User, UserRole
 from ...schemas.rag import (
     DocumentUpload,
     DocumentResponse,
     RAGQuery,
     RAGResponse,
-    DocumentDelete
+    DocumentDelete,
+    IngestionJobResponse
 )
+from ...services import rag_document_service
+from ...services.document_parser import SUPPORTED_EXTENSIONS, file_extension
 from ...services.rag_service import rag_service
+from ...tasks.ingestion_tasks import ingest_document_task
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.post("/upload", response_model=DocumentResponse)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def _spool_path(extension: str) -> str:
+    os.makedirs(settings.RAG_UPLOAD_DIR, exist_ok=True)
+    return os.path.join(settings.RAG_UPLOAD_DIR, f"{uuid4().hex}.{extension}")
+
+
+async def _spool_upload(file: UploadFile) -> str:
+    """Stream an upload to the shared spool directory without buffering it in memory"""
+    extension = file_extension(file.filename)
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported file type. Allowed: {', '.join(sorted(SUPPORTED_EXTENSIONS))}"
+        )
+    
+    path = _spool_path(extension)
+    max_bytes = settings.RAG_MAX_UPLOAD_MB * 1024 * 1024
+    written = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds {settings.RAG_MAX_UPLOAD_MB}MB limit"
+                    )
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def _enqueue_ingestion(path: str, current_user: User, **kwargs) -> str:
+    try:
+        task = ingest_document_task.delay(
+            path,
+            uploaded_by=current_user.id,
+            institution_id=current_user.institution_id,
+            **kwargs
+        )
+    except Exception:
+        os.remove(path)
+        raise
+    return task.id
+
+
+@router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_202_ACCEPTED)
 async def upload_documents(
     document: DocumentUpload,
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
-    """Upload and index a document for RAG"""
+    """Queue a document for RAG indexing"""
     try:
         # Check if user has permission (optional: add role-based access)
         if not current_user.is_active:
@@ -36,25 +101,26 @@ async def upload_documents(
                 detail="Inactive user cannot upload documents"
             )
         
-        # Process document
-        metadata = {
-            "title": document.title,
-            "uploaded_by": current_user.id,
-            "category": document.category,
-            **document.metadata
-        }
+        path = _spool_path("txt")
+        with open(path, "w", encoding="utf-8") as out:
+            out.write(document.content)
         
-        document_ids = await rag_service.process_documents(
-            texts=[document.content],
-            metadata=[metadata]
+        job_id = _enqueue_ingestion(
+            path,
+            current_user,
+            title=document.title,
+            category=document.category,
+            metadata=document.metadata
         )
         
         return DocumentResponse(
             success=True,
-            message=f"Successfully uploaded document: {document.title}",
-            document_ids=document_ids
+            message=f"Document queued for indexing: {document.title}",
+            job_id=job_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to upload document: {e}")
         raise HTTPException(
@@ -63,7 +129,7 @@ async def upload_documents(
         )
 
 
-@router.post("/upload-file", response_model=DocumentResponse)
+@router.post("/upload-file", response_model=DocumentResponse, status_code=status.HTTP_202_ACCEPTED)
 async def upload_file(
     file: UploadFile = File(...),
     title: str = Form(...),
@@ -71,32 +137,27 @@ async def upload_file(
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
-    """Upload a file and index its content for RAG"""
+    """Spool an uploaded file and queue it for RAG indexing"""
     try:
-        # Read file content
-        content = await file.read()
-        text = content.decode('utf-8')
-        
-        # Process as document
-        metadata = {
-            "title": title,
-            "uploaded_by": current_user.id,
-            "filename": file.filename,
-            "category": category,
-            "source": "file"
-        }
+        path = await _spool_upload(file)
         
-        document_ids = await rag_service.process_documents(
-            texts=[text],
-            metadata=[metadata]
+        job_id = _enqueue_ingestion(
+            path,
+            current_user,
+            title=title,
+            category=category,
+            source="file",
+            filename=file.filename
         )
         
         return DocumentResponse(
             success=True,
-            message=f"Successfully processed file: {file.filename}",
-            document_ids=document_ids
+            message=f"File queued for indexing: {file.filename}",
+            job_id=job_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to upload file: {e}")
         raise HTTPException(
@@ -105,6 +166,41 @@ async def upload_file(
         )
 
 
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(
+    job_id: str,
+    current_user: User = Depends(deps.get_current_user)
+):
+    """Get the progress of an ingestion job"""
+    result = AsyncResult(job_id, app=celery_app)
+    info = result.info if isinstance(result.info, dict) else {}
+    
+    if info.get("uploaded_by") not in (None, current_user.id) and current_user.role == UserRole.user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this job"
+        )
+    
+    current, total = info.get("current", 0), info.get("total", 0)
+    job_status, message = "processing", info.get("status")
+    if result.state == "PENDING":
+        job_status, message = "pending", "대기 중..."
+    elif result.state == "FAILURE" or info.get("status") == "error":
+        job_status, message = "failed", info.get("message") or str(result.info)
+    elif result.state == "SUCCESS":
+        job_status, message = "completed", "완료됨"
+    
+    return IngestionJobResponse(
+        job_id=job_id,
+        status=job_status,
+        progress=100 if job_status == "completed" else int(current * 100 / total) if total else 0,
+        chunks_embedded=current,
+        total_chunks=total,
+        document_id=info.get("document_id"),
+        message=message
+    )
+
+
 @router.post("/query", response_model=RAGResponse)
 async def query_rag(
     query: RAGQuery,
@@ -117,7 +213,9 @@ async def query_rag(
         result = await rag_service.ask(
             question=query.question,
             user_id=current_user.id,
-            session_id=query.session_id
+            session_id=query.session_id,
+            filters=query.filters,
+            institution_id=current_user.institution_id
         )
         
         return RAGResponse(
@@ -127,6 +225,11 @@ async def query_rag(
             timestamp=result.get("timestamp")
         )
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Failed to process RAG query: {e}")
         raise HTTPException(
@@ -135,22 +238,92 @@ async def query_rag(
         )
 
 
+async def _sse(events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> AsyncIterator[str]:
+    async for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/query/stream")
+async def query_rag_stream(
+    query: RAGQuery,
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Query the RAG system, streaming the answer as Server-Sent Events.
+    
+    Events: `sources` (retrieved chunk metadata, sent before generation
+    starts), `token` (answer text pieces), then `done` (full answer and
+    retrieval / time-to-first-token / total timings) or `error`.
+    """
+    try:
+        events = rag_service.ask_stream(
+            question=query.question,
+            user_id=current_user.id,
+            session_id=query.session_id,
+            filters=query.filters,
+            institution_id=current_user.institution_id
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return StreamingResponse(
+        _sse(events),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _can_view(user: User, document) -> bool:
+    return user.role == UserRole.super_admin or document.institution_id == user.institution_id
+
+
+def _can_delete(user: User, document) -> bool:
+    if user.role == UserRole.super_admin:
+        return True
+    if document.institution_id != user.institution_id:
+        return False
+    return user.role == UserRole.institution_admin or document.uploaded_by == user.id
+
+
 @router.delete("/documents/{document_id}", response_model=Dict[str, Any])
 async def delete_document(
     document_id: str,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: User = Depends(deps.get_current_active_user)
 ):
-    """Delete a document from the vector store"""
+    """Delete a document; uploaders and their institution's admins may delete it"""
     try:
-        # Check permission (optional: add admin check)
-        if not current_user.is_active:
+        # Delete every chunk of a registered document with one filtered delete
+        registered = rag_document_service.get_document(db, document_id)
+        if registered and not _can_view(current_user, registered):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        if registered and not _can_delete(current_user, registered):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail="Inactive user cannot delete documents"
+                detail="Only the uploader or an institution admin can delete this document"
             )
+        if registered:
+            await rag_service.delete_document(db, registered)
+            return {
+                "success": True,
+                "message": f"Successfully deleted document: {document_id}",
+                "deleted_chunks": registered.chunk_count
+            }
         
-        # Delete document
+        # Points indexed before the registry existed are deleted by point ID;
+        # they carry no owner, so only a super admin may remove them
+        if current_user.role != UserRole.super_admin:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
         from ...services.vector_service import vector_service
         success = await vector_service.delete_documents([document_id])
         
@@ -165,6 +338,8 @@ async def delete_document(
                 detail="Failed to delete document"
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to delete document: {e}")
         raise HTTPException(
@@ -178,54 +353,24 @@ async def get_documents(
     skip: int = 0,
     limit: int = 20,
     category: Optional[str] = None,
+    institution_id: Optional[str] = None,
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
-    """Get list of documents in the vector store"""
+    """Get list of documents in the vector store; only super admins see other institutions"""
     try:
-        # For now, we'll return mock data since we need to implement document tracking
-        # In production, you'd store document metadata in the database
-        documents = [
-            {
-                "id": "doc_001",
-                "title": "ChatGPT 프롬프트 엔지니어링 가이드",
-                "content": "ChatGPT를 효과적으로 활용하기 위한 프롬프트 작성 방법...",
-                "category": "tutorial",
-                "metadata": {
-                    "source": "internal",
-                    "author": current_user.name,
-                    "created_at": "2024-01-20T10:00:00Z",
-                    "updated_at": "2024-01-20T10:00:00Z"
-                },
-                "chunk_count": 15,
-                "embedding_status": "completed"
-            },
-            {
-                "id": "doc_002",
-                "title": "Claude AI 사용 가이드",
-                "content": "Claude AI의 특징과 활용 방법에 대한 상세 설명...",
-                "category": "guide",
-                "metadata": {
-                    "source": "external",
-                    "author": "AI 전문가",
-                    "created_at": "2024-01-22T14:30:00Z",
-                    "updated_at": "2024-01-22T14:30:00Z"
-                },
-                "chunk_count": 20,
-                "embedding_status": "completed"
-            }
-        ]
-        
-        # Filter by category if provided
-        if category and category != 'all':
-            documents = [doc for doc in documents if doc['category'] == category]
-        
-        # Apply pagination
-        total = len(documents)
-        documents = documents[skip:skip + limit]
+        scoped = current_user.role != UserRole.super_admin
+        documents, total = rag_document_service.list_documents(
+            db,
+            skip=skip,
+            limit=limit,
+            category=category if category and category != 'all' else None,
+            institution_id=current_user.institution_id if scoped else institution_id,
+            exact_institution=scoped
+        )
         
         return {
-            "documents": documents,
+            "documents": [rag_document_service.to_dict(document) for document in documents],
             "total": total,
             "skip": skip,
             "limit": limit
@@ -246,28 +391,11 @@ async def get_document(
     current_user: User = Depends(deps.get_current_user)
 ):
     """Get a specific document by ID"""
-    try:
-        # Mock data for now
-        document = {
-            "id": document_id,
-            "title": "ChatGPT 프롬프트 엔지니어링 가이드",
-            "content": "ChatGPT를 효과적으로 활용하기 위한 프롬프트 작성 방법...",
-            "category": "tutorial",
-            "metadata": {
-                "source": "internal",
-                "author": current_user.name,
-                "created_at": "2024-01-20T10:00:00Z",
-                "updated_at": "2024-01-20T10:00:00Z"
-            },
-            "chunk_count": 15,
-            "embedding_status": "completed"
-        }
-        
-        return document
-        
-    except Exception as e:
-        logger.error(f"Failed to get document: {e}")
+    document = rag_document_service.get_document(db, document_id)
+    if not document or not _can_view(current_user, document):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
\ No newline at end of file
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    return rag_document_service.to_dict(document)
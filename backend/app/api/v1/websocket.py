@@ -1,209 +1,753 @@
-from typing import List, Dict
-from fastapi import WebSocket, WebSocketDisconnect, Depends, status
-from jose import JWTError, jwt
-import json
+from typing import Any, List, Dict, Optional, Set, Tuple
+from fastapi import WebSocket, WebSocketDisconnect, status
 import asyncio
+import time
+import logging
+from dataclasses import dataclass
 from datetime import datetime
 
 from app.core.config import settings
-from app.api import deps
-from app.models.user import User
+from app.core.metrics import register_collector
+from app.core.security import decode_token
+from app.core.token_revocation import revocation_store
+from app.models.user import User, UserRole
+from app.services.presence_service import PresenceService, create_presence_service
+from app.services.user_service import get_user_by_email
+from app.services.ws_backplane import Backplane, create_backplane
+from app.services.ws_protocol import Frame, JSON_CODEC, MalformedFrame, negotiate_codec
+
+logger = logging.getLogger(__name__)
+
+# Ephemeral events that may be dropped for a slow client; anything else
+# overflowing a send queue evicts the client instead of losing state
+DROP_ON_OVERFLOW = {"user_typing", "user_stop_typing", "pong"}
+
+# Locks guarding backplane route changes, shared by users and rooms by hash
+ROUTE_LOCK_STRIPES = 64
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    """The few user fields realtime code needs, instead of a detached ORM object"""
+    id: int
+    name: str
+    role: Any
+    institution_id: Optional[str] = None
+    job_title: Optional[str] = None
+    department: Optional[str] = None
+    ai_level: Any = None
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        if isinstance(user, cls):
+            return user
+        return cls(
+            id=user.id,
+            name=user.name,
+            role=user.role,
+            institution_id=getattr(user, "institution_id", None),
+            job_title=getattr(user, "job_title", None),
+            department=getattr(user, "department", None),
+            ai_level=getattr(user, "ai_level", None)
+        )
+
+    def presence(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "role": getattr(self.role, "value", self.role),
+            "institution_id": self.institution_id
+        }
+
+
+class SocketOutbox:
+    """Bounded outbound queue drained by a dedicated writer task"""
+
+    def __init__(self, websocket: WebSocket, on_error, maxsize: int = settings.WS_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._on_error = on_error
+        self.task = asyncio.create_task(self._writer())
+
+    def put(self, data: Frame) -> bool:
+        try:
+            self.queue.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _writer(self):
+        while True:
+            data = await self.queue.get()
+            try:
+                if isinstance(data, bytes):
+                    await self.websocket.send_bytes(data)
+                else:
+                    await self.websocket.send_text(data)
+            except Exception as e:
+                logger.info(f"WebSocket send failed, dropping connection: {e}")
+                self._on_error(self.websocket)
+                return
+            finally:
+                self.queue.task_done()
+
+    def close(self):
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
 
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(
+        self,
+        backplane: Optional[Backplane] = None,
+        presence: Optional[PresenceService] = None
+    ):
         self.active_connections: Dict[int, List[WebSocket]] = {}
-        self.user_sockets: Dict[WebSocket, User] = {}
+        self.user_sockets: Dict[WebSocket, UserSnapshot] = {}
+        # Conversation rooms: room -> subscribed sockets, socket -> its rooms
+        self.rooms: Dict[str, Set[WebSocket]] = {}
+        self.socket_rooms: Dict[WebSocket, Set[str]] = {}
+        # Last forwarded typing event per (user, room), for throttling
+        self.typing_state: Dict[Tuple[int, str], float] = {}
+        # Last frame received on each socket (monotonic clock)
+        self.last_seen: Dict[WebSocket, float] = {}
+        self.outboxes: Dict[WebSocket, SocketOutbox] = {}
+        # Wire format negotiated per socket (JSON unless the client asked otherwise)
+        self.codecs: Dict[WebSocket, Any] = {}
+        self.backplane = backplane or Backplane()
+        self.presence = presence or PresenceService()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.chat_streams = 0
+        self.counters: Dict[str, int] = {
+            "opened": 0,
+            "idle_closed": 0,
+            "cap_evicted": 0,
+            "slow_evicted": 0,
+            "dropped_frames": 0,
+        }
+        self._background_tasks: Set[asyncio.Task] = set()
+        # Serialize backplane (un)registration per user and room, so a route
+        # removal scheduled by a disconnect cannot land after a reconnect re-adds it
+        self._route_locks = [asyncio.Lock() for _ in range(ROUTE_LOCK_STRIPES)]
+
+    async def start(self):
+        """Start receiving events published by other nodes and sweeping presence"""
+        await self.backplane.start(self._handle_envelope)
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        await self.backplane.stop()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _route_lock(self, key: Tuple[str, Any]) -> asyncio.Lock:
+        return self._route_locks[hash(key) % len(self._route_locks)]
+
+    async def _register_user_route(self, user_id: int):
+        async with self._route_lock(("user", user_id)):
+            await self.backplane.register_user(user_id)
+
+    async def _unregister_user_route(self, user_id: int):
+        async with self._route_lock(("user", user_id)):
+            # The user may have reconnected to this node since the disconnect
+            if user_id not in self.active_connections:
+                await self.backplane.unregister_user(user_id)
+
+    async def _register_room_route(self, room: str):
+        async with self._route_lock(("room", room)):
+            await self.backplane.register_room(room)
+
+    async def _unregister_room_route(self, room: str):
+        async with self._route_lock(("room", room)):
+            if room not in self.rooms:
+                await self.backplane.unregister_room(room)
+
+    def socket_key(self, websocket: WebSocket) -> str:
+        return f"{self.backplane.node_id}:{id(websocket)}"
+
+    def touch(self, websocket: WebSocket):
+        """Record activity on a socket; any received frame counts as a heartbeat"""
+        self.last_seen[websocket] = time.monotonic()
+
+    async def _broadcast_presence(self, event_type: str, user: Dict[str, Any]):
+        await self.broadcast({
+            "type": event_type,
+            "user": user,
+            "timestamp": datetime.utcnow().isoformat()
+        }, exclude_user_id=user["id"])
+
+    async def _on_socket_closed(self, socket_key: str, user: UserSnapshot):
+        if await self.presence.leave(socket_key, user.id):
+            await self._broadcast_presence("user_left", user.presence())
+
+    async def sweep(self):
+        """Close idle or half-open sockets, refresh heartbeats and reap expired presence"""
+        # A socket that sent nothing (not even a ping) for the idle timeout is
+        # treated as half-open: its peer is gone but TCP never told us
+        cutoff = time.monotonic() - settings.WS_IDLE_TIMEOUT_SECONDS
+        for websocket, last_seen in list(self.last_seen.items()):
+            if last_seen < cutoff:
+                self.counters["idle_closed"] += 1
+                self.disconnect(websocket)
+                await self._close_socket(websocket, status.WS_1001_GOING_AWAY)
+        
+        await self.presence.heartbeat(
+            (self.socket_key(websocket), user.presence())
+            for websocket, user in list(self.user_sockets.items())
+        )
+        
+        for user in await self.presence.reap_expired():
+            await self._broadcast_presence("user_left", user)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_SWEEP_SECONDS)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Presence sweep failed: {e}")
+
+    async def _handle_envelope(self, envelope: dict):
+        if envelope["op"] == "user":
+            await self._send_local(envelope["message"], envelope["user_id"])
+        elif envelope["op"] == "room":
+            await self._send_room_local(envelope["message"], envelope["room"], envelope.get("exclude_user_id"))
+        elif envelope["op"] == "broadcast":
+            await self._broadcast_local(envelope["message"], envelope.get("exclude_user_id"))
 
     async def connect(self, websocket: WebSocket, user: User):
-        await websocket.accept()
+        user = UserSnapshot.from_user(user)
+        scope = getattr(websocket, "scope", None) or {}
+        codec = negotiate_codec(scope.get("subprotocols", ()))
+        await websocket.accept(subprotocol=codec.subprotocol)
+        self.codecs[websocket] = codec
+        self.outboxes[websocket] = SocketOutbox(websocket, self.disconnect)
+        self.counters["opened"] += 1
         
         # Store connection by user ID
         if user.id not in self.active_connections:
             self.active_connections[user.id] = []
+            await self._register_user_route(user.id)
         self.active_connections[user.id].append(websocket)
         
         # Store user info for this socket
         self.user_sockets[websocket] = user
+        self.touch(websocket)
         
         # Send connection confirmation
-        await websocket.send_json({
+        self.send_to_socket(websocket, {
             "type": "connection",
             "status": "connected",
             "user_id": user.id,
             "timestamp": datetime.utcnow().isoformat()
         })
+        
+        # Announce only the transition to online, not the whole list
+        snapshot = user.presence()
+        if await self.presence.join(self.socket_key(websocket), snapshot):
+            await self._broadcast_presence("user_joined", snapshot)
+        
+        # Enforce the per-user cap by closing the user's oldest sockets
+        connections = self.active_connections.get(user.id, [])
+        while len(connections) > settings.WS_MAX_CONNECTIONS_PER_USER:
+            oldest = connections[0]
+            self.counters["cap_evicted"] += 1
+            self.disconnect(oldest)
+            self._spawn(self._close_socket(oldest, status.WS_1008_POLICY_VIOLATION))
 
     def disconnect(self, websocket: WebSocket):
+        for room in list(self.socket_rooms.get(websocket, ())):
+            self._leave_room(websocket, room)
+        
         user = self.user_sockets.get(websocket)
         if user and user.id in self.active_connections:
-            self.active_connections[user.id].remove(websocket)
+            if websocket in self.active_connections[user.id]:
+                self.active_connections[user.id].remove(websocket)
             if not self.active_connections[user.id]:
                 del self.active_connections[user.id]
+                self._spawn(self._unregister_user_route(user.id))
         
         if websocket in self.user_sockets:
             del self.user_sockets[websocket]
+            self._spawn(self._on_socket_closed(self.socket_key(websocket), user))
+        self.last_seen.pop(websocket, None)
+        
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox:
+            outbox.close()
+        self.codecs.pop(websocket, None)
 
-    async def send_personal_message(self, message: dict, user_id: int):
-        """Send message to specific user"""
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    # Remove dead connections
-                    self.disconnect(connection)
+    def _leave_room(self, websocket: WebSocket, room: str):
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(websocket)
+            if not members:
+                del self.rooms[room]
+                self._spawn(self._unregister_room_route(room))
+        
+        rooms = self.socket_rooms.get(websocket)
+        if rooms is not None:
+            rooms.discard(room)
+            if not rooms:
+                del self.socket_rooms[websocket]
+        
+        user = self.user_sockets.get(websocket)
+        if user:
+            self.typing_state.pop((user.id, room), None)
 
-    async def broadcast(self, message: dict, exclude_user_id: int = None):
-        """Broadcast message to all connected users"""
+    async def subscribe(self, websocket: WebSocket, room: str):
+        """Subscribe a socket to a conversation room"""
+        if room not in self.rooms:
+            self.rooms[room] = set()
+            await self._register_room_route(room)
+        self.rooms[room].add(websocket)
+        self.socket_rooms.setdefault(websocket, set()).add(room)
+
+    def unsubscribe(self, websocket: WebSocket, room: str):
+        """Unsubscribe a socket from a conversation room"""
+        self._leave_room(websocket, room)
+
+    def is_subscribed(self, websocket: WebSocket, room: str) -> bool:
+        return room in self.socket_rooms.get(websocket, ())
+
+    def should_forward_typing(self, user_id: int, room: str, typing: bool) -> bool:
+        """
+        Collapse repeated typing events: forward the first "typing" and then
+        at most one per throttle window, and a "stop_typing" only if a
+        typing event was forwarded before it.
+        """
+        key = (user_id, room)
+        if not typing:
+            return self.typing_state.pop(key, None) is not None
+        
+        now = time.monotonic()
+        last_sent = self.typing_state.get(key)
+        if last_sent is not None and now - last_sent < settings.WS_TYPING_THROTTLE_SECONDS:
+            return False
+        self.typing_state[key] = now
+        return True
+
+    def _enqueue(self, websocket: WebSocket, message: dict, encoded: Dict[str, Frame]):
+        """
+        Queue a message for a socket without waiting on the network.
+
+        ``encoded`` caches the frame per codec so a fan-out serializes each
+        message once per wire format, not once per recipient.
+        """
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            return
+        
+        codec = self.codecs.get(websocket, JSON_CODEC)
+        data = encoded.get(codec.name)
+        if data is None:
+            data = encoded[codec.name] = codec.encode(message)
+        if outbox.put(data):
+            return
+        
+        outbox.dropped += 1
+        self.counters["dropped_frames"] += 1
+        if message.get("type") in DROP_ON_OVERFLOW:
+            return
+        
+        # The client cannot keep up with events it must not miss
+        logger.warning(f"Evicting slow WebSocket consumer ({outbox.queue.qsize()} queued)")
+        self.counters["slow_evicted"] += 1
+        self.disconnect(websocket)
+        self._spawn(self._close_socket(websocket, status.WS_1013_TRY_AGAIN_LATER))
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def send_to_socket(self, websocket: WebSocket, message: dict):
+        """Queue a message for a single socket"""
+        self._enqueue(websocket, message, {})
+
+    async def receive(self, websocket: WebSocket) -> dict:
+        """Receive and decode one client frame in the socket's wire format; raises MalformedFrame"""
+        codec = self.codecs.get(websocket, JSON_CODEC)
+        frame = await websocket.receive()
+        if frame["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE))
+        
+        try:
+            if codec.binary and frame.get("bytes") is not None:
+                message = codec.decode(frame["bytes"])
+            else:
+                message = JSON_CODEC.decode(frame.get("text") or frame.get("bytes") or "")
+        except Exception as e:
+            raise MalformedFrame(f"Could not decode frame: {e}") from e
+        if not isinstance(message, dict):
+            raise MalformedFrame("Frame must be an object")
+        return message
+
+    async def _send_local(self, message: dict, user_id: int):
+        encoded: Dict[str, Frame] = {}
+        for connection in list(self.active_connections.get(user_id, [])):
+            self._enqueue(connection, message, encoded)
+
+    async def _broadcast_local(self, message: dict, exclude_user_id: Optional[int] = None):
+        # Encode once per wire format, then enqueue; one stalled client no longer delays the rest
+        encoded: Dict[str, Frame] = {}
         for user_id, connections in list(self.active_connections.items()):
             if exclude_user_id and user_id == exclude_user_id:
                 continue
             
             for connection in list(connections):
-                try:
-                    await connection.send_json(message)
-                except:
-                    # Remove dead connections
-                    self.disconnect(connection)
-
-    def get_online_users(self) -> List[Dict]:
-        """Get list of online users"""
-        online_users = []
-        for user_id in self.active_connections:
-            # Get first connection's user info
-            if self.active_connections[user_id]:
-                websocket = self.active_connections[user_id][0]
-                user = self.user_sockets.get(websocket)
-                if user:
-                    online_users.append({
-                        "id": user.id,
-                        "name": user.name,
-                        "email": user.email,
-                        "role": user.role
-                    })
-        return online_users
+                self._enqueue(connection, message, encoded)
+
+    async def _send_room_local(self, message: dict, room: str, exclude_user_id: Optional[int] = None):
+        encoded: Dict[str, Frame] = {}
+        for connection in list(self.rooms.get(room, ())):
+            user = self.user_sockets.get(connection)
+            if exclude_user_id and user and user.id == exclude_user_id:
+                continue
+            self._enqueue(connection, message, encoded)
+
+    async def send_to_room(self, message: dict, room: str, exclude_user_id: Optional[int] = None):
+        """Send message to the sockets subscribed to a room across nodes"""
+        await self._send_room_local(message, room, exclude_user_id)
+        await self.backplane.publish_to_room(room, message, exclude_user_id)
+
+    async def send_personal_message(self, message: dict, user_id: int):
+        """Send message to specific user on whichever node holds their sockets"""
+        await self._send_local(message, user_id)
+        await self.backplane.publish_to_user(user_id, message)
+
+    async def broadcast(self, message: dict, exclude_user_id: int = None):
+        """Broadcast message to all connected users across nodes"""
+        await self._broadcast_local(message, exclude_user_id)
+        await self.backplane.publish_broadcast(message, exclude_user_id)
 
+    def collect_metrics(self):
+        """Connection gauges and counters for /metrics"""
+        yield "ws_connections", "gauge", "Open WebSocket connections on this node", len(self.user_sockets)
+        yield "ws_users", "gauge", "Users with at least one socket on this node", len(self.active_connections)
+        yield "ws_rooms", "gauge", "Conversation rooms with subscribers on this node", len(self.rooms)
+        yield "ws_queued_frames", "gauge", "Frames waiting in outbound queues", sum(
+            outbox.queue.qsize() for outbox in self.outboxes.values()
+        )
+        yield "ws_chat_streams", "gauge", "In-flight chat streams", self.chat_streams
+        for name, value in self.counters.items():
+            yield f"ws_{name}_total", "counter", f"WebSocket {name.replace('_', ' ')} events", value
+
+    async def get_online_users(
+        self,
+        institution_id: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> Tuple[List[Dict], int]:
+        """Get one page of online users and the total count"""
+        return await self.presence.get_online_users(institution_id, offset, limit)
 
-manager = ConnectionManager()
+
+manager = ConnectionManager(create_backplane(), create_presence_service())
+register_collector(manager.collect_metrics)
 
 
 async def get_current_user_websocket(
     websocket: WebSocket,
     token: str
-) -> User:
+) -> UserSnapshot:
     """Authenticate user from WebSocket connection"""
     credentials_exception = WebSocketDisconnect(
         code=status.WS_1008_POLICY_VIOLATION,
         reason="Could not validate credentials"
     )
     
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    # Same checks as deps.get_current_active_user: access tokens only, live session, active user
+    payload = decode_token(token)
+    if payload is None or payload.get("type") != "access":
+        raise credentials_exception
+    
+    session_id = payload.get("sid")
+    if session_id and await revocation_store.is_session_revoked(session_id):
+        raise credentials_exception
+    
+    email: str = payload.get("sub")
+    if email is None:
         raise credentials_exception
     
-    from sqlalchemy.orm import Session
     from app.core.database import SessionLocal
     
-    db: Session = SessionLocal()
+    def load_user() -> Optional[UserSnapshot]:
+        db = SessionLocal()
+        try:
+            user = get_user_by_email(db, email=email)
+            return UserSnapshot.from_user(user) if user is not None and user.is_active else None
+        finally:
+            db.close()
+    
+    # Off the event loop, like every other database call on the socket path
+    user = await asyncio.to_thread(load_user)
+    if user is None:
+        raise credentials_exception
+    return user
+
+
+def _int_param(data: dict, key: str, default: int) -> int:
     try:
-        user = db.query(User).filter(User.email == username).first()
-        if user is None:
-            raise credentials_exception
-        return user
+        return int(data.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def can_join_conversation(user: UserSnapshot, conversation_id: int) -> bool:
+    """Only the conversation owner and administrators may join its room; blocks on the database"""
+    if user.role in (UserRole.institution_admin, UserRole.super_admin):
+        return True
+    
+    from app.core.database import SessionLocal
+    from app.services.chat_service import get_conversation_by_id
+    
+    db = SessionLocal()
+    try:
+        conversation = get_conversation_by_id(db, conversation_id)
+        return conversation is not None and conversation.user_id == user.id
     finally:
         db.close()
 
 
+async def stream_chat_response(
+    websocket: WebSocket,
+    user: UserSnapshot,
+    request_id: str,
+    conversation_id: int,
+    content: str
+):
+    """Stream an assistant reply as chat_chunk frames, persisting like the SSE endpoint"""
+    from app.core.database import SessionLocal
+    from app.models.conversation import MessageRole
+    from app.services.ai_service import get_ai_response_stream
+    from app.services.chat_service import get_conversation_by_id, add_message_to_conversation
+    
+    # Database calls run in worker threads so a slow query never stalls the
+    # other sockets on this node; the session is only used by one call at a time
+    db = await asyncio.to_thread(SessionLocal)
+    manager.chat_streams += 1
+    
+    def add_user_message() -> Optional[list]:
+        """Store the question; returns the history including it, or None if not the user's conversation"""
+        conversation = get_conversation_by_id(db, conversation_id)
+        if not conversation or conversation.user_id != user.id:
+            return None
+        add_message_to_conversation(db, conversation_id, content, MessageRole.user)
+        return list(conversation.messages)
+    
+    try:
+        history = await asyncio.to_thread(add_user_message)
+        if history is None:
+            manager.send_to_socket(websocket, {
+                "type": "chat_error",
+                "request_id": request_id,
+                "error": "Conversation not found"
+            })
+            return
+        
+        manager.send_to_socket(websocket, {"type": "chat_start", "request_id": request_id})
+        
+        try:
+            full_response = ""
+            async for chunk in get_ai_response_stream(content, history, user):
+                full_response += chunk
+                manager.send_to_socket(websocket, {
+                    "type": "chat_chunk",
+                    "request_id": request_id,
+                    "content": chunk
+                })
+            
+            # Save complete AI response to database
+            ai_message = await asyncio.to_thread(
+                add_message_to_conversation, db, conversation_id, full_response, MessageRole.assistant
+            )
+            manager.send_to_socket(websocket, {
+                "type": "chat_complete",
+                "request_id": request_id,
+                "message_id": ai_message.id
+            })
+        
+        except asyncio.CancelledError:
+            # Cancelling the task closes the upstream stream
+            manager.send_to_socket(websocket, {"type": "chat_cancelled", "request_id": request_id})
+            raise
+        
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {e}")
+            manager.send_to_socket(websocket, {
+                "type": "chat_error",
+                "request_id": request_id,
+                "error": str(e)
+            })
+            await asyncio.to_thread(
+                add_message_to_conversation, db, conversation_id,
+                "죄송합니다. 응답을 생성하는 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.",
+                MessageRole.assistant
+            )
+    finally:
+        manager.chat_streams -= 1
+        await asyncio.to_thread(db.close)
+
+
 async def websocket_endpoint(websocket: WebSocket, token: str):
     """Main WebSocket endpoint"""
+    # In-flight chat streams on this socket, by client request id
+    chat_tasks: Dict[str, asyncio.Task] = {}
+    
     try:
-        # Authenticate user
-        user = await get_current_user_websocket(websocket, token)
+        # Authenticate user; keep only a compact snapshot for the socket's lifetime
+        user = UserSnapshot.from_user(await get_current_user_websocket(websocket, token))
         
-        # Connect user
+        # Connect user (announces user_joined when they come online)
         await manager.connect(websocket, user)
         
-        # Broadcast user joined
-        await manager.broadcast({
-            "type": "user_joined",
-            "user": {
-                "id": user.id,
-                "name": user.name,
-                "role": user.role
-            },
-            "online_users": manager.get_online_users(),
-            "timestamp": datetime.utcnow().isoformat()
-        }, exclude_user_id=user.id)
-        
         try:
             while True:
                 # Wait for messages from client
-                data = await websocket.receive_json()
+                try:
+                    data = await manager.receive(websocket)
+                except MalformedFrame as e:
+                    manager.send_to_socket(websocket, {
+                        "type": "error",
+                        "error": str(e),
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+                    continue
+                manager.touch(websocket)
                 
                 # Handle different message types
                 message_type = data.get("type")
                 
                 if message_type == "ping":
                     # Respond to ping
-                    await websocket.send_json({
+                    manager.send_to_socket(websocket, {
                         "type": "pong",
                         "timestamp": datetime.utcnow().isoformat()
                     })
                 
-                elif message_type == "typing":
-                    # Broadcast typing status
+                elif message_type == "subscribe":
+                    # Join a conversation room to receive its events
                     conversation_id = data.get("conversation_id")
-                    if conversation_id:
-                        await manager.broadcast({
-                            "type": "user_typing",
-                            "user_id": user.id,
-                            "user_name": user.name,
-                            "conversation_id": conversation_id,
-                            "timestamp": datetime.utcnow().isoformat()
-                        }, exclude_user_id=user.id)
+                    if conversation_id is None:
+                        continue
+                    try:
+                        allowed = await asyncio.to_thread(can_join_conversation, user, int(conversation_id))
+                    except (TypeError, ValueError):
+                        allowed = False
+                    if allowed:
+                        await manager.subscribe(websocket, str(conversation_id))
+                    manager.send_to_socket(websocket, {
+                        "type": "subscribed" if allowed else "subscribe_denied",
+                        "conversation_id": conversation_id,
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
                 
-                elif message_type == "stop_typing":
-                    # Broadcast stop typing status
+                elif message_type == "unsubscribe":
                     conversation_id = data.get("conversation_id")
-                    if conversation_id:
-                        await manager.broadcast({
-                            "type": "user_stop_typing",
-                            "user_id": user.id,
-                            "conversation_id": conversation_id,
-                            "timestamp": datetime.utcnow().isoformat()
-                        }, exclude_user_id=user.id)
+                    if conversation_id is not None:
+                        manager.unsubscribe(websocket, str(conversation_id))
+                
+                elif message_type in ("typing", "stop_typing"):
+                    # Send typing status to the conversation room only
+                    conversation_id = data.get("conversation_id")
+                    if not conversation_id:
+                        continue
+                    room = str(conversation_id)
+                    typing = message_type == "typing"
+                    if not manager.is_subscribed(websocket, room):
+                        continue
+                    if not manager.should_forward_typing(user.id, room, typing):
+                        continue
+                    
+                    event = {
+                        "type": "user_typing" if typing else "user_stop_typing",
+                        "user_id": user.id,
+                        "conversation_id": conversation_id,
+                        "timestamp": datetime.utcnow().isoformat()
+                    }
+                    if typing:
+                        event["user_name"] = user.name
+                    await manager.send_to_room(event, room, exclude_user_id=user.id)
+                
+                elif message_type == "chat_request":
+                    # Stream an AI answer over this socket, multiplexed by request id
+                    request_id = data.get("request_id")
+                    content = data.get("content")
+                    try:
+                        conversation_id = int(data.get("conversation_id"))
+                    except (TypeError, ValueError):
+                        conversation_id = None
+                    
+                    error = None
+                    if not isinstance(request_id, str) or not request_id:
+                        error = "request_id is required"
+                    elif request_id in chat_tasks:
+                        error = "Duplicate request_id"
+                    elif conversation_id is None or not content:
+                        error = "conversation_id and content are required"
+                    elif len(chat_tasks) >= settings.WS_MAX_CHAT_REQUESTS:
+                        error = "Too many concurrent chat requests"
+                    if error:
+                        manager.send_to_socket(websocket, {
+                            "type": "chat_error",
+                            "request_id": request_id,
+                            "error": error
+                        })
+                        continue
+                    
+                    task = asyncio.create_task(
+                        stream_chat_response(websocket, user, request_id, conversation_id, content)
+                    )
+                    chat_tasks[request_id] = task
+                    task.add_done_callback(lambda _, rid=request_id: chat_tasks.pop(rid, None))
+                
+                elif message_type == "chat_cancel":
+                    task = chat_tasks.get(data.get("request_id"))
+                    if task:
+                        task.cancel()
                 
                 elif message_type == "get_online_users":
-                    # Send current online users
-                    await websocket.send_json({
+                    # Send one page of online users, scoped to an institution
+                    institution_id = data.get("institution_id")
+                    if user.role != UserRole.super_admin and user.institution_id:
+                        institution_id = user.institution_id
+                    offset = max(_int_param(data, "offset", 0), 0)
+                    limit = min(max(_int_param(data, "limit", 50), 1), 200)
+                    users, total = await manager.get_online_users(institution_id, offset, limit)
+                    manager.send_to_socket(websocket, {
                         "type": "online_users",
-                        "users": manager.get_online_users(),
+                        "users": users,
+                        "total": total,
+                        "offset": offset,
+                        "limit": limit,
                         "timestamp": datetime.utcnow().isoformat()
                     })
                 
         except WebSocketDisconnect:
-            # Handle disconnect
+            pass
+        
+        finally:
+            # Stop generating answers nobody will receive
+            for task in list(chat_tasks.values()):
+                task.cancel()
+            # Runs on any exit, so a failing handler cannot leave the socket in
+            # rooms, presence or the outbox (announces user_left on the last socket)
             manager.disconnect(websocket)
             
-            # Broadcast user left
-            await manager.broadcast({
-                "type": "user_left",
-                "user": {
-                    "id": user.id,
-                    "name": user.name,
-                    "role": user.role
-                },
-                "online_users": manager.get_online_users(),
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
     except WebSocketDisconnect:
         # Failed to authenticate
         pass
\ No newline at end of file
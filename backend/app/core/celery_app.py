@@ -5,7 +5,7 @@ celery_app = Celery(
     "ai_tutor",
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=["app.tasks.report_tasks"]
+    include=["app.tasks.report_tasks", "app.tasks.ingestion_tasks"]
 )
 
 # Celery configuration
@@ -20,4 +20,6 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    # Ingestion jobs get their own queue so they can be given dedicated workers
+    task_routes={"app.tasks.ingestion_tasks.*": {"queue": "ingestion"}},
 )
\ No newline at end of file
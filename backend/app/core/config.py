@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl
 
@@ -17,6 +17,9 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    REVOCATION_FILTER_CAPACITY: int = 100000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    REVOCATION_SYNC_SECONDS: float = 5.0
     
     # Database
     DATABASE_URL: str
@@ -24,6 +27,17 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str
     
+    # WebSocket
+    WS_BACKPLANE: str = "local"  # "local" (single process) or "redis"
+    WS_BACKPLANE_HEARTBEAT_SECONDS: float = 15.0  # a node missing 3 heartbeats is dropped from routing
+    WS_TYPING_THROTTLE_SECONDS: float = 3.0
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_MAX_CHAT_REQUESTS: int = 4
+    WS_MAX_CONNECTIONS_PER_USER: int = 5
+    WS_IDLE_TIMEOUT_SECONDS: float = 90.0
+    PRESENCE_TTL_SECONDS: float = 90.0
+    PRESENCE_SWEEP_SECONDS: float = 30.0
+    
     # Celery
     CELERY_BROKER_URL: Optional[str] = None
     CELERY_RESULT_BACKEND: Optional[str] = None
@@ -33,10 +47,51 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     AI_SERVICE_URL: str
     
+    # Vector store: "qdrant", or "local" for an in-process memory-mapped index (small deployments, tests)
+    VECTOR_BACKEND: str = "qdrant"
+    VECTOR_LOCAL_PATH: str = "data/vector_index"
+    VECTOR_LOCAL_DTYPE: str = "float32"  # "float32" or "int8" (4x smaller, slightly lower precision)
+    
     # Qdrant
-    QDRANT_URL: str
+    QDRANT_URL: Optional[str] = None
     QDRANT_HOST: Optional[str] = None
     QDRANT_PORT: Optional[int] = None
+    QDRANT_UPSERT_BATCH_SIZE: int = 256
+    QDRANT_UPSERT_CONCURRENCY: int = 4
+    QDRANT_COLLECTION_PROFILE: str = "default"  # "default", "ondisk", "scalar" or "binary"
+    QDRANT_HNSW_M: Optional[int] = None
+    QDRANT_HNSW_EF_CONSTRUCT: Optional[int] = None
+    QDRANT_HNSW_EF: Optional[int] = None
+    QDRANT_QUANTIZATION_OVERSAMPLING: Optional[float] = None
+    
+    # Embedding ingestion
+    EMBEDDING_PROVIDER: str = "openai"  # "openai" or "hash" (deterministic, offline)
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS: int = 1536  # text-embedding-3 models can return shortened vectors, e.g. 512 or 768
+    EMBEDDING_BATCH_SIZE: int = 128
+    EMBEDDING_CONCURRENCY: int = 4
+    INGESTION_MAX_RETRIES: int = 4
+    EMBEDDING_CACHE_BACKEND: str = "redis"  # "redis", "disk" or "none"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500000
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    
+    # RAG retrieval
+    RAG_HYBRID_SEARCH: bool = True
+    RAG_PREFETCH_MULTIPLIER: int = 4  # candidates per branch = k * multiplier
+    RAG_QUERY_EMBEDDING_CACHE_SIZE: int = 10000
+    RAG_QUERY_EMBEDDING_CACHE_TTL: int = 86400  # seconds
+    RAG_RESULT_CACHE_TTL: int = 300  # seconds; 0 disables the result cache
+    RAG_CANDIDATE_MULTIPLIER: int = 3  # candidates fetched per context slot before packing
+    RAG_SCORE_THRESHOLD: Optional[float] = 0.25  # minimum dense cosine similarity; None disables
+    RAG_CONTEXT_TOKEN_BUDGET: int = 1500  # estimated tokens of retrieved context per prompt
+    
+    # Multi-tenant retrieval: institution uploads go to per-institution collections
+    RAG_TENANT_COLLECTIONS: bool = True
+    RAG_TENANT_PROFILES: Dict[str, str] = {}  # institution_id -> collection profile, e.g. {"hot-uni": "scalar"}
+    
+    # RAG uploads (spool directory must be shared with the Celery workers)
+    RAG_UPLOAD_DIR: str = "app/uploads/rag"
+    RAG_MAX_UPLOAD_MB: int = 200  # keep in step with client_max_body_size for /api/v1/rag/upload in nginx
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -0,0 +1,33 @@
+"""
+Minimal Prometheus text exposition for the /metrics endpoint.
+
+Components register a collector returning (name, type, help, value) samples;
+the endpoint renders whatever is registered at scrape time.
+"""
+from typing import Callable, Iterable, List, Tuple, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+Sample = Tuple[str, str, str, Union[int, float]]
+
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+
+def register_collector(collector: Callable[[], Iterable[Sample]]):
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    lines = []
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception as e:
+            logger.error(f"Metrics collector failed: {e}")
+            continue
+        for name, metric_type, help_text, value in samples:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
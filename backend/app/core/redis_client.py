@@ -0,0 +1,21 @@
+from typing import Optional
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+_redis: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Return the shared asyncio Redis client (created lazily, pooled)"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis
+
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
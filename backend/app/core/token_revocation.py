@@ -0,0 +1,126 @@
+"""
+Refresh-token rotation and session revocation backed by Redis.
+
+Revoked sessions live in a Redis sorted set (member = session id, score =
+expiry epoch). Every process mirrors that set into a small Bloom filter so
+the per-request "is this session revoked?" check is answered in memory; only
+filter hits (real revocations or rare false positives) go to Redis.
+"""
+from typing import Iterable, Optional
+import hashlib
+import logging
+import math
+import time
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REVOKED_SESSIONS_KEY = "auth:revoked_sessions"
+REVOKED_VERSION_KEY = "auth:revoked_sessions:version"
+USED_REFRESH_KEY_PREFIX = "auth:refresh_used:"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class TokenRevocationStore:
+    """Redis revocation set with an in-process Bloom filter in front of it"""
+
+    def __init__(
+        self,
+        capacity: int = settings.REVOCATION_FILTER_CAPACITY,
+        error_rate: float = settings.REVOCATION_FILTER_ERROR_RATE,
+        sync_interval: float = settings.REVOCATION_SYNC_SECONDS
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._filter = BloomFilter(capacity, error_rate)
+        self._version: Optional[str] = None
+        self._last_sync = 0.0
+
+    async def _sync(self):
+        """Rebuild the local filter when another process revoked a session"""
+        now = time.time()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        try:
+            redis = get_redis()
+            version = await redis.get(REVOKED_VERSION_KEY)
+            if version == self._version:
+                return
+
+            # Drop expired revocations, then reload what is still live
+            await redis.zremrangebyscore(REVOKED_SESSIONS_KEY, "-inf", now)
+            members = await redis.zrangebyscore(REVOKED_SESSIONS_KEY, now, "+inf")
+
+            bloom = BloomFilter(max(self.capacity, len(members)), self.error_rate)
+            for member in members:
+                bloom.add(member)
+            self._filter = bloom
+            self._version = version
+        except Exception as e:
+            # Keep serving from the last known filter
+            logger.warning(f"Failed to sync token revocation filter: {e}")
+
+    async def is_session_revoked(self, session_id: str) -> bool:
+        """Check a session id; only Bloom filter hits cost a Redis round trip"""
+        await self._sync()
+        if session_id not in self._filter:
+            return False
+
+        try:
+            score = await get_redis().zscore(REVOKED_SESSIONS_KEY, session_id)
+        except Exception as e:
+            logger.warning(f"Failed to confirm session revocation: {e}")
+            return True
+        return score is not None and score > time.time()
+
+    async def revoke_session(self, session_id: str, expires_at: float):
+        """Revoke every access and refresh token issued for a session"""
+        redis = get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(REVOKED_SESSIONS_KEY, {session_id: expires_at})
+            pipe.incr(REVOKED_VERSION_KEY)
+            await pipe.execute()
+        self._filter.add(session_id)
+
+    async def consume_refresh_token(self, jti: str, expires_at: float) -> bool:
+        """
+        Atomically mark a refresh token as used.
+
+        Returns False when the token was already exchanged, i.e. it is being
+        replayed and its session should be treated as compromised.
+        """
+        ttl = max(int(expires_at - time.time()), 1)
+        result = await get_redis().set(f"{USED_REFRESH_KEY_PREFIX}{jti}", 1, nx=True, ex=ttl)
+        return bool(result)
+
+
+# Singleton instance
+revocation_store = TokenRevocationStore()
@@ -1,12 +1,15 @@
 from fastapi import FastAPI, Request, Response, WebSocket
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.core.config import settings
 from app.core.database import engine, Base
+from app.core.metrics import render_metrics
+from app.core.redis_client import close_redis
 from app.api.v1.api import api_router
-from app.api.v1.websocket import websocket_endpoint
+from app.api.v1.websocket import websocket_endpoint, manager
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -25,9 +28,12 @@ class UTF8Middleware(BaseHTTPMiddleware):
 async def lifespan(app: FastAPI):
     # Startup
     print("Starting up AI Tutor System...")
+    await manager.start()
     yield
     # Shutdown
     print("Shutting down AI Tutor System...")
+    await manager.stop()
+    await close_redis()
 
 
 app = FastAPI(
@@ -67,6 +73,11 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # WebSocket endpoint
 @app.websocket("/ws/{token}")
 async def websocket_route(websocket: WebSocket, token: str):
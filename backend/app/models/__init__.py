@@ -3,5 +3,6 @@ from app.models.conversation import Conversation, Message
 from app.models.learning import LearningPath, AITool
 from app.models.report import Report
 from app.models.content import Content, ContentCategory
+from app.models.rag_document import RagDocument
 
-__all__ = ["User", "Conversation", "Message", "LearningPath", "AITool", "Report", "Content", "ContentCategory"]
\ No newline at end of file
+__all__ = ["User", "Conversation", "Message", "LearningPath", "AITool", "Report", "Content", "ContentCategory", "RagDocument"]
\ No newline at end of file
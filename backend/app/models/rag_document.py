@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Enum, JSON, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import enum
+
+from app.core.database import Base
+
+
+class EmbeddingStatus(str, enum.Enum):
+    pending = "pending"
+    processing = "processing"
+    completed = "completed"
+    failed = "failed"
+
+
+class RagDocument(Base):
+    __tablename__ = "rag_documents"
+
+    # Same id as the "document_id" payload field on the document's Qdrant points
+    id = Column(String(36), primary_key=True)
+    title = Column(String(255), nullable=False)
+    category = Column(String(50), index=True)
+    source = Column(String(50))
+    filename = Column(String(255))
+    content_hash = Column(String(64), index=True)
+    chunk_count = Column(Integer, default=0, nullable=False)
+    embedding_status = Column(Enum(EmbeddingStatus), default=EmbeddingStatus.pending, nullable=False)
+    point_ids = Column(JSON)  # Qdrant point ids in chunk order
+    extra_metadata = Column("metadata", JSON)
+    error_message = Column(Text)
+    
+    uploaded_by = Column(Integer, ForeignKey("users.id"), index=True)
+    institution_id = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    uploader = relationship("User")
+
+    __table_args__ = (
+        Index("idx_rag_documents_institution_created", "institution_id", "created_at"),
+        Index("idx_rag_documents_category_created", "category", "created_at"),
+    )
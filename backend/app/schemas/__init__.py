@@ -1,9 +1,9 @@
 from app.schemas.user import User, UserCreate, UserUpdate
-from app.schemas.auth import Token, TokenData, LoginRequest
+from app.schemas.auth import Token, TokenData, LoginRequest, RefreshTokenRequest
 from app.schemas.chat import ConversationCreate, MessageCreate, ConversationResponse, MessageResponse
 
 __all__ = [
     "User", "UserCreate", "UserUpdate",
-    "Token", "TokenData", "LoginRequest",
+    "Token", "TokenData", "LoginRequest", "RefreshTokenRequest",
     "ConversationCreate", "MessageCreate", "ConversationResponse", "MessageResponse"
 ]
\ No newline at end of file
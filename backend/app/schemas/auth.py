@@ -12,6 +12,10 @@ class TokenData(BaseModel):
     email: Optional[str] = None
 
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
\ No newline at end of file
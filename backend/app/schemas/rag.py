@@ -19,13 +19,30 @@ class DocumentResponse(BaseModel):
     success: bool
     message: str
     document_ids: List[str] = Field(default_factory=list)
+    document_id: Optional[str] = Field(None, description="Registry ID of the uploaded source document")
+    job_id: Optional[str] = Field(None, description="Ingestion job ID to poll for progress")
+
+
+class IngestionJobResponse(BaseModel):
+    """Progress of an asynchronous ingestion job"""
+    job_id: str
+    status: str  # pending, processing, completed, failed
+    progress: int  # 0-100
+    chunks_embedded: int = 0
+    total_chunks: int = 0
+    document_id: Optional[str] = None
+    message: Optional[str] = None
 
 
 class RAGQuery(BaseModel):
     """Schema for RAG query"""
     question: str = Field(..., description="Question to ask the RAG system")
     session_id: Optional[str] = Field(None, description="Session ID for context")
-    filters: Optional[Dict[str, Any]] = Field(None, description="Filters for document search")
+    filters: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Filters for document search: category, institution_id, uploaded_by, document_id, language "
+                    "(a list value matches any of its items)"
+    )
 
 
 class RAGResponse(BaseModel):
@@ -28,7 +28,8 @@ async def get_ai_response(
             from .rag_service import rag_service
             rag_result = await rag_service.ask(
                 question=user_message,
-                user_id=user.id
+                user_id=user.id,
+                institution_id=user.institution_id
             )
             if rag_result and rag_result.get("answer"):
                 rag_context = f"\n\n참고 자료:\n{rag_result['answer']}\n"
@@ -100,7 +101,8 @@ async def get_ai_response_stream(
             from .rag_service import rag_service
             rag_result = await rag_service.ask(
                 question=user_message,
-                user_id=user.id
+                user_id=user.id,
+                institution_id=user.institution_id
             )
             if rag_result and rag_result.get("answer"):
                 rag_context = f"\n\n참고 자료:\n{rag_result['answer']}\n"
@@ -0,0 +1,302 @@
+"""
+Blue/green rebuild of the knowledge collection.
+
+The points are copied into a new physical collection created with the target
+profile and vector size. Then the public name is pointed at it through a
+Qdrant alias, while the old collection keeps serving until the swap:
+
+- Same vector size: the stored vectors are copied as they are.
+- Different size, or --reembed: each chunk's stored text is embedded again
+  with the configured embedding provider at the new size. No source file is needed.
+- Chunks that have no sparse vector yet get one, so legacy collections gain
+  hybrid search along the way.
+
+Point ids are content-addressed, so the rebuilt collection keeps the ids that
+the rag_documents registry records. Ingestion can keep running during the
+copy. Writes and deletes that land on the old collection are replayed by
+id-diff catch-up passes until the two converge. Then writes are paused with a
+Redis write fence (upserts and deletes wait while it is held), in-flight
+upserts are given a few seconds to land, and a last catch-up replays the
+remaining inserts and deletes before the swap:
+
+- When the name is already an alias, it is moved to the new collection
+  atomically.
+- The very first migration of a plain collection has to delete it before the
+  alias can take its name; the fence keeps writers away from the gap.
+
+The fence expires on its own if the migration dies while holding it.
+
+The CLI rebuilds the shared collection and then every tenant collection
+({name}_tenant_*), each with its own swap. Tenant collections listed in
+RAG_TENANT_PROFILES keep their configured profile.
+
+Changing the vector size, in this order:
+
+1. Deploy a release that sizes embeddings from the collections (API and
+   Celery workers). Each process embeds at the size its collection stores,
+   so EMBEDDING_DIMENSIONS no longer has to match it.
+2. Set EMBEDDING_DIMENSIONS to the new size. It only decides the size of
+   collections created from then on, such as a new tenant's.
+3. Run the CLI with --dimensions. After each swap, the first search or
+   upsert of a running process fails on the old size. The process then
+   re-reads the collection's size, switches embeddings, and retries, so no
+   restart is needed.
+
+    python -m app.services.collection_migration --profile scalar
+    python -m app.services.collection_migration --dimensions 512
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+import argparse
+import logging
+import time
+
+import redis
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    PointIdsList,
+    PointStruct
+)
+
+from ..core.config import settings
+from .collection_profiles import (
+    CollectionProfile,
+    create_collection,
+    dense_vector_size,
+    get_profile,
+    list_collections,
+    resolve_collection
+)
+from .embedding_pipeline import CONTENT_KEY, WRITE_FENCE_PREFIX
+from .embedding_providers import create_embedding_provider
+from .sparse_encoder import SPARSE_VECTOR_NAME, encode as encode_sparse
+from .vector_common import tenant_collection_name
+
+logger = logging.getLogger(__name__)
+
+# Re-embeds a batch of chunk texts at the target size
+EmbedFunction = Callable[[List[str]], List[List[float]]]
+
+# Catch-up passes before giving up on a source that keeps changing
+MAX_CATCH_UP_PASSES = 5
+
+# Upper bound on a write pause, in case the migration dies holding the fence
+WRITE_FENCE_TTL = 300
+
+# Time for upserts sent before the fence (with wait=False) to be applied
+WRITE_FENCE_GRACE_SECONDS = 5.0
+
+
+def is_alias(client: QdrantClient, name: str) -> bool:
+    return any(alias.alias_name == name for alias in client.get_aliases().aliases)
+
+
+@contextmanager
+def write_fence(redis_client: Optional[redis.Redis], name: str, grace: float = WRITE_FENCE_GRACE_SECONDS):
+    """Pause writes to a collection for the duration of the block"""
+    if redis_client is None:
+        yield
+        return
+    redis_client.set(WRITE_FENCE_PREFIX + name, "1", ex=WRITE_FENCE_TTL)
+    try:
+        time.sleep(grace)
+        yield
+    finally:
+        redis_client.delete(WRITE_FENCE_PREFIX + name)
+
+
+def point_ids(client: QdrantClient, collection: str, batch_size: int = 1000) -> Set:
+    ids = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection, limit=batch_size, offset=offset, with_payload=False, with_vectors=False
+        )
+        ids.update(point.id for point in points)
+        if offset is None:
+            return ids
+
+
+def convert_points(points: Iterable, embed: Optional[EmbedFunction] = None) -> List[PointStruct]:
+    """Rebuild points for the target layout, re-embedding texts and adding sparse vectors where needed"""
+    points = list(points)
+    texts = [(point.payload or {}).get(CONTENT_KEY, "") for point in points]
+    dense = embed(texts) if embed and points else None
+
+    converted = []
+    for index, (point, text) in enumerate(zip(points, texts)):
+        vectors = point.vector if isinstance(point.vector, dict) else {"": point.vector}
+        if dense is not None:
+            vectors = {**vectors, "": dense[index]}
+        if SPARSE_VECTOR_NAME not in vectors:
+            vectors = {**vectors, SPARSE_VECTOR_NAME: encode_sparse(text)}
+        converted.append(PointStruct(id=point.id, vector=vectors, payload=point.payload))
+    return converted
+
+
+def copy_points(
+    client: QdrantClient,
+    source: str,
+    target: str,
+    batch_size: int = 256,
+    embed: Optional[EmbedFunction] = None,
+    ids: Optional[Iterable] = None
+) -> int:
+    """Copy every point (or only the given ids) with payload and vectors"""
+    copied = 0
+    offset = None
+    pending = list(ids) if ids is not None else None
+    while True:
+        if pending is None:
+            points, offset = client.scroll(
+                collection_name=source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+            )
+        else:
+            points = client.retrieve(source, ids=pending[:batch_size], with_payload=True, with_vectors=True)
+            pending = pending[batch_size:]
+
+        batch = convert_points(points, embed)
+        if batch:
+            client.upsert(collection_name=target, points=batch, wait=True)
+            copied += len(batch)
+            logger.info(f"Copied {copied} points into {target}")
+        if (pending is None and offset is None) or pending == []:
+            return copied
+
+
+def catch_up(
+    client: QdrantClient,
+    source: str,
+    target: str,
+    batch_size: int = 256,
+    embed: Optional[EmbedFunction] = None
+) -> int:
+    """Replay inserts and deletes made on the source since the copy; returns how many points changed"""
+    source_ids = point_ids(client, source)
+    target_ids = point_ids(client, target)
+    missing = source_ids - target_ids
+    removed = list(target_ids - source_ids)
+
+    if missing:
+        copy_points(client, source, target, batch_size, embed, ids=missing)
+    for start in range(0, len(removed), batch_size):
+        client.delete(
+            collection_name=target, points_selector=PointIdsList(points=removed[start:start + batch_size]), wait=True
+        )
+    return len(missing) + len(removed)
+
+
+def rebuild_collection(
+    client: QdrantClient,
+    name: str,
+    profile: CollectionProfile,
+    size: Optional[int] = None,
+    batch_size: int = 256,
+    keep_old: bool = False,
+    embed: Optional[EmbedFunction] = None,
+    redis_client: Optional[redis.Redis] = None
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    aliased = is_alias(client, name)
+    source = resolve_collection(client, name)
+    if source is None:
+        raise ValueError(f"Collection not found: {name}")
+
+    source_size = dense_vector_size(client, source)
+    size = size or source_size
+    if size != source_size and embed is None:
+        raise ValueError(f"Changing the vector size from {source_size} to {size} requires re-embedding")
+
+    target = f"{name}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    suffix = 1
+    while client.collection_exists(target):
+        suffix += 1
+        target = f"{name}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{suffix}"
+
+    create_collection(client, target, profile, size)
+    copied = copy_points(client, source, target, batch_size, embed)
+
+    for _ in range(MAX_CATCH_UP_PASSES):
+        if not catch_up(client, source, target, batch_size, embed):
+            break
+    else:
+        client.delete_collection(target)
+        raise RuntimeError(f"{source} kept changing during the rebuild; try again when ingestion is quieter")
+
+    # The target only receives writes once the alias points at it, so with
+    # writes paused a full id diff is exact
+    with write_fence(redis_client, name):
+        catch_up(client, source, target, batch_size, embed)
+        if aliased:
+            client.update_collection_aliases(change_aliases_operations=[
+                DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=name)),
+                CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=name))
+            ])
+        else:
+            # A collection and an alias cannot share a name, so the old one goes first
+            client.delete_collection(source)
+            client.update_collection_aliases(change_aliases_operations=[
+                CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=name))
+            ])
+    if aliased and not keep_old:
+        client.delete_collection(source)
+
+    return {
+        "alias": name,
+        "source": source,
+        "target": target,
+        "profile": profile.name,
+        "dimensions": size,
+        "reembedded": embed is not None,
+        "points": client.count(collection_name=target, exact=True).count,
+        "copied": copied,
+        "old_collection_kept": aliased and keep_old,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blue/green rebuild of the knowledge collections")
+    parser.add_argument("--profile", default=settings.QDRANT_COLLECTION_PROFILE)
+    parser.add_argument("--collection", default="ai_tutor_knowledge")
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS, help="dense vector size")
+    parser.add_argument("--reembed", action="store_true", help="re-embed even if the size is unchanged")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--keep-old", action="store_true", help="keep the previous collection after the swap")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    try:
+        redis_client.ping()
+    except redis.RedisError as e:
+        parser.error(f"Redis is needed to pause writes during the swap: {e}")
+
+    tenant_profiles = {
+        tenant_collection_name(args.collection, institution_id): name
+        for institution_id, name in settings.RAG_TENANT_PROFILES.items()
+    }
+    provider = None
+    for name in [args.collection, *list_collections(client, f"{args.collection}_tenant_")]:
+        embed = None
+        source = resolve_collection(client, name)
+        if args.reembed or (source and dense_vector_size(client, source) != args.dimensions):
+            provider = provider or create_embedding_provider(dimensions=args.dimensions)
+            embed = provider.embed_documents
+
+        result = rebuild_collection(
+            client, name, get_profile(tenant_profiles.get(name, args.profile)),
+            size=args.dimensions, batch_size=args.batch_size, keep_old=args.keep_old, embed=embed,
+            redis_client=redis_client
+        )
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Storage profiles for the knowledge collection.
+
+A profile fixes how Qdrant stores and searches the dense vectors:
+
+- default:  float32 vectors and HNSW graph in RAM (original behaviour)
+- ondisk:   float32 vectors memory-mapped from disk, HNSW graph on disk
+- scalar:   int8 quantized copy in RAM, originals on disk; searches
+            oversample the quantized candidates and rescore with originals
+- binary:   1-bit quantized copy in RAM (~32x smaller), originals on disk;
+            needs more oversampling than scalar to keep recall
+
+HNSW m / ef_construct / ef and the oversampling factor can be overridden
+through settings without defining a new profile. The module also owns the
+rest of the collection layout (sparse field, payload indexes, aliases) so the
+service and the migration command create identical collections.
+"""
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+import logging
+
+from qdrant_client.http.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    HnswConfigDiff,
+    Modifier,
+    PayloadSchemaType,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SparseVectorParams,
+    VectorParams
+)
+
+from ..core.config import settings
+from .sparse_encoder import SPARSE_VECTOR_NAME
+
+logger = logging.getLogger(__name__)
+
+# Payload fields filtered on by deletes and queries
+INDEXED_PAYLOAD_FIELDS = {
+    "metadata.document_id": PayloadSchemaType.KEYWORD,
+    "metadata.category": PayloadSchemaType.KEYWORD,
+    "metadata.institution_id": PayloadSchemaType.KEYWORD,
+    "metadata.uploaded_by": PayloadSchemaType.INTEGER,
+    "metadata.language": PayloadSchemaType.KEYWORD,
+}
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    name: str
+    quantization: Optional[str] = None  # "scalar", "binary" or None
+    on_disk: bool = False
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_ef: Optional[int] = None
+    oversampling: float = 1.0
+
+    def vectors_config(self, size: int) -> VectorParams:
+        return VectorParams(size=size, distance=Distance.COSINE, on_disk=self.on_disk)
+
+    def sparse_vectors_config(self) -> Dict[str, SparseVectorParams]:
+        return {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+
+    def hnsw_config(self) -> HnswConfigDiff:
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct, on_disk=self.on_disk)
+
+    def quantization_config(self):
+        if self.quantization == "scalar":
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8, quantile=0.99, always_ram=True
+            ))
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self) -> Optional[SearchParams]:
+        quantization = None
+        if self.quantization:
+            quantization = QuantizationSearchParams(rescore=True, oversampling=self.oversampling)
+        if quantization is None and self.hnsw_ef is None:
+            return None
+        return SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def estimated_ram_bytes(self, points: int, size: int) -> int:
+        """Rough resident size of vectors plus graph for capacity planning"""
+        ram = 0 if self.on_disk else points * size * 4
+        if self.quantization == "scalar":
+            ram += points * size
+        elif self.quantization == "binary":
+            ram += points * size // 8
+        if not self.on_disk:
+            ram += points * self.hnsw_m * 2 * 4
+        return ram
+
+
+PROFILES: Dict[str, CollectionProfile] = {
+    "default": CollectionProfile(name="default"),
+    "ondisk": CollectionProfile(name="ondisk", on_disk=True),
+    "scalar": CollectionProfile(name="scalar", quantization="scalar", on_disk=True, oversampling=2.0),
+    "binary": CollectionProfile(name="binary", quantization="binary", on_disk=True, oversampling=3.0),
+}
+
+
+def get_profile(name: Optional[str] = None) -> CollectionProfile:
+    """Look up a profile and apply any HNSW / oversampling overrides from settings"""
+    name = name or settings.QDRANT_COLLECTION_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown collection profile: {name}. Choose from: {', '.join(PROFILES)}")
+    overrides = {
+        field: value for field, value in {
+            "hnsw_m": settings.QDRANT_HNSW_M,
+            "hnsw_ef_construct": settings.QDRANT_HNSW_EF_CONSTRUCT,
+            "hnsw_ef": settings.QDRANT_HNSW_EF,
+            "oversampling": settings.QDRANT_QUANTIZATION_OVERSAMPLING,
+        }.items() if value is not None
+    }
+    return replace(PROFILES[name], **overrides)
+
+
+def resolve_collection(client, name: str) -> Optional[str]:
+    """Physical collection behind a name that may be an alias; None if neither exists"""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name if client.collection_exists(name) else None
+
+
+def list_collections(client, prefix: str) -> List[str]:
+    """Logical collection names (aliases, or collections no alias points at) starting with prefix"""
+    aliases = client.get_aliases().aliases
+    behind_alias = {alias.collection_name for alias in aliases}
+    names = {alias.alias_name for alias in aliases if alias.alias_name.startswith(prefix)}
+    names.update(
+        collection.name for collection in client.get_collections().collections
+        if collection.name.startswith(prefix) and collection.name not in behind_alias
+    )
+    return sorted(names)
+
+
+def dense_vector_size(client, name: str) -> int:
+    vectors = client.get_collection(name).config.params.vectors
+    return (vectors[""] if isinstance(vectors, dict) else vectors).size
+
+
+def create_collection(client, name: str, profile: CollectionProfile, size: int):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=profile.vectors_config(size),
+        sparse_vectors_config=profile.sparse_vectors_config(),
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config()
+    )
+    ensure_payload_indexes(client, name)
+    logger.info(f"Created collection {name} with profile '{profile.name}'")
+
+
+def ensure_payload_indexes(client, name: str):
+    """Create keyword indexes for filtered payload fields (no-op if present)"""
+    existing = client.get_collection(name).payload_schema or {}
+    for field, schema in INDEXED_PAYLOAD_FIELDS.items():
+        if field not in existing:
+            client.create_payload_index(collection_name=name, field_name=field, field_schema=schema)
+            logger.info(f"Created payload index: {field}")
@@ -0,0 +1,129 @@
+"""
+Token-budgeted packing of retrieved chunks into the RAG prompt.
+
+Retrieval over-fetches candidates (already cut by the similarity threshold),
+and the packer then decides what the model actually reads:
+
+1. Overlap removal: the splitter repeats up to 200 characters between
+   neighbouring chunks of a document. A chunk contained in a better-ranked one
+   is dropped, and text it shares with one is cut from it.
+2. Sentence trimming: only sentences that share terms with the question are
+   kept, plus their neighbours for context. A chunk with no lexical match at
+   all was found semantically, so it is kept whole.
+3. Budget packing: chunks are taken in rank order until the token budget or
+   the top-k limit is reached.
+
+Token counts are estimated, not tokenized. Hangul syllables are counted as
+one token each and other text as four characters per token, which is close
+enough for both the Anthropic and OpenAI tokenizers on this corpus.
+"""
+from typing import List, Optional, Set
+import re
+
+from langchain_core.documents import Document
+
+from .sparse_encoder import tokenize
+
+# Shorter shared runs are coincidence, not splitter overlap
+MIN_OVERLAP_CHARS = 30
+
+# Sentences kept on each side of a matching sentence
+SENTENCE_WINDOW = 1
+
+_HANGUL = re.compile(r"[가-힣]")
+_SENTENCE_END = re.compile(r"(?<=[.!?。])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    hangul = len(_HANGUL.findall(text))
+    return hangul + (len(text) - hangul + 3) // 4
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def overlap_length(first: str, second: str, min_overlap: int = MIN_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of first that is also a prefix of second"""
+    for length in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+def remove_overlaps(documents: List[Document]) -> List[Document]:
+    """Drop or cut chunks that repeat text from better-ranked chunks of the same document"""
+    kept: List[Document] = []
+    for doc in documents:
+        text = doc.page_content.strip()
+        source = doc.metadata.get("document_id")
+        for other in kept:
+            if source is None or other.metadata.get("document_id") != source:
+                continue
+            if text in other.page_content:
+                text = ""
+                break
+            # Either chunk may come first in the source document
+            head = overlap_length(other.page_content, text)
+            if head:
+                text = text[head:].strip()
+            tail = overlap_length(text, other.page_content)
+            if tail:
+                text = text[:-tail].strip()
+        if text:
+            kept.append(Document(page_content=text, metadata=doc.metadata))
+    return kept
+
+
+def trim_to_query(text: str, query_terms: Set[str], window: int = SENTENCE_WINDOW) -> str:
+    sentences = split_sentences(text)
+    matches = [index for index, sentence in enumerate(sentences) if query_terms & set(tokenize(sentence))]
+    if not matches:
+        return text
+
+    keep = set()
+    for index in matches:
+        keep.update(range(max(0, index - window), min(len(sentences), index + window + 1)))
+    return " ".join(sentences[index] for index in sorted(keep))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Longest run of whole sentences (or a character prefix) that fits the budget"""
+    kept = []
+    for sentence in split_sentences(text):
+        if estimate_tokens(" ".join(kept + [sentence])) > budget:
+            break
+        kept.append(sentence)
+    if kept:
+        return " ".join(kept)
+    end = len(text)
+    while end and estimate_tokens(text[:end]) > budget:
+        end -= max(1, end // 10)
+    return text[:end]
+
+
+def pack_context(
+    documents: List[Document],
+    query: str,
+    token_budget: int,
+    max_documents: Optional[int] = None
+) -> List[Document]:
+    """Rank-ordered, overlap-free, query-trimmed chunks that fit the token budget"""
+    query_terms = set(tokenize(query))
+    packed: List[Document] = []
+    used = 0
+    for doc in remove_overlaps(documents):
+        if max_documents is not None and len(packed) >= max_documents:
+            break
+        text = trim_to_query(doc.page_content, query_terms)
+        tokens = estimate_tokens(text)
+        if used + tokens > token_budget:
+            if packed:
+                # A smaller chunk further down may still fit
+                continue
+            # Never answer from an empty context just because the best chunk is long
+            text = truncate_to_tokens(text, token_budget)
+            tokens = estimate_tokens(text)
+        packed.append(Document(page_content=text, metadata={**doc.metadata, "_tokens": tokens}))
+        used += tokens
+    return packed
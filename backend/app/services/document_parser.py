@@ -0,0 +1,229 @@
+"""
+Streaming text extraction for RAG uploads.
+
+Parsers yield small Segments (a paragraph, a PDF page) with their page number
+and heading instead of returning the whole document, so memory stays bounded
+for very large manuals and chunks can be embedded while the rest of the file
+is still being read.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import codecs
+import hashlib
+import os
+import re
+
+from langchain_core.documents import Document
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - optional format
+    PdfReader = None
+
+try:
+    import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+except ImportError:  # pragma: no cover - optional format
+    docx = None
+
+SUPPORTED_EXTENSIONS = {"txt", "md", "pdf", "docx"}
+
+# Paragraphs are buffered up to this many characters before being flushed
+TEXT_BLOCK_CHARS = 8000
+
+_MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+@dataclass(frozen=True)
+class Segment:
+    text: str
+    page: Optional[int] = None
+    heading: Optional[str] = None
+
+
+def detect_language(text: str) -> str:
+    """'ko' when Hangul makes up a fifth of the letters, 'en' otherwise, 'unknown' without letters"""
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return "unknown"
+    hangul = sum(1 for c in letters if "가" <= c <= "힣")
+    return "ko" if hangul * 5 >= len(letters) else "en"
+
+
+def file_extension(filename: str) -> str:
+    return os.path.splitext(filename or "")[1].lstrip(".").lower()
+
+
+def file_hash(path: str) -> str:
+    """sha256 of a file's bytes, read in 1MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _detect_encoding(path: str) -> str:
+    """UTF-8 unless the first 64KB fail to decode, then CP949 (legacy Korean files)"""
+    with open(path, "rb") as f:
+        sample = f.read(64 * 1024)
+    try:
+        codecs.getincrementaldecoder("utf-8-sig")().decode(sample, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp949"
+
+
+def _iter_lines(path: str) -> Iterator[str]:
+    with open(path, "r", encoding=_detect_encoding(path), errors="replace") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def _iter_text(path: str, markdown: bool = False) -> Iterator[Segment]:
+    headings: List[str] = []
+    block: List[str] = []
+    size = 0
+
+    def flush() -> Optional[Segment]:
+        nonlocal size
+        text = "\n".join(block).strip()
+        block.clear()
+        size = 0
+        return Segment(text=text, heading=" > ".join(h for h in headings if h) or None) if text else None
+
+    for line in _iter_lines(path):
+        match = _MARKDOWN_HEADING.match(line) if markdown else None
+        if match:
+            segment = flush()
+            if segment:
+                yield segment
+            level = len(match.group(1))
+            del headings[level - 1:]
+            headings.extend([""] * (level - 1 - len(headings)))
+            headings.append(match.group(2))
+            continue
+
+        block.append(line)
+        size += len(line) + 1
+        if (not line.strip() and size >= TEXT_BLOCK_CHARS // 4) or size >= TEXT_BLOCK_CHARS:
+            segment = flush()
+            if segment:
+                yield segment
+
+    segment = flush()
+    if segment:
+        yield segment
+
+
+def _iter_pdf(path: str) -> Iterator[Segment]:
+    if PdfReader is None:
+        raise ValueError("PDF support requires the pypdf package")
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        text = (page.extract_text() or "").strip()
+        if text:
+            yield Segment(text=text, page=number)
+
+
+def _iter_docx_blocks(document) -> Iterator[Any]:
+    """Paragraphs and tables of the document body in reading order"""
+    for child in document.element.body.iterchildren():
+        if child.tag.endswith("}p"):
+            yield Paragraph(child, document)
+        elif child.tag.endswith("}tbl"):
+            yield Table(child, document)
+
+
+def _table_rows(table) -> Iterator[str]:
+    """One line per row, cells separated by ' | ' (merged cells only once)"""
+    for row in table.rows:
+        cells: List[str] = []
+        for cell in row.cells:
+            text = " ".join(cell.text.split())
+            if text and (not cells or cells[-1] != text):
+                cells.append(text)
+        if cells:
+            yield " | ".join(cells)
+
+
+def _iter_docx(path: str) -> Iterator[Segment]:
+    if docx is None:
+        raise ValueError("DOCX support requires the python-docx package")
+    document = docx.Document(path)
+    headings: List[str] = []
+    for block in _iter_docx_blocks(document):
+        heading = " > ".join(h for h in headings if h) or None
+        if isinstance(block, Table):
+            for row in _table_rows(block):
+                yield Segment(text=row, heading=heading)
+            continue
+        text = block.text.strip()
+        if not text:
+            continue
+        style = block.style.name if block.style is not None else ""
+        if style.startswith("Heading"):
+            level = int(style.split()[-1]) if style.split()[-1].isdigit() else 1
+            del headings[level - 1:]
+            headings.append(text)
+            continue
+        yield Segment(text=text, heading=heading)
+
+
+def iter_segments(path: str, filename: Optional[str] = None) -> Iterator[Segment]:
+    """Yield text segments from a file, dispatching on the file extension"""
+    extension = file_extension(filename or path)
+    if extension == "pdf":
+        return _iter_pdf(path)
+    if extension == "docx":
+        return _iter_docx(path)
+    if extension == "md":
+        return _iter_text(path, markdown=True)
+    if extension in ("txt", ""):
+        return _iter_text(path)
+    raise ValueError(f"Unsupported file type: .{extension}")
+
+
+def iter_chunks(
+    segments: Iterable[Segment],
+    text_splitter,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Iterator[Document]:
+    """
+    Split segments into chunk Documents numbered across the whole file.
+
+    Consecutive segments with the same page and heading are merged before
+    splitting so chunks stay close to the splitter's target size; a chunk
+    never spans two pages or sections, which keeps its metadata exact.
+    """
+    chunk_index = 0
+    buffer: List[str] = []
+    buffered = 0
+    current_key = None
+
+    def flush() -> Iterator[Document]:
+        nonlocal chunk_index, buffered
+        if not buffer:
+            return
+        page, heading = current_key
+        for chunk in text_splitter.split_text("\n\n".join(buffer)):
+            chunk_metadata = {**(metadata or {}), "chunk_index": chunk_index}
+            if page is not None:
+                chunk_metadata["page"] = page
+            if heading:
+                chunk_metadata["heading"] = heading
+            chunk_index += 1
+            yield Document(page_content=chunk, metadata=chunk_metadata)
+        buffer.clear()
+        buffered = 0
+
+    for segment in segments:
+        key = (segment.page, segment.heading)
+        if key != current_key or buffered >= TEXT_BLOCK_CHARS:
+            yield from flush()
+            current_key = key
+        buffer.append(segment.text)
+        buffered += len(segment.text)
+
+    yield from flush()
@@ -0,0 +1,254 @@
+"""
+Content-hash embedding cache.
+
+Vectors are keyed by sha256(model and dimensions, normalized chunk text), so
+re-ingesting a revised document only pays for the chunks that actually
+changed. The cache lives in Redis (shared by every worker) or in a local
+SQLite file, and both backends evict least-recently-used entries beyond
+EMBEDDING_CACHE_MAX_ENTRIES.
+"""
+from array import array
+from typing import Dict, List, Optional, Sequence
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+from ..core.config import settings
+from ..core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(raw: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(raw)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """No-op cache; also holds the hit/miss counters shared by all backends"""
+
+    def __init__(self, max_entries: int = settings.EMBEDDING_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        return {}
+
+    async def set_many(self, vectors: Dict[str, List[float]]):
+        pass
+
+    async def size(self) -> int:
+        return 0
+
+    def record(self, hits: int, misses: int):
+        self.hits += hits
+        self.misses += misses
+
+    def collect_metrics(self):
+        lookups = self.hits + self.misses
+        yield "embedding_cache_hits_total", "counter", "Chunk embeddings served from cache", self.hits
+        yield "embedding_cache_misses_total", "counter", "Chunk embeddings computed by the provider", self.misses
+        yield "embedding_cache_evictions_total", "counter", "Cache entries evicted to stay under the size bound", self.evictions
+        yield "embedding_cache_hit_ratio", "gauge", "Cache hits over lookups since start", round(self.hits / lookups, 4) if lookups else 0.0
+
+
+class RedisEmbeddingCache(EmbeddingCache):
+    """Shared cache; a sorted set of last-access times drives LRU eviction"""
+
+    KEY_PREFIX = "emb:"
+    LRU_KEY = "emb:lru"
+
+    async def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        try:
+            redis = get_redis()
+            raw_values = await redis.mget([self.KEY_PREFIX + key for key in keys])
+            found = {key: raw for key, raw in zip(keys, raw_values) if raw}
+            if found:
+                now = time.time()
+                await redis.zadd(self.LRU_KEY, {key: now for key in found})
+            return {key: unpack_vector(base64.b64decode(raw)) for key, raw in found.items()}
+        except Exception as e:
+            logger.error(f"Embedding cache lookup failed: {e}")
+            return {}
+
+    async def set_many(self, vectors: Dict[str, List[float]]):
+        if not vectors:
+            return
+        try:
+            redis = get_redis()
+            now = time.time()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.mset({
+                    self.KEY_PREFIX + key: base64.b64encode(pack_vector(vector)).decode("ascii")
+                    for key, vector in vectors.items()
+                })
+                pipe.zadd(self.LRU_KEY, {key: now for key in vectors})
+                pipe.zcard(self.LRU_KEY)
+                results = await pipe.execute()
+
+            overflow = results[-1] - self.max_entries
+            if overflow > 0:
+                evicted = await redis.zpopmin(self.LRU_KEY, overflow)
+                if evicted:
+                    await redis.delete(*(self.KEY_PREFIX + key for key, _ in evicted))
+                    self.evictions += len(evicted)
+        except Exception as e:
+            logger.error(f"Embedding cache write failed: {e}")
+
+    async def size(self) -> int:
+        try:
+            return await get_redis().zcard(self.LRU_KEY)
+        except Exception:
+            return 0
+
+
+class DiskEmbeddingCache(EmbeddingCache):
+    """Single-node cache in a local SQLite file"""
+
+    def __init__(self, path: str = settings.EMBEDDING_CACHE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_accessed ON embeddings (accessed_at)")
+        return self._conn
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        conn = self._connect()
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+            found.update({key: unpack_vector(raw) for key, raw in rows})
+        if found:
+            now = time.time()
+            conn.executemany("UPDATE embeddings SET accessed_at = ? WHERE key = ?", [(now, key) for key in found])
+            conn.commit()
+        return found
+
+    def _set_many(self, vectors: Dict[str, List[float]]) -> int:
+        conn = self._connect()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, accessed_at) VALUES (?, ?, ?)",
+            [(key, pack_vector(vector), now) for key, vector in vectors.items()]
+        )
+        overflow = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+        conn.commit()
+        return max(overflow, 0)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        try:
+            async with self._lock:
+                return await asyncio.to_thread(self._get_many, keys)
+        except Exception as e:
+            logger.error(f"Embedding cache lookup failed: {e}")
+            return {}
+
+    async def set_many(self, vectors: Dict[str, List[float]]):
+        if not vectors:
+            return
+        try:
+            async with self._lock:
+                self.evictions += await asyncio.to_thread(self._set_many, vectors)
+        except Exception as e:
+            logger.error(f"Embedding cache write failed: {e}")
+
+    async def size(self) -> int:
+        try:
+            async with self._lock:
+                return await asyncio.to_thread(
+                    lambda: self._connect().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                )
+        except Exception:
+            return 0
+
+
+class CachedEmbeddings:
+    """Wraps an embeddings client so only cache misses reach the provider"""
+
+    def __init__(
+        self,
+        embeddings,
+        cache: EmbeddingCache,
+        model: str = f"{settings.EMBEDDING_MODEL}:{settings.EMBEDDING_DIMENSIONS}"
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model, text) for text in texts]
+        cached = await self.cache.get_many(list(set(keys)))
+
+        # Embed each distinct missing text once, even if it repeats in the batch
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.cache.record(hits=len(texts) - sum(1 for key in keys if key in missing), misses=len(missing))
+
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await self.cache.set_many(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+
+def create_embedding_cache() -> EmbeddingCache:
+    if settings.EMBEDDING_CACHE_BACKEND == "redis":
+        return RedisEmbeddingCache()
+    if settings.EMBEDDING_CACHE_BACKEND == "disk":
+        return DiskEmbeddingCache()
+    return EmbeddingCache()
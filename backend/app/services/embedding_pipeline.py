@@ -0,0 +1,173 @@
+"""
+Batched, concurrent embedding and upsert pipeline for document ingestion.
+
+Chunks are embedded in fixed-size batches with bounded concurrency, and the
+resulting points are upserted to Qdrant in parallel batches with
+``wait=False``. The final batch is written with ``wait=True`` once every
+other batch has been acknowledged; Qdrant applies updates in WAL order, so
+that last write doubles as a barrier for the whole ingestion.
+
+Every upsert first waits out a write fence, a Redis key that a collection
+migration holds while it replays the last changes and swaps the alias.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+import asyncio
+import logging
+import random
+import time
+
+from langchain_core.documents import Document
+from qdrant_client.http.models import PointStruct
+
+from ..core.config import settings
+from ..core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Called with (chunks_done, chunks_total) as batches complete
+ProgressCallback = Callable[[int, int], Any]
+
+# Payload layout used by langchain_qdrant.QdrantVectorStore
+CONTENT_KEY = "page_content"
+METADATA_KEY = "metadata"
+
+# Writes to a collection wait while this key exists (see collection_migration)
+WRITE_FENCE_PREFIX = "rag:write_fence:"
+
+
+async def with_retries(
+    operation: Callable[[], Awaitable[T]],
+    description: str,
+    attempts: int = settings.INGESTION_MAX_RETRIES,
+    base_delay: float = 0.5
+) -> T:
+    """Run an async operation, retrying with exponential backoff and jitter"""
+    for attempt in range(1, attempts + 1):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            delay = base_delay * (2 ** (attempt - 1)) * (1 + random.random())
+            logger.warning(f"{description} failed (attempt {attempt}/{attempts}): {e}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def wait_for_write_fence(collection_name: str, poll: float = 0.2):
+    """Block while a migration has paused writes to the collection; writes go ahead if Redis is down"""
+    try:
+        while await get_redis().exists(WRITE_FENCE_PREFIX + collection_name):
+            await asyncio.sleep(poll)
+    except Exception as e:
+        logger.warning(f"Write fence check for {collection_name} failed: {e}")
+
+
+def build_payload(document: Document) -> Dict[str, Any]:
+    return {CONTENT_KEY: document.page_content, METADATA_KEY: document.metadata}
+
+
+class EmbeddingPipeline:
+    """Embeds documents and writes them to a Qdrant collection"""
+
+    def __init__(
+        self,
+        embeddings,
+        client,
+        collection_name: str,
+        embed_batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        embed_concurrency: int = settings.EMBEDDING_CONCURRENCY,
+        upsert_batch_size: int = settings.QDRANT_UPSERT_BATCH_SIZE,
+        upsert_concurrency: int = settings.QDRANT_UPSERT_CONCURRENCY,
+        sparse_encoder: Optional[Callable[[str], Any]] = None,
+        sparse_vector_name: Optional[str] = None
+    ):
+        self.embeddings = embeddings
+        self.client = client
+        self.collection_name = collection_name
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_concurrency = upsert_concurrency
+        self.sparse_encoder = sparse_encoder
+        self.sparse_vector_name = sparse_vector_name
+
+    def build_vector(self, dense: List[float], text: str):
+        """Unnamed dense vector, plus the lexical sparse vector when hybrid search is on"""
+        if self.sparse_encoder is None:
+            return dense
+        return {"": dense, self.sparse_vector_name: self.sparse_encoder(text)}
+
+    async def run(
+        self,
+        documents: List[Document],
+        ids: List[str],
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """Embed and upsert documents; returns throughput statistics"""
+        started = time.perf_counter()
+        embed_semaphore = asyncio.Semaphore(self.embed_concurrency)
+        upsert_semaphore = asyncio.Semaphore(self.upsert_concurrency)
+        embed_seconds = 0.0
+        done = 0
+        final_batch: List[PointStruct] = []
+
+        async def upsert(points: List[PointStruct], wait: bool):
+            async with upsert_semaphore:
+                await wait_for_write_fence(self.collection_name)
+                await with_retries(
+                    lambda: self.client.upsert(
+                        collection_name=self.collection_name, points=points, wait=wait
+                    ),
+                    f"Qdrant upsert of {len(points)} points"
+                )
+
+        async def process(start: int):
+            nonlocal embed_seconds, done
+            batch = documents[start:start + self.embed_batch_size]
+            texts = [doc.page_content for doc in batch]
+
+            async with embed_semaphore:
+                batch_started = time.perf_counter()
+                vectors = await with_retries(
+                    lambda: self.embeddings.aembed_documents(texts),
+                    f"Embedding batch of {len(texts)} chunks"
+                )
+                embed_seconds += time.perf_counter() - batch_started
+
+            points = [
+                PointStruct(id=point_id, vector=self.build_vector(vector, doc.page_content), payload=build_payload(doc))
+                for point_id, vector, doc in zip(ids[start:start + len(batch)], vectors, batch)
+            ]
+            is_last = start + self.embed_batch_size >= len(documents)
+            for offset in range(0, len(points), self.upsert_batch_size):
+                sub_batch = points[offset:offset + self.upsert_batch_size]
+                if is_last and offset + self.upsert_batch_size >= len(points):
+                    final_batch.extend(sub_batch)
+                else:
+                    await upsert(sub_batch, wait=False)
+
+            done += len(batch)
+            if progress:
+                progress(done, len(documents))
+
+        await asyncio.gather(*(
+            process(start) for start in range(0, len(documents), self.embed_batch_size)
+        ))
+        if final_batch:
+            await upsert(final_batch, wait=True)
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "chunks": len(documents),
+            "batches": -(-len(documents) // self.embed_batch_size),
+            "seconds": round(elapsed, 3),
+            "embed_seconds": round(embed_seconds, 3),
+            "chunks_per_second": round(len(documents) / elapsed, 1) if elapsed else 0.0,
+        }
+        logger.info(
+            f"Ingested {stats['chunks']} chunks in {stats['seconds']}s "
+            f"({stats['chunks_per_second']} chunks/sec)"
+        )
+        return stats
@@ -0,0 +1,161 @@
+"""
+Embedding providers.
+
+Every provider declares its output size and enforces its own request limits:
+the largest batch it sends in one request, and how many requests may be in
+flight across the whole process. Ingestion pipelines, tenant pipelines and
+queries can share one provider without overrunning the API's rate limits.
+
+- openai: text-embedding-3 through langchain_openai (the production default)
+- hash:   deterministic signed feature hashing of word and character
+          trigrams. It needs no network and has no cost, and its vectors have
+          the configured size, so the full RAG stack can be benchmarked and
+          tested offline. Similarity is lexical only, so do not tune
+          retrieval quality with it.
+
+Providers subclass langchain's Embeddings, so they also plug into
+QdrantVectorStore.
+"""
+from typing import List, Optional
+import asyncio
+import hashlib
+import logging
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider(Embeddings):
+    """Batched, concurrency-limited embeddings with a declared vector size"""
+
+    name = "base"
+
+    def __init__(self, dimensions: int, max_batch_size: int, max_concurrency: int):
+        self.dimensions = dimensions
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def model_key(self) -> str:
+        """Identifies the vector space; embedding caches key on it"""
+        return f"{self.name}:{self.dimensions}"
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._embed_batch, texts)
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[start:start + self.max_batch_size] for start in range(0, len(texts), self.max_batch_size)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector for batch in self._batches(list(texts)) for vector in self._embed_batch(batch)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with self._semaphore:
+                return await self._aembed_batch(batch)
+
+        results = await asyncio.gather(*[embed(batch) for batch in self._batches(list(texts))])
+        return [vector for batch in results for vector in batch]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    name = "openai"
+
+    # The embeddings endpoint accepts at most 2048 inputs per request
+    MAX_INPUTS_PER_REQUEST = 2048
+
+    def __init__(
+        self,
+        dimensions: int = settings.EMBEDDING_DIMENSIONS,
+        max_batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = settings.EMBEDDING_CONCURRENCY,
+        model: str = settings.EMBEDDING_MODEL
+    ):
+        super().__init__(dimensions, min(max_batch_size, self.MAX_INPUTS_PER_REQUEST), max_concurrency)
+        self.model = model
+        self.client = OpenAIEmbeddings(
+            model=model,
+            openai_api_key=settings.OPENAI_API_KEY,
+            # text-embedding-3 models shorten natively; older models have a fixed size
+            dimensions=dimensions if model.startswith("text-embedding-3") else None,
+            chunk_size=self.max_batch_size
+        )
+
+    @property
+    def model_key(self) -> str:
+        return f"{self.model}:{self.dimensions}"
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed_documents(texts)
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await self.client.aembed_documents(texts)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    name = "hash"
+
+    def __init__(
+        self,
+        dimensions: int = settings.EMBEDDING_DIMENSIONS,
+        max_batch_size: int = 1024,
+        max_concurrency: int = 4
+    ):
+        super().__init__(dimensions, max_batch_size, max_concurrency)
+
+    def _features(self, text: str) -> List[str]:
+        text = " ".join(text.lower().split())
+        padded = f" {text} "
+        return text.split() + [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    def embed_text(self, text: str) -> List[float]:
+        features = self._features(text)
+        if not features:
+            return [0.0] * self.dimensions
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little") for f in features],
+            dtype=np.uint64
+        )
+        # Low bits pick the slot, the top bit the sign, so collisions cancel rather than pile up
+        slots = (hashes % np.uint64(self.dimensions)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        vector = np.bincount(slots, weights=signs, minlength=self.dimensions)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).astype(np.float32).tolist()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_text(text) for text in texts]
+
+
+PROVIDERS = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    HashingEmbeddingProvider.name: HashingEmbeddingProvider,
+}
+
+
+def create_embedding_provider(
+    name: Optional[str] = None,
+    dimensions: Optional[int] = None
+) -> EmbeddingProvider:
+    name = name or settings.EMBEDDING_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {name}. Choose from: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](dimensions=dimensions or settings.EMBEDDING_DIMENSIONS)
@@ -0,0 +1,486 @@
+"""
+In-process vector backend for small deployments and tests.
+
+Vectors live in a memory-mapped float32 (or int8 plus per-row scale) matrix
+file, next to an append-only JSONL log of ids and payloads. Search is an
+exact top-k over a single NumPy matrix-vector product. Filters never scan
+payloads: every field in FILTER_FIELDS is indexed as value -> row set when a
+point is added, and a query turns the selected sets into a row mask.
+
+The API process and the Celery workers on the same host can share one index
+directory. Writers take an exclusive file lock and write the vectors before
+the log lines that make them visible. Readers replay new log lines before
+each search. Deleted rows stay in the matrix until compact() rewrites the
+files under a new generation, which readers detect through meta.json.
+
+Selected with VECTOR_BACKEND=local; no Qdrant container is needed.
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ..core.config import settings
+from .embedding_cache import CachedEmbeddings, create_embedding_cache
+from .embedding_pipeline import CONTENT_KEY, METADATA_KEY, ProgressCallback
+from .embedding_providers import create_embedding_provider
+from .retrieval_cache import RetrievalCache
+from .vector_common import FILTER_FIELDS, duplicate_key, group_by_document, prepare_documents
+
+logger = logging.getLogger(__name__)
+
+# Metadata keys with a value -> rows index ("metadata.category" -> "category")
+INDEXED_FIELDS = sorted({field.split(".", 1)[1] for field in FILTER_FIELDS.values()})
+
+# A filter condition: the metadata field must hold one of the values (None = missing or empty)
+Condition = Tuple[str, List[Any]]
+
+INITIAL_CAPACITY = 1024
+
+
+def _index_value(value: Any) -> Any:
+    return None if value in (None, "", []) else value
+
+
+def _index_values(value: Any) -> List[Any]:
+    """Index keys for a payload value; lists match on any element, like Qdrant"""
+    if isinstance(value, (list, tuple)) and value:
+        return list(value)
+    return [_index_value(value)]
+
+
+class LocalVectorIndex:
+    """Memory-mapped vector matrix with a JSONL payload sidecar"""
+
+    def __init__(self, path: str, dimensions: int, dtype: str = "float32"):
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.path = path
+        self.dimensions = dimensions
+        self.dtype = np.dtype(dtype)
+        self._mutex = threading.RLock()
+        self._lock_depth = 0
+        os.makedirs(path, exist_ok=True)
+
+        with self._locked():
+            meta = self._read_meta()
+            if meta is None:
+                meta = {"dimensions": dimensions, "dtype": dtype, "generation": 0}
+                self._write_meta(meta)
+            elif meta["dimensions"] != dimensions or meta["dtype"] != dtype:
+                raise ValueError(
+                    f"Index at {path} stores {meta['dimensions']}-dimensional {meta['dtype']} vectors, "
+                    f"not {dimensions}-dimensional {dtype}"
+                )
+            self._load(meta["generation"])
+
+    # Files
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _generation_file(self, kind: str, generation: int) -> str:
+        return self._file(f"{kind}-{generation}.{'jsonl' if kind == 'payloads' else 'bin'}")
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("meta.json"))
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive across threads and processes sharing the directory; re-entrant within a thread"""
+        with self._mutex:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self._file("index.lock"), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _map(self, kind: str, dtype, width: int, rows: int) -> np.memmap:
+        path = self._generation_file(kind, self.generation)
+        row_bytes = np.dtype(dtype).itemsize * width
+        with open(path, "ab") as f:
+            if f.tell() < rows * row_bytes:
+                f.truncate(rows * row_bytes)
+        capacity = os.path.getsize(path) // row_bytes
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(capacity, width))
+
+    # Loading and replay
+
+    def _load(self, generation: int):
+        self.generation = generation
+        self.rows = 0
+        self.ids: List[Optional[str]] = []
+        self.payloads: List[Optional[Dict[str, Any]]] = []
+        self.row_of: Dict[str, int] = {}
+        self.alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.fields: Dict[str, Dict[Any, set]] = {field: {} for field in INDEXED_FIELDS}
+        self.log_offset = 0
+        self.meta_mtime = os.stat(self._file("meta.json")).st_mtime_ns
+        self.matrix = self._map("vectors", self.dtype, self.dimensions, INITIAL_CAPACITY)
+        self.scales = self._map("scales", np.float32, 1, INITIAL_CAPACITY) if self.dtype == np.int8 else None
+        self._replay()
+
+    def _replay(self):
+        path = self._generation_file("payloads", self.generation)
+        if not os.path.exists(path) or os.path.getsize(path) == self.log_offset:
+            return
+        with open(path, "rb") as f:
+            f.seek(self.log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a writer is mid-line; pick it up next time
+                self.log_offset += len(line)
+                entry = json.loads(line)
+                if entry["op"] == "add":
+                    self._apply_add(entry["row"], entry["id"], entry["payload"])
+                else:
+                    self._apply_delete(entry["id"])
+        if self.rows > len(self.matrix):
+            self.matrix = self._map("vectors", self.dtype, self.dimensions, self.rows)
+            if self.scales is not None:
+                self.scales = self._map("scales", np.float32, 1, self.rows)
+
+    def _apply_add(self, row: int, point_id: str, payload: Dict[str, Any]):
+        self._apply_delete(point_id)
+        while len(self.ids) <= row:
+            self.ids.append(None)
+            self.payloads.append(None)
+        if row >= len(self.alive):
+            self.alive = np.concatenate([self.alive, np.zeros(max(row + 1, len(self.alive)), dtype=bool)])
+        self.ids[row] = point_id
+        self.payloads[row] = payload
+        self.row_of[point_id] = row
+        self.alive[row] = True
+        self.rows = max(self.rows, row + 1)
+        metadata = payload.get(METADATA_KEY) or {}
+        for field in INDEXED_FIELDS:
+            for value in _index_values(metadata.get(field)):
+                self.fields[field].setdefault(value, set()).add(row)
+
+    def _apply_delete(self, point_id: str):
+        row = self.row_of.pop(point_id, None)
+        if row is None:
+            return
+        metadata = self.payloads[row].get(METADATA_KEY) or {}
+        for field in INDEXED_FIELDS:
+            for value in _index_values(metadata.get(field)):
+                self.fields[field].get(value, set()).discard(row)
+        self.ids[row] = None
+        self.payloads[row] = None
+        self.alive[row] = False
+
+    def refresh(self):
+        """Pick up writes made by other processes"""
+        with self._mutex:
+            mtime = os.stat(self._file("meta.json")).st_mtime_ns
+            if mtime != self.meta_mtime:
+                meta = self._read_meta()
+                if meta["generation"] != self.generation:
+                    self._load(meta["generation"])
+                self.meta_mtime = mtime
+            self._replay()
+
+    def _append_log(self, entries: List[Dict[str, Any]]):
+        with open(self._generation_file("payloads", self.generation), "ab") as f:
+            f.write(b"".join(json.dumps(entry, default=str).encode("utf-8") + b"\n" for entry in entries))
+
+    # Writes
+
+    def upsert(self, ids: Sequence[str], vectors: Sequence[Sequence[float]], payloads: Sequence[Dict[str, Any]]):
+        with self._locked():
+            self.refresh()
+            start = self.rows
+            end = start + len(ids)
+            if end > len(self.matrix):
+                capacity = max(end, 2 * len(self.matrix))
+                self.matrix = self._map("vectors", self.dtype, self.dimensions, capacity)
+                if self.scales is not None:
+                    self.scales = self._map("scales", np.float32, 1, capacity)
+
+            block = np.asarray(vectors, dtype=np.float32)
+            if self.scales is not None:
+                scale = np.abs(block).max(axis=1, keepdims=True) / 127.0
+                scale[scale == 0] = 1.0
+                self.matrix[start:end] = np.round(block / scale).astype(np.int8)
+                self.scales[start:end] = scale
+                self.scales.flush()
+            else:
+                self.matrix[start:end] = block
+            self.matrix.flush()
+
+            # Vectors are on disk before the log lines that expose them
+            self._append_log([
+                {"op": "add", "row": start + i, "id": point_id, "payload": payload}
+                for i, (point_id, payload) in enumerate(zip(ids, payloads))
+            ])
+            self._replay()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        with self._locked():
+            self.refresh()
+            present = [point_id for point_id in ids if point_id in self.row_of]
+            if present:
+                self._append_log([{"op": "delete", "id": point_id} for point_id in present])
+                self._replay()
+            return len(present)
+
+    def ids_where(self, conditions: List[Condition]) -> List[str]:
+        self.refresh()
+        rows = np.flatnonzero(self._mask(conditions))
+        return [self.ids[row] for row in rows]
+
+    def deduplicate(self) -> Tuple[int, List[Tuple[str, Optional[str]]]]:
+        """Delete re-ingested chunks; returns (scanned, [(point id, document_id)] removed)"""
+        with self._locked():
+            self.refresh()
+            seen = set()
+            duplicates = []
+            for row in sorted(self.row_of.values()):
+                key = duplicate_key(self.payloads[row])
+                if key in seen:
+                    duplicates.append((self.ids[row], key[1]))
+                else:
+                    seen.add(key)
+            scanned = len(self.row_of)
+            self.delete([point_id for point_id, _ in duplicates])
+            return scanned, duplicates
+
+    def compact(self):
+        """Rewrite live rows into a new generation, dropping deleted ones"""
+        with self._locked():
+            self.refresh()
+            live = sorted(self.row_of.values())
+            old_generation = self.generation
+            matrix, scales = self.matrix, self.scales
+            entries = [
+                {"op": "add", "row": new_row, "id": self.ids[row], "payload": self.payloads[row]}
+                for new_row, row in enumerate(live)
+            ]
+
+            self.generation = old_generation + 1
+            capacity = max(INITIAL_CAPACITY, len(live))
+            new_matrix = self._map("vectors", self.dtype, self.dimensions, capacity)
+            new_matrix[:len(live)] = matrix[live]
+            new_matrix.flush()
+            if scales is not None:
+                new_scales = self._map("scales", np.float32, 1, capacity)
+                new_scales[:len(live)] = scales[live]
+                new_scales.flush()
+            self._append_log(entries)
+
+            self._write_meta({"dimensions": self.dimensions, "dtype": self.dtype.name, "generation": self.generation})
+            self._load(self.generation)
+            for kind in ("vectors", "scales", "payloads"):
+                try:
+                    os.remove(self._generation_file(kind, old_generation))
+                except FileNotFoundError:
+                    pass
+
+    # Reads
+
+    def _mask(self, conditions: List[Condition]) -> np.ndarray:
+        mask = self.alive[:self.rows].copy()
+        for field, values in conditions:
+            allowed = np.zeros(self.rows, dtype=bool)
+            for value in values:
+                rows = self.fields[field].get(_index_value(value))
+                if rows:
+                    allowed[np.fromiter(rows, dtype=np.int64, count=len(rows))] = True
+            mask &= allowed
+        return mask
+
+    def search(
+        self,
+        vector: Sequence[float],
+        k: int,
+        conditions: Optional[List[Condition]] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Exact top-k by dot product (cosine for the unit-length vectors providers return)"""
+        self.refresh()
+        with self._mutex:
+            if not self.row_of:
+                return []
+            query = np.asarray(vector, dtype=np.float32)
+            scores = self.matrix[:self.rows] @ query
+            if self.scales is not None:
+                scores = scores * self.scales[:self.rows, 0]
+
+            mask = self._mask(conditions or [])
+            candidates = int(mask.sum())
+            if candidates == 0:
+                return []
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, candidates)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            if score_threshold is not None:
+                top = top[scores[top] >= score_threshold]
+            return [(self.ids[row], float(scores[row]), self.payloads[row]) for row in top]
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+
+def filter_conditions(filters: Optional[Dict[str, Any]]) -> List[Condition]:
+    """Same filter names and semantics as vector_common.build_filter"""
+    conditions = []
+    for name, value in (filters or {}).items():
+        if value is None or value == []:
+            continue
+        field = FILTER_FIELDS.get(name)
+        if field is None:
+            raise ValueError(f"Unsupported filter: {name}. Allowed: {', '.join(sorted(FILTER_FIELDS))}")
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        conditions.append((field.split(".", 1)[1], values))
+    return conditions
+
+
+class LocalVectorService:
+    """VectorService API over a LocalVectorIndex"""
+
+    def __init__(self):
+        self.embeddings = create_embedding_provider()
+        self.embedding_cache = create_embedding_cache()
+        self.retrieval_cache = RetrievalCache(model=self.embeddings.model_key)
+        self.cached_embeddings = CachedEmbeddings(self.embeddings, self.embedding_cache, self.embeddings.model_key)
+        self.index = LocalVectorIndex(
+            settings.VECTOR_LOCAL_PATH,
+            settings.EMBEDDING_DIMENSIONS,
+            settings.VECTOR_LOCAL_DTYPE
+        )
+        self.ingested_chunks = 0
+        self.ingestion_seconds = 0.0
+        logger.info(f"Local vector index opened at {settings.VECTOR_LOCAL_PATH} ({len(self.index)} points)")
+
+    async def add_documents(
+        self,
+        documents: List[Document],
+        metadata: Optional[Dict[str, Any]] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> List[str]:
+        """Add documents to the vector store"""
+        try:
+            started = time.perf_counter()
+            ids = prepare_documents(documents, metadata)
+            batch_size = settings.EMBEDDING_BATCH_SIZE
+            for start in range(0, len(documents), batch_size):
+                batch = documents[start:start + batch_size]
+                vectors = await self.cached_embeddings.aembed_documents([doc.page_content for doc in batch])
+                await asyncio.to_thread(
+                    self.index.upsert,
+                    ids[start:start + batch_size],
+                    vectors,
+                    [{CONTENT_KEY: doc.page_content, METADATA_KEY: doc.metadata} for doc in batch]
+                )
+                if progress:
+                    progress(start + len(batch), len(documents))
+
+            self.ingested_chunks += len(documents)
+            self.ingestion_seconds += time.perf_counter() - started
+            logger.info(f"Added {len(documents)} documents to local vector index")
+            return ids
+
+        except Exception as e:
+            logger.error(f"Failed to add documents: {e}")
+            raise
+
+    async def similarity_search(
+        self,
+        query: str,
+        k: int = 5,
+        filter_dict: Optional[Dict[str, Any]] = None,
+        institution_id: Optional[str] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Document]:
+        """Exact search; tenants see untenanted documents plus their own"""
+        try:
+            conditions = filter_conditions(filter_dict)
+            if settings.RAG_TENANT_COLLECTIONS:
+                conditions.append(("institution_id", [None, institution_id] if institution_id else [None]))
+
+            dense = await self.retrieval_cache.embed_query(self.embeddings, query)
+            hits = await asyncio.to_thread(self.index.search, dense, k, conditions, score_threshold)
+
+            results = []
+            for point_id, score, payload in hits:
+                metadata = dict(payload.get(METADATA_KEY) or {})
+                metadata["_id"] = point_id
+                metadata["_score"] = score
+                results.append(Document(page_content=payload.get(CONTENT_KEY, ""), metadata=metadata))
+
+            logger.info(f"Found {len(results)} similar documents for query: {query[:50]}...")
+            return results
+
+        except Exception as e:
+            logger.error(f"Failed to perform similarity search: {e}")
+            raise
+
+    async def delete_documents(self, ids: List[str]) -> bool:
+        """Delete documents from the vector store by IDs"""
+        try:
+            deleted = await asyncio.to_thread(self.index.delete, ids)
+            logger.info(f"Deleted {deleted} documents from local vector index")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to delete documents: {e}")
+            raise
+
+    async def delete_by_document(self, document_id: str, institution_id: Optional[str] = None) -> bool:
+        """Delete every chunk of a source document"""
+        try:
+            ids = await asyncio.to_thread(self.index.ids_where, [("document_id", [document_id])])
+            await asyncio.to_thread(self.index.delete, ids)
+            logger.info(f"Deleted chunks of document {document_id} from local vector index")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to delete document {document_id}: {e}")
+            raise
+
+    async def deduplicate(self, page_size: int = 1000) -> Dict[str, Any]:
+        """Collapse re-ingested chunks, then compact the index files"""
+        scanned, removed = await asyncio.to_thread(self.index.deduplicate)
+        await asyncio.to_thread(self.index.compact)
+        logger.info(f"Deduplicated local vector index: removed {len(removed)} of {scanned} points")
+        return {
+            "scanned": scanned,
+            "removed": len(removed),
+            "remaining": scanned - len(removed),
+            "documents": group_by_document(removed)
+        }
+
+    def collect_metrics(self):
+        """Ingestion counters for /metrics"""
+        yield "rag_ingested_chunks_total", "counter", "Chunks embedded and indexed", self.ingested_chunks
+        yield "rag_ingestion_seconds_total", "counter", "Time spent ingesting chunks", round(self.ingestion_seconds, 3)
+        yield "rag_local_index_points", "gauge", "Live points in the local vector index", len(self.index)
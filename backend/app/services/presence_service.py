@@ -0,0 +1,217 @@
+"""
+Online presence tracking for WebSocket users.
+
+A user is online while at least one of their sockets has heartbeated within
+PRESENCE_TTL_SECONDS. Callers only learn about transitions (join/leave), so
+clients receive small user_joined/user_left deltas and fetch the full list
+on demand, page by page.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import time
+
+from ..core.config import settings
+from ..core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# Drops a socket (ARGV[1], may be empty) and expired sockets, then removes the
+# user from the online sets only if no socket is left. One script, so a socket
+# joining on another node can never land between the count and the removal.
+_REMOVE_IF_OFFLINE = """
+local sockets, online, users = KEYS[1], KEYS[2], KEYS[3]
+if ARGV[1] ~= '' then
+    redis.call('ZREM', sockets, ARGV[1])
+end
+redis.call('ZREMRANGEBYSCORE', sockets, '-inf', ARGV[2])
+if redis.call('ZCARD', sockets) > 0 then
+    return false
+end
+if redis.call('ZREM', online, ARGV[3]) == 0 then
+    return false
+end
+local raw = redis.call('HGET', users, ARGV[3])
+redis.call('DEL', sockets)
+redis.call('HDEL', users, ARGV[3])
+if not raw then
+    return '{}'
+end
+local ok, user = pcall(cjson.decode, raw)
+if ok and type(user) == 'table' and type(user['institution_id']) == 'string' then
+    redis.call('ZREM', ARGV[4] .. user['institution_id'], ARGV[3])
+end
+return raw
+"""
+
+
+def _snapshot_key(snapshot: Dict[str, Any]) -> Tuple[float, int]:
+    return snapshot["last_seen"], snapshot["id"]
+
+
+class PresenceService:
+    """In-process presence, exact for a single backend process"""
+
+    def __init__(self, ttl: float = settings.PRESENCE_TTL_SECONDS):
+        self.ttl = ttl
+        self._sockets: Dict[int, Dict[str, float]] = {}
+        self._users: Dict[int, Dict[str, Any]] = {}
+
+    async def join(self, socket_key: str, user: Dict[str, Any]) -> bool:
+        """Register a socket; True when the user just came online"""
+        sockets = self._sockets.setdefault(user["id"], {})
+        is_new = not sockets
+        sockets[socket_key] = time.time()
+        self._users[user["id"]] = user
+        return is_new
+
+    async def leave(self, socket_key: str, user_id: int) -> bool:
+        """Remove a socket; True when the user has no sockets left"""
+        sockets = self._sockets.get(user_id)
+        if sockets is None:
+            return False
+        sockets.pop(socket_key, None)
+        if sockets:
+            return False
+        del self._sockets[user_id]
+        self._users.pop(user_id, None)
+        return True
+
+    async def heartbeat(self, entries: Iterable[Tuple[str, Dict[str, Any]]]):
+        now = time.time()
+        for socket_key, user in entries:
+            self._sockets.setdefault(user["id"], {})[socket_key] = now
+            self._users.setdefault(user["id"], user)
+
+    async def reap_expired(self) -> List[Dict[str, Any]]:
+        """Drop users whose sockets all stopped heartbeating"""
+        cutoff = time.time() - self.ttl
+        expired = []
+        for user_id, sockets in list(self._sockets.items()):
+            for socket_key, last_seen in list(sockets.items()):
+                if last_seen < cutoff:
+                    del sockets[socket_key]
+            if not sockets:
+                del self._sockets[user_id]
+                user = self._users.pop(user_id, None)
+                if user:
+                    expired.append(user)
+        return expired
+
+    async def get_online_users(
+        self,
+        institution_id: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Return one page of online users (most recently active first) and the total"""
+        users = []
+        for user_id, sockets in self._sockets.items():
+            user = self._users.get(user_id)
+            if not user or (institution_id and user.get("institution_id") != institution_id):
+                continue
+            users.append({**user, "last_seen": max(sockets.values())})
+        users.sort(key=_snapshot_key, reverse=True)
+        page = [{k: v for k, v in user.items() if k != "last_seen"} for user in users[offset:offset + limit]]
+        return page, len(users)
+
+
+class RedisPresenceService(PresenceService):
+    """Presence shared by every backend node through Redis sorted sets"""
+
+    ONLINE_KEY = "presence:online"
+    USERS_KEY = "presence:users"
+
+    def _sockets_key(self, user_id: int) -> str:
+        return f"presence:sockets:{user_id}"
+
+    def _institution_key(self, institution_id: str) -> str:
+        return f"presence:institution:{institution_id}"
+
+    async def join(self, socket_key: str, user: Dict[str, Any]) -> bool:
+        now = time.time()
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                pipe.zadd(self._sockets_key(user["id"]), {socket_key: now})
+                pipe.zadd(self.ONLINE_KEY, {user["id"]: now})
+                if user.get("institution_id"):
+                    pipe.zadd(self._institution_key(user["institution_id"]), {user["id"]: now})
+                pipe.hset(self.USERS_KEY, user["id"], json.dumps(user, ensure_ascii=False))
+                results = await pipe.execute()
+            return results[1] == 1
+        except Exception as e:
+            logger.error(f"Failed to record presence for user {user['id']}: {e}")
+            return False
+
+    async def _remove_if_offline(self, user_id: int, socket_key: str = "") -> Optional[Dict[str, Any]]:
+        """Atomically remove a user with no live sockets; returns their snapshot if we removed them"""
+        remove = get_redis().register_script(_REMOVE_IF_OFFLINE)
+        raw = await remove(
+            keys=[self._sockets_key(user_id), self.ONLINE_KEY, self.USERS_KEY],
+            args=[socket_key, time.time() - self.ttl, user_id, self._institution_key("")]
+        )
+        if not raw:
+            return None
+        return {"id": user_id, **json.loads(raw)}
+
+    async def leave(self, socket_key: str, user_id: int) -> bool:
+        try:
+            return await self._remove_if_offline(user_id, socket_key) is not None
+        except Exception as e:
+            logger.error(f"Failed to clear presence for user {user_id}: {e}")
+            return False
+
+    async def heartbeat(self, entries: Iterable[Tuple[str, Dict[str, Any]]]):
+        entries = list(entries)
+        if not entries:
+            return
+        now = time.time()
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for socket_key, user in entries:
+                    pipe.zadd(self._sockets_key(user["id"]), {socket_key: now})
+                    pipe.zadd(self.ONLINE_KEY, {user["id"]: now})
+                    if user.get("institution_id"):
+                        pipe.zadd(self._institution_key(user["institution_id"]), {user["id"]: now})
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to refresh presence heartbeats: {e}")
+
+    async def reap_expired(self) -> List[Dict[str, Any]]:
+        expired = []
+        try:
+            user_ids = await get_redis().zrangebyscore(self.ONLINE_KEY, "-inf", time.time() - self.ttl)
+            for user_id in user_ids:
+                # Several nodes may reap concurrently; only the one whose ZREM wins reports it,
+                # and a user who reconnected since the range query keeps their presence
+                user = await self._remove_if_offline(int(user_id))
+                if user:
+                    expired.append(user)
+        except Exception as e:
+            logger.error(f"Failed to reap expired presence: {e}")
+        return expired
+
+    async def get_online_users(
+        self,
+        institution_id: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        redis = get_redis()
+        key = self._institution_key(institution_id) if institution_id else self.ONLINE_KEY
+        cutoff = time.time() - self.ttl
+
+        user_ids = await redis.zrevrangebyscore(key, "+inf", cutoff, start=offset, num=limit)
+        total = await redis.zcount(key, cutoff, "+inf")
+        if not user_ids:
+            return [], total
+
+        raw_users = await redis.hmget(self.USERS_KEY, user_ids)
+        return [json.loads(raw) for raw in raw_users if raw], total
+
+
+def create_presence_service() -> PresenceService:
+    if settings.WS_BACKPLANE == "redis":
+        return RedisPresenceService()
+    return PresenceService()
@@ -0,0 +1,120 @@
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from app.models.rag_document import EmbeddingStatus, RagDocument
+
+
+def get_document(db: Session, document_id: str) -> Optional[RagDocument]:
+    return db.query(RagDocument).filter(RagDocument.id == document_id).first()
+
+
+def list_documents(
+    db: Session,
+    skip: int = 0,
+    limit: int = 20,
+    category: Optional[str] = None,
+    institution_id: Optional[str] = None,
+    exact_institution: bool = False
+) -> Tuple[List[RagDocument], int]:
+    """With exact_institution, a None institution_id lists only untenanted documents"""
+    query = db.query(RagDocument)
+    if category:
+        query = query.filter(RagDocument.category == category)
+    if institution_id or exact_institution:
+        query = query.filter(RagDocument.institution_id == institution_id)
+
+    total = query.count()
+    documents = query\
+        .order_by(RagDocument.created_at.desc())\
+        .offset(skip)\
+        .limit(limit)\
+        .all()
+    return documents, total
+
+
+def register_document(
+    db: Session,
+    document_id: str,
+    title: str,
+    content_hash: str,
+    uploaded_by: Optional[int] = None,
+    institution_id: Optional[str] = None,
+    category: Optional[str] = None,
+    source: Optional[str] = None,
+    filename: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None
+) -> RagDocument:
+    """Create the registry row, or reset it when the same content is uploaded again"""
+    document = get_document(db, document_id) or RagDocument(id=document_id)
+    document.title = title
+    document.content_hash = content_hash
+    document.uploaded_by = uploaded_by
+    document.institution_id = institution_id
+    document.category = category
+    document.source = source
+    document.filename = filename
+    document.extra_metadata = metadata or {}
+    document.embedding_status = EmbeddingStatus.processing
+    document.error_message = None
+    db.add(document)
+    db.commit()
+    db.refresh(document)
+    return document
+
+
+def mark_completed(db: Session, document: RagDocument, point_ids: List[str]) -> RagDocument:
+    document.embedding_status = EmbeddingStatus.completed
+    document.chunk_count = len(point_ids)
+    document.point_ids = point_ids
+    db.add(document)
+    db.commit()
+    db.refresh(document)
+    return document
+
+
+def remove_points(db: Session, removed: Dict[str, List[str]]) -> int:
+    """Drop deleted point ids from their documents' rows; returns how many rows changed"""
+    updated = 0
+    for document in db.query(RagDocument).filter(RagDocument.id.in_(list(removed))).all():
+        gone = set(removed[document.id])
+        document.point_ids = [point_id for point_id in document.point_ids or [] if str(point_id) not in gone]
+        document.chunk_count = len(document.point_ids)
+        db.add(document)
+        updated += 1
+    db.commit()
+    return updated
+
+
+def mark_failed(db: Session, document: RagDocument, error: str) -> RagDocument:
+    document.embedding_status = EmbeddingStatus.failed
+    document.error_message = error
+    db.add(document)
+    db.commit()
+    db.refresh(document)
+    return document
+
+
+def delete_document(db: Session, document: RagDocument):
+    db.delete(document)
+    db.commit()
+
+
+def to_dict(document: RagDocument) -> Dict[str, Any]:
+    return {
+        "id": document.id,
+        "title": document.title,
+        "category": document.category,
+        "metadata": {
+            **(document.extra_metadata or {}),
+            "source": document.source,
+            "filename": document.filename,
+            "uploaded_by": document.uploaded_by,
+            "institution_id": document.institution_id,
+            "created_at": document.created_at.isoformat() if document.created_at else None,
+            "updated_at": document.updated_at.isoformat() if document.updated_at else None
+        },
+        "content_hash": document.content_hash,
+        "chunk_count": document.chunk_count,
+        "embedding_status": document.embedding_status.value if document.embedding_status else None,
+        "error_message": document.error_message
+    }
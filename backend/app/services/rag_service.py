@@ -1,8 +1,11 @@
 """
 RAG (Retrieval-Augmented Generation) Service using LangChain and LangGraph
 """
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from itertools import islice
+import asyncio
 import logging
+import time
 from datetime import datetime
 
 from langchain_core.documents import Document
@@ -13,9 +16,17 @@ from langchain_anthropic import ChatAnthropic
 from langchain_core.runnables import RunnablePassthrough
 from langgraph.graph import StateGraph, END
 from typing_extensions import TypedDict
+from sqlalchemy.orm import Session
 
+from . import rag_document_service
+from .context_packer import pack_context
+from .document_parser import file_hash, iter_chunks, iter_segments
+from .embedding_pipeline import ProgressCallback
+from .system_settings import get_ai_settings
+from .vector_common import build_filter, document_id_for, document_id_from_hash
 from .vector_service import vector_service
 from ..core.config import settings
+from ..models.rag_document import RagDocument
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +37,8 @@ class RAGState(TypedDict):
     context: List[Document]
     answer: str
     metadata: Dict[str, Any]
+    filters: Optional[Dict[str, Any]]
+    institution_id: Optional[str]
 
 
 class RAGService:
@@ -100,12 +113,24 @@ class RAGService:
         self.graph = graph_builder.compile()
     
     async def _retrieve(self, state: RAGState) -> Dict[str, Any]:
-        """Retrieve relevant documents"""
+        """Retrieve relevant documents and pack the best of them into the context budget"""
         try:
-            # Perform similarity search
-            documents = await vector_service.similarity_search(
+            top_k = int(get_ai_settings().get("ragTopK") or 5)
+            
+            # Over-fetch so overlap removal and trimming still leave top_k useful chunks
+            candidates = await vector_service.similarity_search(
                 query=state["query"],
-                k=5
+                k=top_k * settings.RAG_CANDIDATE_MULTIPLIER,
+                filter_dict=state.get("filters"),
+                institution_id=state.get("institution_id"),
+                score_threshold=settings.RAG_SCORE_THRESHOLD
+            )
+            documents = pack_context(
+                candidates, state["query"], settings.RAG_CONTEXT_TOKEN_BUDGET, max_documents=top_k
+            )
+            logger.info(
+                f"Packed {len(documents)} of {len(candidates)} candidates into "
+                f"{sum(doc.metadata['_tokens'] for doc in documents)} context tokens"
             )
             
             return {"context": documents}
@@ -146,7 +171,8 @@ class RAGService:
     async def process_documents(
         self,
         texts: List[str],
-        metadata: Optional[List[Dict[str, Any]]] = None
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        progress: Optional[ProgressCallback] = None
     ) -> List[str]:
         """Process and index documents"""
         try:
@@ -155,18 +181,22 @@ class RAGService:
             # Split texts into chunks
             for i, text in enumerate(texts):
                 chunks = self.text_splitter.split_text(text)
+                custom_metadata = metadata[i] if metadata and i < len(metadata) else {}
+                document_id = custom_metadata.get("document_id") or document_id_for(
+                    text, custom_metadata.get("institution_id")
+                )
                 
                 # Create documents with metadata
                 for j, chunk in enumerate(chunks):
                     doc_metadata = {
+                        "document_id": document_id,
                         "source_index": i,
                         "chunk_index": j,
                         "total_chunks": len(chunks)
                     }
                     
                     # Add custom metadata if provided
-                    if metadata and i < len(metadata):
-                        doc_metadata.update(metadata[i])
+                    doc_metadata.update(custom_metadata)
                     
                     doc = Document(
                         page_content=chunk,
@@ -175,7 +205,7 @@ class RAGService:
                     all_documents.append(doc)
             
             # Add documents to vector store
-            ids = await vector_service.add_documents(all_documents)
+            ids = await vector_service.add_documents(all_documents, progress=progress)
             
             logger.info(f"Processed and indexed {len(all_documents)} document chunks")
             return ids
@@ -184,28 +214,98 @@ class RAGService:
             logger.error(f"Failed to process documents: {e}")
             raise
     
+    async def ingest_file(
+        self,
+        db: Session,
+        path: str,
+        title: str,
+        uploaded_by: Optional[int] = None,
+        institution_id: Optional[str] = None,
+        category: Optional[str] = None,
+        source: Optional[str] = None,
+        filename: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> RagDocument:
+        """Register a source file, stream its chunks into the index and record the outcome"""
+        digest = await asyncio.to_thread(file_hash, path)
+        document_id = document_id_from_hash(digest, institution_id)
+        document = rag_document_service.register_document(
+            db,
+            document_id=document_id,
+            title=title,
+            content_hash=digest,
+            uploaded_by=uploaded_by,
+            institution_id=institution_id,
+            category=category,
+            source=source,
+            filename=filename,
+            metadata=metadata
+        )
+        
+        chunk_metadata = {
+            **(metadata or {}),
+            "document_id": document_id,
+            "title": title,
+            "uploaded_by": uploaded_by,
+            "institution_id": institution_id,
+            "category": category
+        }
+        if source:
+            chunk_metadata["source"] = source
+        if filename:
+            chunk_metadata["filename"] = filename
+        
+        chunks = iter_chunks(iter_segments(path, filename), self.text_splitter, chunk_metadata)
+        window_size = settings.EMBEDDING_BATCH_SIZE * settings.EMBEDDING_CONCURRENCY
+        point_ids: List[str] = []
+        
+        def next_window() -> List[Document]:
+            return list(islice(chunks, window_size))
+        
+        try:
+            # Parse the next window in a thread while the current one is embedded
+            pending = asyncio.ensure_future(asyncio.to_thread(next_window))
+            while True:
+                window = await pending
+                if not window:
+                    break
+                pending = asyncio.ensure_future(asyncio.to_thread(next_window))
+                
+                # The total grows as parsing advances; report embedded / extracted so far
+                embedded, extracted = len(point_ids), len(point_ids) + len(window)
+                
+                def window_progress(done: int, total: int, embedded=embedded, extracted=extracted):
+                    progress(embedded + done, extracted)
+                
+                point_ids += await vector_service.add_documents(
+                    window,
+                    progress=window_progress if progress else None
+                )
+        except Exception as e:
+            rag_document_service.mark_failed(db, document, str(e))
+            raise
+        
+        logger.info(f"Ingested {filename or title}: {len(point_ids)} chunks")
+        return rag_document_service.mark_completed(db, document, point_ids)
+    
+    async def delete_document(self, db: Session, document: RagDocument):
+        """Remove a document's chunks from the index and its registry row"""
+        await vector_service.delete_by_document(document.id, document.institution_id)
+        rag_document_service.delete_document(db, document)
+    
     async def ask(
         self,
         question: str,
         user_id: Optional[int] = None,
-        session_id: Optional[str] = None
+        session_id: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        institution_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """Ask a question using RAG"""
+        initial_state = self._initial_state(question, user_id, session_id, filters, institution_id)
+        
         try:
-            # Initialize state
-            initial_state = RAGState(
-                query=question,
-                context=[],
-                answer="",
-                metadata={}
-            )
-            
-            # Add user context if provided
-            if user_id:
-                initial_state["metadata"]["user_id"] = user_id
-            if session_id:
-                initial_state["metadata"]["session_id"] = session_id
-            
             # Run the graph
             result = await self.graph.ainvoke(initial_state)
             
@@ -219,6 +319,97 @@ class RAGService:
         except Exception as e:
             logger.error(f"Failed to process question: {e}")
             raise
+    
+    def ask_stream(
+        self,
+        question: str,
+        user_id: Optional[int] = None,
+        session_id: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        institution_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Ask a question, yielding (event, data) pairs while the graph runs:
+        "sources" once retrieval finishes, "token" for each piece of the
+        answer, then "done" with timings (or "error"). Filters are validated
+        before the stream starts, so bad input still raises ValueError.
+        """
+        initial_state = self._initial_state(question, user_id, session_id, filters, institution_id)
+        return self._stream(initial_state)
+    
+    async def _stream(self, initial_state: RAGState) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        started = time.perf_counter()
+        retrieval_ms = None
+        first_token_ms = None
+        answer_parts: List[str] = []
+        
+        def elapsed_ms() -> float:
+            return round((time.perf_counter() - started) * 1000, 1)
+        
+        try:
+            async for event in self.graph.astream_events(initial_state, version="v2"):
+                node = event.get("metadata", {}).get("langgraph_node")
+                
+                if event["event"] == "on_chain_end" and event["name"] == "retrieve":
+                    retrieval_ms = elapsed_ms()
+                    context = event["data"]["output"].get("context", [])
+                    yield "sources", {"sources": [doc.metadata for doc in context], "retrieval_ms": retrieval_ms}
+                
+                elif event["event"] == "on_chat_model_stream" and node == "generate":
+                    text = event["data"]["chunk"].content
+                    if isinstance(text, list):
+                        text = "".join(part.get("text", "") for part in text if isinstance(part, dict))
+                    if text:
+                        if first_token_ms is None:
+                            first_token_ms = elapsed_ms()
+                        answer_parts.append(text)
+                        yield "token", {"text": text}
+                
+                elif event["event"] == "on_chain_end" and event["name"] == "generate":
+                    output = event["data"]["output"]
+                    # Generation failed or the model did not stream: send the answer whole
+                    if not answer_parts and output.get("answer"):
+                        first_token_ms = elapsed_ms()
+                        answer_parts.append(output["answer"])
+                        yield "token", {"text": output["answer"]}
+                    yield "done", {
+                        "answer": "".join(answer_parts),
+                        "timestamp": output.get("metadata", {}).get("timestamp"),
+                        "retrieval_ms": retrieval_ms,
+                        "time_to_first_token_ms": first_token_ms,
+                        "total_ms": elapsed_ms()
+                    }
+        
+        except Exception as e:
+            logger.error(f"Failed to stream answer: {e}")
+            yield "error", {"detail": str(e)}
+    
+    def _initial_state(
+        self,
+        question: str,
+        user_id: Optional[int],
+        session_id: Optional[str],
+        filters: Optional[Dict[str, Any]],
+        institution_id: Optional[str]
+    ) -> RAGState:
+        # Reject unknown filter fields before running the graph
+        build_filter(filters)
+        
+        state = RAGState(
+            query=question,
+            context=[],
+            answer="",
+            metadata={},
+            filters=filters,
+            institution_id=institution_id
+        )
+        
+        # Add user context if provided
+        if user_id:
+            state["metadata"]["user_id"] = user_id
+        if session_id:
+            state["metadata"]["session_id"] = session_id
+        return state
 
 
 # Singleton instance
@@ -0,0 +1,156 @@
+"""
+Two-level cache for RAG retrieval.
+
+1. Query text -> embedding: an in-process LRU with a long TTL, so repeated
+   questions (and the chat path asking again for the same text) skip the
+   embeddings API.
+2. (embedding, k, filters, tenant, threshold, corpus versions) -> ranked
+   (collection, point id, score) hits: kept in Redis with a short TTL and
+   shared by every API worker. Chunk text and payloads are not copied into
+   Redis; the caller hydrates the hits from the vector store, which is a
+   cheap lookup by id compared with the vector search it replaces.
+
+Each collection has a corpus version counter in Redis, which is bumped after
+every add or delete. The versions are part of the result key, so a write
+makes earlier results unreachable instead of serving them stale. If Redis is
+unavailable, the result cache is bypassed.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+import time
+
+from ..core.config import settings
+from ..core.redis_client import get_redis
+from .embedding_cache import cache_key, pack_vector
+
+logger = logging.getLogger(__name__)
+
+# (collection, point id, score) of one cached search hit
+Hit = Tuple[str, Any, float]
+
+
+class LRUCache:
+    """Bounded in-process mapping with per-entry expiry"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def result_key(
+    vector: Sequence[float],
+    k: int,
+    filters: Optional[Dict[str, Any]],
+    institution_id: Optional[str],
+    versions: Dict[str, int],
+    score_threshold: Optional[float] = None
+) -> str:
+    digest = hashlib.sha256(pack_vector(vector))
+    digest.update(json.dumps(
+        [k, filters or {}, institution_id, sorted(versions.items()), score_threshold], sort_keys=True, default=str
+    ).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RetrievalCache:
+    VERSION_PREFIX = "rag:corpus_version:"
+    RESULT_PREFIX = "rag:results:"
+
+    def __init__(
+        self,
+        model: str = f"{settings.EMBEDDING_MODEL}:{settings.EMBEDDING_DIMENSIONS}",
+        query_cache_size: int = settings.RAG_QUERY_EMBEDDING_CACHE_SIZE,
+        query_cache_ttl: int = settings.RAG_QUERY_EMBEDDING_CACHE_TTL,
+        result_ttl: int = settings.RAG_RESULT_CACHE_TTL
+    ):
+        self.model = model
+        self.queries = LRUCache(query_cache_size, query_cache_ttl)
+        self.result_ttl = result_ttl
+        self.query_hits = 0
+        self.query_misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+
+    async def embed_query(self, embeddings, text: str) -> List[float]:
+        key = cache_key(getattr(embeddings, "model_key", self.model), text)
+        vector = self.queries.get(key)
+        if vector is not None:
+            self.query_hits += 1
+            return vector
+        self.query_misses += 1
+        vector = await embeddings.aembed_query(text)
+        self.queries.set(key, vector)
+        return vector
+
+    async def corpus_versions(self, collections: List[str]) -> Optional[Dict[str, int]]:
+        """Current version of each collection; None when the result cache is off or unreachable"""
+        if self.result_ttl <= 0:
+            return None
+        try:
+            values = await get_redis().mget([self.VERSION_PREFIX + name for name in collections])
+            return {name: int(value or 0) for name, value in zip(collections, values)}
+        except Exception as e:
+            logger.warning(f"Retrieval cache unavailable: {e}")
+            return None
+
+    async def bump(self, *collections: str):
+        """Invalidate cached results for collections whose contents changed"""
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for name in collections:
+                    pipe.incr(self.VERSION_PREFIX + name)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to bump corpus version for {', '.join(collections)}: {e}")
+
+    async def get_results(self, key: str) -> Optional[List[Hit]]:
+        try:
+            raw = await get_redis().get(self.RESULT_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"Retrieval cache lookup failed: {e}")
+            raw = None
+        if raw is None:
+            self.result_misses += 1
+            return None
+        self.result_hits += 1
+        return [(collection, point_id, score) for collection, point_id, score in json.loads(raw)]
+
+    async def set_results(self, key: str, hits: List[Hit]):
+        try:
+            await get_redis().set(
+                self.RESULT_PREFIX + key,
+                json.dumps([[collection, point_id, score] for collection, point_id, score in hits], default=str),
+                ex=self.result_ttl
+            )
+        except Exception as e:
+            logger.warning(f"Retrieval cache write failed: {e}")
+
+    def collect_metrics(self):
+        yield "rag_query_embedding_cache_hits_total", "counter", "Query embeddings served from memory", self.query_hits
+        yield "rag_query_embedding_cache_misses_total", "counter", "Query embeddings computed", self.query_misses
+        yield "rag_result_cache_hits_total", "counter", "Retrievals served from the result cache", self.result_hits
+        yield "rag_result_cache_misses_total", "counter", "Retrievals that queried Qdrant", self.result_misses
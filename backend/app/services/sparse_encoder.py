@@ -0,0 +1,49 @@
+"""
+Lexical sparse vectors for hybrid retrieval.
+
+Korean has no whitespace-delimited morphemes we can rely on without a
+tokenizer dependency, so Hangul runs are indexed as character bigrams (plus
+the whole run when it is short, to reward exact matches). Latin words,
+product names and acronyms are kept whole and lowercased. Terms are hashed
+into a 32-bit index space; Qdrant applies IDF to the stored term frequencies.
+"""
+from collections import Counter
+from typing import List
+import re
+import unicodedata
+import zlib
+
+from qdrant_client.http.models import SparseVector
+
+SPARSE_VECTOR_NAME = "text-sparse"
+
+_TOKEN = re.compile(r"[가-힣]+|[a-z0-9]+(?:[.+#-][a-z0-9]+)*")
+
+# Hangul runs up to this length are also indexed whole
+_WHOLE_RUN_MAX = 4
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall(unicodedata.normalize("NFC", text).lower()):
+        if "가" <= token[0] <= "힣" and len(token) > 2:
+            if len(token) <= _WHOLE_RUN_MAX:
+                tokens.append(token)
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def term_index(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def encode(text: str) -> SparseVector:
+    """Sparse term-frequency vector for a chunk or query"""
+    weights: Counter = Counter()
+    for term, count in Counter(tokenize(text)).items():
+        # Hash collisions are rare at this vocabulary size; merge them if they happen
+        weights[term_index(term)] += count
+    indices = sorted(weights)
+    return SparseVector(indices=indices, values=[float(weights[i]) for i in indices])
@@ -0,0 +1,93 @@
+"""
+Admin-editable system settings, stored as JSON so they can change at runtime
+without a redeploy.
+"""
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Settings file path
+SETTINGS_FILE = Path("/app/config/system_settings.json")
+
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "general": {
+        "siteName": "AI Tutor System",
+        "siteDescription": "AI 기반 교육 챗봇 시스템",
+        "maintenanceMode": False,
+        "allowRegistration": True,
+        "defaultUserRole": "user",
+        "sessionTimeout": 60
+    },
+    "ai": {
+        "defaultModel": "claude-3-sonnet",
+        "maxTokens": 4000,
+        "temperature": 0.7,
+        "ragEnabled": True,
+        "ragTopK": 5,
+        "streamingEnabled": True
+    },
+    "security": {
+        "passwordMinLength": 8,
+        "passwordRequireUppercase": True,
+        "passwordRequireNumbers": True,
+        "passwordRequireSpecial": True,
+        "maxLoginAttempts": 5,
+        "lockoutDuration": 30,
+        "twoFactorEnabled": False
+    },
+    "notifications": {
+        "emailEnabled": False,
+        "emailHost": "",
+        "emailPort": 587,
+        "emailUsername": "",
+        "emailFromAddress": "",
+        "slackEnabled": False,
+        "slackWebhookUrl": ""
+    },
+    "storage": {
+        "maxFileSize": 10,
+        "allowedFileTypes": ["pdf", "docx", "txt", "md"],
+        "storageQuota": 50,
+        "autoCleanupEnabled": False,
+        "cleanupAfterDays": 90
+    }
+}
+
+# (mtime, settings) of the last file read, so hot paths do not re-parse it per request
+_cached: Optional[Tuple[float, dict]] = None
+
+
+def load_settings() -> dict:
+    """Load system settings from file"""
+    if SETTINGS_FILE.exists():
+        with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    else:
+        # Return default settings
+        return deepcopy(DEFAULT_SETTINGS)
+
+
+def save_settings(settings_data: dict):
+    """Save system settings to file"""
+    # Create directory if it doesn't exist
+    SETTINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    
+    with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(settings_data, f, indent=2, ensure_ascii=False)
+
+
+def get_ai_settings() -> Dict[str, Any]:
+    """The "ai" section merged over defaults; re-read only when the file changes"""
+    global _cached
+    try:
+        mtime = SETTINGS_FILE.stat().st_mtime if SETTINGS_FILE.exists() else 0.0
+        if _cached is None or _cached[0] != mtime:
+            _cached = (mtime, load_settings())
+        return {**DEFAULT_SETTINGS["ai"], **(_cached[1].get("ai") or {})}
+    except Exception as e:
+        logger.warning(f"Failed to read system settings, using defaults: {e}")
+        return dict(DEFAULT_SETTINGS["ai"])
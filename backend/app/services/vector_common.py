@@ -0,0 +1,117 @@
+"""
+Helpers shared by the vector backends: API filter names, content hashing,
+the content-addressed document and point ids, and tenant collection names.
+Both VectorService (Qdrant) and LocalVectorService import them from here, so
+neither backend module depends on the other.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID, uuid5
+import hashlib
+import re
+
+from langchain_core.documents import Document
+from qdrant_client.http.models import FieldCondition, Filter, MatchAny, MatchValue
+
+from .document_parser import detect_language
+from .embedding_cache import normalize_text
+from .embedding_pipeline import CONTENT_KEY, METADATA_KEY
+
+# Fixed namespace so point ids stay stable across processes and releases
+POINT_ID_NAMESPACE = UUID("6f1c2a8e-3d4b-5e9f-8a7c-1b2d3e4f5a6b")
+
+# Query filter names accepted from API callers, mapped to payload fields
+FILTER_FIELDS = {
+    "category": "metadata.category",
+    "institution_id": "metadata.institution_id",
+    "institution": "metadata.institution_id",
+    "uploaded_by": "metadata.uploaded_by",
+    "uploader": "metadata.uploaded_by",
+    "document_id": "metadata.document_id",
+    "language": "metadata.language",
+}
+
+
+def build_filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+    """
+    Translate {"category": "guide", "document_id": ["a", "b"]} into a Qdrant
+    filter: scalars match exactly, lists match any value, None is ignored.
+    Raises ValueError for fields that are not indexed.
+    """
+    conditions = []
+    for name, value in (filters or {}).items():
+        if value is None or value == []:
+            continue
+        field = FILTER_FIELDS.get(name)
+        if field is None:
+            raise ValueError(f"Unsupported filter: {name}. Allowed: {', '.join(sorted(FILTER_FIELDS))}")
+        match = MatchAny(any=list(value)) if isinstance(value, (list, tuple, set)) else MatchValue(value=value)
+        conditions.append(FieldCondition(key=field, match=match))
+    return Filter(must=conditions) if conditions else None
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def duplicate_key(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], str]:
+    """
+    Points collapse only when one document was ingested twice; the same
+    boilerplate in two documents or two tenants is distinct content.
+    """
+    metadata = payload.get(METADATA_KEY) or {}
+    return (
+        metadata.get("institution_id"),
+        metadata.get("document_id"),
+        content_hash(payload.get(CONTENT_KEY, ""))
+    )
+
+
+def group_by_document(removed: List[Tuple[Any, Optional[str]]]) -> Dict[str, List[str]]:
+    """document_id -> removed point ids, for updating the registry"""
+    groups: Dict[str, List[str]] = {}
+    for point_id, document_id in removed:
+        if document_id:
+            groups.setdefault(document_id, []).append(str(point_id))
+    return groups
+
+
+def document_id_for(text: str, institution_id: Optional[str] = None) -> str:
+    """Stable id for a source document that has none, derived from its content"""
+    return document_id_from_hash(content_hash(text), institution_id)
+
+
+def document_id_from_hash(digest: str, institution_id: Optional[str] = None) -> str:
+    """Same bytes uploaded by two institutions are two documents, each owned by its tenant"""
+    if institution_id:
+        return str(uuid5(POINT_ID_NAMESPACE, f"document:{institution_id}:{digest}"))
+    return str(uuid5(POINT_ID_NAMESPACE, f"document:{digest}"))
+
+
+def point_id_for(document_id: str, chunk_index: int, text: str) -> str:
+    return str(uuid5(POINT_ID_NAMESPACE, f"{document_id}:{chunk_index}:{content_hash(text)}"))
+
+
+def prepare_documents(documents: List[Document], metadata: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Attach upload metadata, content hash and language; returns content-addressed point ids"""
+    ids = []
+    for index, doc in enumerate(documents):
+        if metadata:
+            doc.metadata.update(metadata)
+        doc.metadata["content_hash"] = content_hash(doc.page_content)
+        doc.metadata.setdefault("language", detect_language(doc.page_content))
+        # Content-addressed IDs make retried or repeated uploads idempotent
+        ids.append(point_id_for(
+            str(doc.metadata.get("document_id", "")),
+            doc.metadata.get("chunk_index", index),
+            doc.page_content
+        ))
+    return ids
+
+
+def tenant_collection_name(base: str, institution_id: str) -> str:
+    """Per-institution collection name; ids that are not name-safe get a hash suffix"""
+    institution_id = str(institution_id)
+    slug = re.sub(r"[^a-z0-9_-]+", "_", institution_id.lower()).strip("_")
+    if slug != institution_id:
+        slug = f"{slug}_{hashlib.sha1(institution_id.encode('utf-8')).hexdigest()[:8]}"
+    return f"{base}_tenant_{slug}"
@@ -2,27 +2,159 @@
 Vector Store Service using Qdrant for RAG implementation
 """
 from typing import List, Dict, Any, Optional
-from uuid import uuid4
+import asyncio
 import logging
 
 from langchain_core.documents import Document
 from langchain_qdrant import QdrantVectorStore
-from langchain_openai import OpenAIEmbeddings
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.models import (
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    Fusion,
+    FusionQuery,
+    IsEmptyCondition,
+    MatchValue,
+    PayloadField,
+    PointIdsList,
+    Prefetch,
+    ScoredPoint,
+    SearchParams,
+    SparseVector
+)
 
+from .collection_profiles import (
+    CollectionProfile,
+    create_collection,
+    dense_vector_size,
+    ensure_payload_indexes,
+    get_profile,
+    list_collections,
+    resolve_collection
+)
+from .embedding_cache import CachedEmbeddings, create_embedding_cache
+from .embedding_pipeline import (
+    CONTENT_KEY,
+    METADATA_KEY,
+    EmbeddingPipeline,
+    ProgressCallback,
+    wait_for_write_fence
+)
+from .embedding_providers import EmbeddingProvider, create_embedding_provider
+from .local_vector_store import LocalVectorService
+from .retrieval_cache import Hit, RetrievalCache, result_key
+from .sparse_encoder import SPARSE_VECTOR_NAME, encode as encode_sparse
+from .vector_common import (
+    build_filter,
+    duplicate_key,
+    group_by_document,
+    prepare_documents,
+    tenant_collection_name
+)
 from ..core.config import settings
+from ..core.metrics import register_collector
 
 logger = logging.getLogger(__name__)
 
+def tenant_isolation_filter(institution_id: Optional[str]) -> Filter:
+    """Shared-collection documents a tenant may see: untenanted ones and its own legacy uploads"""
+    should = [IsEmptyCondition(is_empty=PayloadField(key="metadata.institution_id"))]
+    if institution_id:
+        should.append(FieldCondition(key="metadata.institution_id", match=MatchValue(value=str(institution_id))))
+    return Filter(should=should)
+
+
+def combine_filters(*filters: Optional[Filter]) -> Optional[Filter]:
+    filters = [f for f in filters if f is not None]
+    if len(filters) <= 1:
+        return filters[0] if filters else None
+    return Filter(must=filters)
+
+
+def merge_results(results: List[List[ScoredPoint]], k: int) -> List[ScoredPoint]:
+    """Merge per-collection hits by score, keeping the best copy of any repeated point"""
+    best: Dict[Any, ScoredPoint] = {}
+    for points in results:
+        for point in points:
+            if point.id not in best or point.score > best[point.id].score:
+                best[point.id] = point
+    return sorted(best.values(), key=lambda point: point.score, reverse=True)[:k]
+
+
+async def search_points(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    dense: List[float],
+    k: int,
+    sparse: Optional[SparseVector] = None,
+    query_filter: Optional[Filter] = None,
+    prefetch_limit: Optional[int] = None,
+    search_params: Optional[SearchParams] = None,
+    score_threshold: Optional[float] = None
+) -> List[ScoredPoint]:
+    """
+    Dense search, or dense + sparse fused with RRF in a single Query API call.
+    
+    The score threshold applies to dense similarity only: fused RRF scores are
+    ranks, and a lexical match is relevant whatever its cosine.
+    """
+    if sparse is None:
+        response = await client.query_points(
+            collection_name=collection_name,
+            query=dense,
+            query_filter=query_filter,
+            search_params=search_params,
+            score_threshold=score_threshold,
+            limit=k,
+            with_payload=True
+        )
+        return response.points
+    
+    prefetch_limit = prefetch_limit or k * settings.RAG_PREFETCH_MULTIPLIER
+    response = await client.query_points(
+        collection_name=collection_name,
+        prefetch=[
+            Prefetch(
+                query=dense, filter=query_filter, params=search_params,
+                score_threshold=score_threshold, limit=prefetch_limit
+            ),
+            Prefetch(query=sparse, using=SPARSE_VECTOR_NAME, filter=query_filter, limit=prefetch_limit)
+        ],
+        query=FusionQuery(fusion=Fusion.RRF),
+        limit=k,
+        with_payload=True
+    )
+    return response.points
+
+
+def point_to_document(point: ScoredPoint) -> Document:
+    payload = point.payload or {}
+    metadata = dict(payload.get(METADATA_KEY) or {})
+    metadata["_id"] = point.id
+    metadata["_score"] = point.score
+    return Document(page_content=payload.get(CONTENT_KEY, ""), metadata=metadata)
+
 
 class VectorService:
     """Service for managing vector embeddings and similarity search"""
     
     def __init__(self):
         self.client = None
+        self.async_client = None
         self.embeddings = None
         self.vector_store = None
+        self.pipeline = None
+        self.hybrid = False
+        self.profile = get_profile()
+        self.tenants: Dict[str, EmbeddingPipeline] = {}
+        self.providers: Dict[int, EmbeddingProvider] = {}
+        self.sizes: Dict[str, int] = {}
+        self.embedding_cache = create_embedding_cache()
+        self.retrieval_cache = RetrievalCache()
+        self.collection_name = "ai_tutor_knowledge"
+        self.ingested_chunks = 0
+        self.ingestion_seconds = 0.0
         self._initialize()
     
     def _initialize(self):
@@ -33,26 +165,33 @@ class VectorService:
                 host=settings.QDRANT_HOST,
                 port=settings.QDRANT_PORT
             )
-            
-            # Initialize OpenAI embeddings
-            self.embeddings = OpenAIEmbeddings(
-                model="text-embedding-3-small",
-                openai_api_key=settings.OPENAI_API_KEY
+            self.async_client = AsyncQdrantClient(
+                host=settings.QDRANT_HOST,
+                port=settings.QDRANT_PORT
             )
             
-            # Create collection if it doesn't exist
-            collection_name = "ai_tutor_knowledge"
-            try:
-                self.client.get_collection(collection_name)
-            except Exception:
-                self.client.create_collection(
-                    collection_name=collection_name,
-                    vectors_config=VectorParams(
-                        size=1536,  # OpenAI embedding dimension
-                        distance=Distance.COSINE
+            # Create collection if it doesn't exist (the name may be an alias after a migration)
+            collection_name = self.collection_name
+            physical_name = resolve_collection(self.client, collection_name)
+            if physical_name is None:
+                physical_name = collection_name
+                size = settings.EMBEDDING_DIMENSIONS
+                create_collection(self.client, collection_name, self.profile, size=size)
+            else:
+                ensure_payload_indexes(self.client, physical_name)
+                size = dense_vector_size(self.client, physical_name)
+                if size != settings.EMBEDDING_DIMENSIONS:
+                    logger.warning(
+                        f"Collection {collection_name} stores {size}-dimensional vectors but "
+                        f"EMBEDDING_DIMENSIONS is {settings.EMBEDDING_DIMENSIONS}; embedding at {size} until "
+                        f"python -m app.services.collection_migration --dimensions {settings.EMBEDDING_DIMENSIONS} "
+                        "moves the alias"
                     )
-                )
-                logger.info(f"Created collection: {collection_name}")
+            
+            # Initialize the embedding provider (OpenAI, or the offline hashing one) at the collection's size
+            self.embeddings = self.embeddings_for(size)
+            self.retrieval_cache.model = self.embeddings.model_key
+            self.hybrid = self._has_sparse_vectors(physical_name)
             
             # Initialize vector store
             self.vector_store = QdrantVectorStore(
@@ -61,32 +200,132 @@ class VectorService:
                 embedding=self.embeddings
             )
             
+            self.pipeline = self._open_pipeline(collection_name, size, self.hybrid)
+            
+            self.tenants = {}
+            
             logger.info("Vector service initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize vector service: {e}")
             # Don't raise exception in initialization - allow system to start
             self.client = None
+            self.async_client = None
             self.embeddings = None
             self.vector_store = None
+            self.pipeline = None
+    
+    def embeddings_for(self, size: int) -> EmbeddingProvider:
+        """Embedding provider at a collection's vector size (sizes differ while a migration rolls out)"""
+        if size not in self.providers:
+            self.providers[size] = create_embedding_provider(dimensions=size)
+        return self.providers[size]
+    
+    def _has_sparse_vectors(self, physical_name: str) -> bool:
+        # Hybrid search needs the sparse vector field, which only newer collections have
+        sparse_vectors = self.client.get_collection(physical_name).config.params.sparse_vectors or {}
+        hybrid = settings.RAG_HYBRID_SEARCH and SPARSE_VECTOR_NAME in sparse_vectors
+        if settings.RAG_HYBRID_SEARCH and not hybrid:
+            logger.warning(
+                f"Collection {physical_name} has no '{SPARSE_VECTOR_NAME}' sparse vector; "
+                "using dense-only retrieval until it is migrated"
+            )
+        return hybrid
+    
+    def _open_pipeline(self, name: str, size: int, hybrid: bool) -> EmbeddingPipeline:
+        embeddings = self.embeddings_for(size)
+        self.sizes[name] = size
+        return EmbeddingPipeline(
+            embeddings=CachedEmbeddings(embeddings, self.embedding_cache, embeddings.model_key),
+            client=self.async_client,
+            collection_name=name,
+            sparse_encoder=encode_sparse if hybrid else None,
+            sparse_vector_name=SPARSE_VECTOR_NAME
+        )
+    
+    def _sync_dimensions(self) -> bool:
+        """
+        Follow aliases that a migration moved to a collection of another size.
+        
+        Returns True when any open collection changed, so the failed call can
+        be retried with embeddings of the new size.
+        """
+        changed = False
+        for name, size in list(self.sizes.items()):
+            physical_name = resolve_collection(self.client, name)
+            if physical_name is None:
+                continue
+            current = dense_vector_size(self.client, physical_name)
+            if current == size:
+                continue
+            logger.info(f"Collection {name} now stores {current}-dimensional vectors; switching embeddings")
+            if name == self.collection_name:
+                self.embeddings = self.embeddings_for(current)
+                self.retrieval_cache.model = self.embeddings.model_key
+                self.hybrid = self._has_sparse_vectors(physical_name)
+                self.pipeline = self._open_pipeline(name, current, self.hybrid)
+            else:
+                self.tenants[name] = self._open_pipeline(name, current, settings.RAG_HYBRID_SEARCH)
+            changed = True
+        return changed
+    
+    async def _dimensions_changed(self) -> bool:
+        try:
+            return await asyncio.to_thread(self._sync_dimensions)
+        except Exception as e:
+            logger.warning(f"Failed to re-read collection vector sizes: {e}")
+            return False
+    
+    def collection_for(self, institution_id: Optional[str]) -> str:
+        """Collection that holds an institution's uploads (the shared one when routing is off)"""
+        if not settings.RAG_TENANT_COLLECTIONS or not institution_id:
+            return self.collection_name
+        return tenant_collection_name(self.collection_name, institution_id)
+    
+    def tenant_profile(self, institution_id: str) -> CollectionProfile:
+        name = settings.RAG_TENANT_PROFILES.get(str(institution_id))
+        return get_profile(name) if name else self.profile
+    
+    def _open_tenant(self, institution_id: str, create: bool) -> Optional[EmbeddingPipeline]:
+        """Pipeline for a tenant collection, creating the collection on first upload"""
+        name = self.collection_for(institution_id)
+        if name in self.tenants:
+            return self.tenants[name]
+        
+        physical_name = resolve_collection(self.client, name)
+        if physical_name is None:
+            if not create:
+                return None
+            size = settings.EMBEDDING_DIMENSIONS
+            create_collection(self.client, name, self.tenant_profile(institution_id), size)
+        else:
+            size = dense_vector_size(self.client, physical_name)
+        
+        self.tenants[name] = self._open_pipeline(name, size, settings.RAG_HYBRID_SEARCH)
+        return self.tenants[name]
+    
+    async def tenant_pipeline(self, institution_id: Optional[str], create: bool = True) -> Optional[EmbeddingPipeline]:
+        if self.collection_for(institution_id) == self.collection_name:
+            return self.pipeline
+        return await asyncio.to_thread(self._open_tenant, institution_id, create)
     
     async def add_documents(
         self,
         documents: List[Document],
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        progress: Optional[ProgressCallback] = None
     ) -> List[str]:
         """Add documents to the vector store"""
         try:
-            # Generate unique IDs for documents
-            ids = [str(uuid4()) for _ in documents]
-            
-            # Add metadata to documents if provided
-            if metadata:
-                for doc in documents:
-                    doc.metadata.update(metadata)
-            
-            # Add documents to vector store
-            self.vector_store.add_documents(documents=documents, ids=ids)
+            ids = prepare_documents(documents, metadata)
+            try:
+                await self._add_to_collections(documents, ids, progress)
+            except Exception:
+                # A migration may have moved the alias to a collection of another size;
+                # ids are content-addressed, so writing the batches again is harmless
+                if not await self._dimensions_changed():
+                    raise
+                await self._add_to_collections(documents, ids, progress)
             
             logger.info(f"Added {len(documents)} documents to vector store")
             return ids
@@ -95,26 +334,58 @@ class VectorService:
             logger.error(f"Failed to add documents: {e}")
             raise
     
+    async def _add_to_collections(
+        self,
+        documents: List[Document],
+        ids: List[str],
+        progress: Optional[ProgressCallback]
+    ):
+        # Route each institution's chunks to its own collection
+        groups: Dict[Optional[str], List[int]] = {}
+        for index, doc in enumerate(documents):
+            groups.setdefault(doc.metadata.get("institution_id"), []).append(index)
+        
+        done = 0
+        for institution_id, indices in groups.items():
+            pipeline = await self.tenant_pipeline(institution_id)
+            
+            def group_progress(current: int, total: int, offset=done):
+                progress(offset + current, len(documents))
+            
+            # Embed and upsert in concurrent batches without blocking the event loop
+            stats = await pipeline.run(
+                [documents[i] for i in indices],
+                [ids[i] for i in indices],
+                progress=group_progress if progress else None
+            )
+            done += len(indices)
+            self.ingested_chunks += stats["chunks"]
+            self.ingestion_seconds += stats["seconds"]
+            await self.retrieval_cache.bump(pipeline.collection_name)
+    
     async def similarity_search(
         self,
         query: str,
         k: int = 5,
-        filter_dict: Optional[Dict[str, Any]] = None
+        filter_dict: Optional[Dict[str, Any]] = None,
+        institution_id: Optional[str] = None,
+        score_threshold: Optional[float] = None
     ) -> List[Document]:
-        """Perform similarity search on the vector store"""
+        """
+        Perform similarity search on the vector store.
+        
+        With tenant routing on, the institution's collection and the shared
+        collection are searched concurrently and merged by score; the shared
+        collection is filtered so other tenants' legacy uploads stay hidden.
+        """
         try:
-            # Perform search
-            if filter_dict:
-                results = self.vector_store.similarity_search(
-                    query=query,
-                    k=k,
-                    filter=filter_dict
-                )
-            else:
-                results = self.vector_store.similarity_search(
-                    query=query,
-                    k=k
-                )
+            try:
+                results = await self._search(query, k, filter_dict, institution_id, score_threshold)
+            except Exception:
+                # A migration may have moved the alias to a collection of another size
+                if not await self._dimensions_changed():
+                    raise
+                results = await self._search(query, k, filter_dict, institution_id, score_threshold)
             
             logger.info(f"Found {len(results)} similar documents for query: {query[:50]}...")
             return results
@@ -123,17 +394,216 @@ class VectorService:
             logger.error(f"Failed to perform similarity search: {e}")
             raise
     
+    async def _search(
+        self,
+        query: str,
+        k: int,
+        filter_dict: Optional[Dict[str, Any]],
+        institution_id: Optional[str],
+        score_threshold: Optional[float]
+    ) -> List[Document]:
+        query_filter = build_filter(filter_dict)
+        targets = [(self.collection_name, self.hybrid, self.profile, query_filter)]
+        if settings.RAG_TENANT_COLLECTIONS:
+            targets = [(
+                self.collection_name, self.hybrid, self.profile,
+                combine_filters(query_filter, tenant_isolation_filter(institution_id))
+            )]
+            tenant = await self.tenant_pipeline(institution_id, create=False) if institution_id else None
+            if tenant is not None:
+                targets.append((
+                    tenant.collection_name, tenant.sparse_encoder is not None,
+                    self.tenant_profile(institution_id), query_filter
+                ))
+        
+        # Collections can have different vector sizes while a migration rolls out
+        dense: Dict[int, List[float]] = {}
+        for collection_name, _, _, _ in targets:
+            size = self.sizes[collection_name]
+            if size not in dense:
+                dense[size] = await self.retrieval_cache.embed_query(self.embeddings_for(size), query)
+        
+        versions = await self.retrieval_cache.corpus_versions([target[0] for target in targets])
+        results_key = result_key(
+            [value for size in sorted(dense) for value in dense[size]],
+            k, filter_dict, institution_id, versions, score_threshold
+        ) if versions is not None else None
+        if results_key:
+            hits = await self.retrieval_cache.get_results(results_key)
+            cached = await self._hydrate(hits) if hits is not None else None
+            if cached is not None:
+                return cached
+        
+        # Scores are only comparable when every collection is searched the same way
+        sparse = encode_sparse(query) if all(hybrid for _, hybrid, _, _ in targets) else None
+        
+        results = await asyncio.gather(*[
+            search_points(
+                self.async_client,
+                collection_name,
+                dense[self.sizes[collection_name]],
+                k,
+                sparse=sparse,
+                query_filter=target_filter,
+                search_params=profile.search_params(),
+                score_threshold=score_threshold
+            )
+            for collection_name, _, profile, target_filter in targets
+        ])
+        origin = {
+            id(point): collection_name
+            for (collection_name, _, _, _), points in zip(targets, results)
+            for point in points
+        }
+        points = merge_results(results, k)
+        if results_key:
+            await self.retrieval_cache.set_results(
+                results_key, [(origin[id(point)], point.id, point.score) for point in points]
+            )
+        return [point_to_document(point) for point in points]
+    
+    async def _hydrate(self, hits: List[Hit]) -> Optional[List[Document]]:
+        """Documents for cached hits, or None if any point is gone and the search must run again"""
+        by_collection: Dict[str, List[Any]] = {}
+        for collection_name, point_id, _ in hits:
+            by_collection.setdefault(collection_name, []).append(point_id)
+        records = await asyncio.gather(*[
+            self.async_client.retrieve(collection_name=collection_name, ids=ids, with_payload=True)
+            for collection_name, ids in by_collection.items()
+        ])
+        found = {
+            (collection_name, str(record.id)): record
+            for collection_name, batch in zip(by_collection, records)
+            for record in batch
+        }
+        documents = []
+        for collection_name, point_id, score in hits:
+            record = found.get((collection_name, str(point_id)))
+            if record is None:
+                return None
+            documents.append(point_to_document(
+                ScoredPoint(id=record.id, version=0, score=score, payload=record.payload)
+            ))
+        return documents
+    
     async def delete_documents(self, ids: List[str]) -> bool:
         """Delete documents from the vector store by IDs"""
         try:
+            await wait_for_write_fence(self.collection_name)
             self.vector_store.delete(ids=ids)
+            await self.retrieval_cache.bump(self.collection_name)
             logger.info(f"Deleted {len(ids)} documents from vector store")
             return True
             
         except Exception as e:
             logger.error(f"Failed to delete documents: {e}")
             raise
+    
+    async def delete_by_document(self, document_id: str, institution_id: Optional[str] = None) -> bool:
+        """Delete every chunk of a source document with one filtered delete per collection"""
+        try:
+            # Uploads made before tenant routing live in the shared collection
+            collections = [self.collection_name]
+            tenant = await self.tenant_pipeline(institution_id, create=False) if institution_id else None
+            if tenant is not None and tenant is not self.pipeline:
+                collections.append(tenant.collection_name)
+            
+            for collection_name in collections:
+                await wait_for_write_fence(collection_name)
+                await self.async_client.delete(
+                    collection_name=collection_name,
+                    points_selector=FilterSelector(filter=Filter(must=[
+                        FieldCondition(key="metadata.document_id", match=MatchValue(value=document_id))
+                    ])),
+                    wait=True
+                )
+            await self.retrieval_cache.bump(*collections)
+            logger.info(f"Deleted chunks of document {document_id} from vector store")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to delete document {document_id}: {e}")
+            raise
+    
+    async def deduplicate(self, page_size: int = 1000) -> Dict[str, Any]:
+        """
+        Collapse re-ingested chunks within each collection, keeping the first one seen.
+        
+        "documents" maps each affected document_id to its removed point ids so
+        the caller can update the registry.
+        """
+        tenant_collections = await asyncio.to_thread(
+            list_collections, self.client, f"{self.collection_name}_tenant_"
+        )
+        scanned = 0
+        removed = []
+        
+        for collection_name in [self.collection_name, *tenant_collections]:
+            seen = set()
+            duplicates = []
+            offset = None
+            
+            while True:
+                points, offset = await self.async_client.scroll(
+                    collection_name=collection_name,
+                    limit=page_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=False
+                )
+                for point in points:
+                    scanned += 1
+                    payload = point.payload or {}
+                    key = duplicate_key(payload)
+                    if key in seen:
+                        duplicates.append((point.id, key[1]))
+                    else:
+                        seen.add(key)
+                if offset is None:
+                    break
+            
+            for start in range(0, len(duplicates), page_size):
+                await wait_for_write_fence(collection_name)
+                await self.async_client.delete(
+                    collection_name=collection_name,
+                    points_selector=PointIdsList(
+                        points=[point_id for point_id, _ in duplicates[start:start + page_size]]
+                    ),
+                    wait=True
+                )
+            removed.extend(duplicates)
+            if duplicates:
+                await self.retrieval_cache.bump(collection_name)
+        
+        logger.info(f"Deduplicated vector store: removed {len(removed)} of {scanned} points")
+        return {
+            "scanned": scanned,
+            "removed": len(removed),
+            "remaining": scanned - len(removed),
+            "documents": group_by_document(removed)
+        }
+    
+    def collect_metrics(self):
+        """Ingestion counters for /metrics"""
+        yield "rag_ingested_chunks_total", "counter", "Chunks embedded and indexed", self.ingested_chunks
+        yield "rag_ingestion_seconds_total", "counter", "Time spent ingesting chunks", round(self.ingestion_seconds, 3)
+
+
+VECTOR_BACKENDS = {
+    "qdrant": VectorService,
+    "local": LocalVectorService,
+}
+
+
+def create_vector_service(name: Optional[str] = None):
+    name = name or settings.VECTOR_BACKEND
+    if name not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend: {name}. Choose from: {', '.join(VECTOR_BACKENDS)}")
+    return VECTOR_BACKENDS[name]()
 
 
 # Singleton instance
-vector_service = VectorService()
\ No newline at end of file
+vector_service = create_vector_service()
+register_collector(vector_service.collect_metrics)
+register_collector(vector_service.embedding_cache.collect_metrics)
+register_collector(vector_service.retrieval_cache.collect_metrics)
\ No newline at end of file
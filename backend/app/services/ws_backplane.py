@@ -0,0 +1,223 @@
+"""
+Cross-process backplane for WebSocket delivery.
+
+Each node subscribes once, on a single pub/sub connection, to its own node
+channel plus the shared broadcast channel. Redis keeps a sorted set of node
+ids per user and per room, so a personal or room message is published only
+to the nodes that actually hold a recipient socket and a broadcast is
+published exactly once.
+
+Membership is scored by when the node last heartbeated. Each node refreshes
+its entries (and the keys' expiry) every WS_BACKPLANE_HEARTBEAT_SECONDS, and
+routing prunes entries older than three heartbeats, so a crashed node stops
+receiving traffic and its keys eventually expire.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from uuid import uuid4
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+
+from ..core.config import settings
+from ..core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+EnvelopeHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class Backplane:
+    """Single-process backplane: every socket is local, nothing to route"""
+
+    def __init__(self):
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+    async def start(self, on_envelope: EnvelopeHandler):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def register_user(self, user_id: int):
+        pass
+
+    async def unregister_user(self, user_id: int):
+        pass
+
+    async def register_room(self, room: str):
+        pass
+
+    async def unregister_room(self, room: str):
+        pass
+
+    async def publish_to_user(self, user_id: int, message: dict):
+        pass
+
+    async def publish_to_room(self, room: str, message: dict, exclude_user_id: Optional[int] = None):
+        pass
+
+    async def publish_broadcast(self, message: dict, exclude_user_id: Optional[int] = None):
+        pass
+
+
+class RedisBackplane(Backplane):
+    """Routes events between nodes with Redis pub/sub"""
+
+    def __init__(self, prefix: str = "ws", heartbeat: float = settings.WS_BACKPLANE_HEARTBEAT_SECONDS):
+        super().__init__()
+        self.prefix = prefix
+        self.node_channel = f"{prefix}:node:{self.node_id}"
+        self.broadcast_channel = f"{prefix}:broadcast"
+        self.heartbeat = heartbeat
+        self.node_ttl = heartbeat * 3
+        self._listener: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # Routing keys this node is listed in, refreshed on every heartbeat
+        self._keys: Set[str] = set()
+
+    def _user_nodes_key(self, user_id: int) -> str:
+        return f"{self.prefix}:user_routes:{user_id}"
+
+    def _room_nodes_key(self, room: str) -> str:
+        return f"{self.prefix}:room_routes:{room}"
+
+    def _envelope(self, op: str, message: dict, **extra) -> str:
+        return json.dumps(
+            {"origin": self.node_id, "op": op, "message": message, **extra},
+            ensure_ascii=False,
+            default=str
+        )
+
+    async def start(self, on_envelope: EnvelopeHandler):
+        self._listener = asyncio.create_task(self._listen(on_envelope))
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        for task in (self._listener, self._heartbeat_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._listener = None
+        self._heartbeat_task = None
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            await self.refresh()
+
+    async def refresh(self):
+        """Mark this node alive in every routing key it is listed in"""
+        keys = list(self._keys)
+        if not keys:
+            return
+        now = time.time()
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.zadd(key, {self.node_id: now})
+                    pipe.expire(key, int(self.node_ttl) + 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to refresh backplane membership: {e}")
+
+    async def _listen(self, on_envelope: EnvelopeHandler):
+        while True:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.node_channel, self.broadcast_channel)
+                logger.info(f"WebSocket backplane subscribed as {self.node_id}")
+                async for raw in pubsub.listen():
+                    if raw.get("type") != "message":
+                        continue
+                    envelope = json.loads(raw["data"])
+                    if envelope.get("origin") == self.node_id:
+                        continue
+                    try:
+                        await on_envelope(envelope)
+                    except Exception as e:
+                        logger.error(f"Failed to deliver backplane event: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket backplane connection lost: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def _add_node(self, key: str):
+        self._keys.add(key)
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.zadd(key, {self.node_id: time.time()})
+                pipe.expire(key, int(self.node_ttl) + 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to register {key} on backplane: {e}")
+
+    async def _remove_node(self, key: str):
+        self._keys.discard(key)
+        try:
+            await get_redis().zrem(key, self.node_id)
+        except Exception as e:
+            logger.error(f"Failed to unregister {key} from backplane: {e}")
+
+    async def _publish_to_nodes(self, key: str, payload: str):
+        """Publish to every other live node listed in a routing set, pruning dead ones"""
+        try:
+            redis = get_redis()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(key, "-inf", time.time() - self.node_ttl)
+                pipe.zrange(key, 0, -1)
+                _, nodes = await pipe.execute()
+            remote_nodes = [node for node in nodes if node != self.node_id]
+            if not remote_nodes:
+                return
+
+            async with redis.pipeline(transaction=False) as pipe:
+                for node in remote_nodes:
+                    pipe.publish(f"{self.prefix}:node:{node}", payload)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to publish to {key}: {e}")
+
+    async def register_user(self, user_id: int):
+        await self._add_node(self._user_nodes_key(user_id))
+
+    async def unregister_user(self, user_id: int):
+        await self._remove_node(self._user_nodes_key(user_id))
+
+    async def register_room(self, room: str):
+        await self._add_node(self._room_nodes_key(room))
+
+    async def unregister_room(self, room: str):
+        await self._remove_node(self._room_nodes_key(room))
+
+    async def publish_to_user(self, user_id: int, message: dict):
+        payload = self._envelope("user", message, user_id=user_id)
+        await self._publish_to_nodes(self._user_nodes_key(user_id), payload)
+
+    async def publish_to_room(self, room: str, message: dict, exclude_user_id: Optional[int] = None):
+        payload = self._envelope("room", message, room=room, exclude_user_id=exclude_user_id)
+        await self._publish_to_nodes(self._room_nodes_key(room), payload)
+
+    async def publish_broadcast(self, message: dict, exclude_user_id: Optional[int] = None):
+        try:
+            payload = self._envelope("broadcast", message, exclude_user_id=exclude_user_id)
+            await get_redis().publish(self.broadcast_channel, payload)
+        except Exception as e:
+            logger.error(f"Failed to publish broadcast: {e}")
+
+
+def create_backplane() -> Backplane:
+    if settings.WS_BACKPLANE == "redis":
+        return RedisBackplane()
+    return Backplane()
@@ -0,0 +1,113 @@
+"""
+WebSocket wire formats.
+
+JSON text frames remain the default. Clients that offer the
+"aitutor.msgpack.v1" subprotocol get the same events as MessagePack binary
+frames with integer event-type codes ("t") and epoch-millisecond
+timestamps ("ts") instead of type names and ISO-8601 strings.
+"""
+from typing import Any, Dict, Iterable, Optional, Union
+from datetime import datetime, timezone
+import json
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional wire format
+    msgpack = None
+
+MSGPACK_SUBPROTOCOL = "aitutor.msgpack.v1"
+
+# Stable wire codes; append new event types, never renumber
+EVENT_CODES: Dict[str, int] = {
+    # Server -> client
+    "connection": 1,
+    "pong": 2,
+    "user_joined": 3,
+    "user_left": 4,
+    "user_typing": 5,
+    "user_stop_typing": 6,
+    "online_users": 7,
+    "subscribed": 8,
+    "subscribe_denied": 9,
+    "chat_start": 10,
+    "chat_chunk": 11,
+    "chat_complete": 12,
+    "chat_cancelled": 13,
+    "chat_error": 14,
+    "error": 15,
+    # Client -> server
+    "ping": 64,
+    "typing": 65,
+    "stop_typing": 66,
+    "subscribe": 67,
+    "unsubscribe": 68,
+    "get_online_users": 69,
+    "chat_request": 70,
+    "chat_cancel": 71,
+}
+EVENT_NAMES: Dict[int, str] = {code: name for name, code in EVENT_CODES.items()}
+
+Frame = Union[str, bytes]
+
+
+class MalformedFrame(ValueError):
+    """A client frame that does not decode to a message object"""
+
+
+class JsonCodec:
+    name = "json"
+    subprotocol: Optional[str] = None
+    binary = False
+
+    def encode(self, message: Dict[str, Any]) -> Frame:
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def decode(self, frame: Frame) -> Dict[str, Any]:
+        return json.loads(frame)
+
+
+class MsgPackCodec(JsonCodec):
+    name = "msgpack"
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    @staticmethod
+    def _epoch_ms(timestamp: Any) -> Any:
+        if isinstance(timestamp, str):
+            try:
+                timestamp = datetime.fromisoformat(timestamp)
+            except ValueError:
+                return timestamp
+        if isinstance(timestamp, datetime):
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            return int(timestamp.timestamp() * 1000)
+        return timestamp
+
+    def encode(self, message: Dict[str, Any]) -> Frame:
+        packed = {}
+        for key, value in message.items():
+            if key == "type" and value in EVENT_CODES:
+                packed["t"] = EVENT_CODES[value]
+            elif key == "timestamp":
+                packed["ts"] = self._epoch_ms(value)
+            else:
+                packed[key] = value
+        return msgpack.packb(packed, use_bin_type=True, default=str)
+
+    def decode(self, frame: Frame) -> Dict[str, Any]:
+        message = msgpack.unpackb(frame, raw=False)
+        if "t" in message:
+            message["type"] = EVENT_NAMES.get(message.pop("t"))
+        return message
+
+
+JSON_CODEC = JsonCodec()
+MSGPACK_CODEC = MsgPackCodec() if msgpack is not None else None
+
+
+def negotiate_codec(offered: Iterable[str]):
+    """Pick the codec for the subprotocols a client offered (JSON if none match)"""
+    if MSGPACK_CODEC is not None and MSGPACK_SUBPROTOCOL in offered:
+        return MSGPACK_CODEC
+    return JSON_CODEC
@@ -0,0 +1,83 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
+
+from app.core.celery_app import celery_app
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# One event loop per worker process: the async Redis, Qdrant and OpenAI
+# clients bind their connection pools to the loop that first used them.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def run_async(coroutine):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coroutine)
+
+
+@celery_app.task(bind=True)
+def ingest_document_task(
+    self,
+    file_path: str,
+    title: str,
+    uploaded_by: int,
+    institution_id: Optional[str] = None,
+    category: Optional[str] = None,
+    source: Optional[str] = None,
+    filename: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Celery task to parse, embed and index a spooled upload.
+    """
+    from app.services.rag_service import rag_service
+
+    db: Session = SessionLocal()
+    meta = {"uploaded_by": uploaded_by, "title": title, "filename": filename}
+
+    def report_progress(done: int, total: int):
+        self.update_state(
+            state="PROGRESS",
+            meta={**meta, "current": done, "total": total, "status": "임베딩 중..."}
+        )
+
+    try:
+        self.update_state(state="PROGRESS", meta={**meta, "current": 0, "total": 0, "status": "문서 분석 중..."})
+
+        document = run_async(rag_service.ingest_file(
+            db,
+            path=file_path,
+            title=title,
+            uploaded_by=uploaded_by,
+            institution_id=institution_id,
+            category=category,
+            source=source,
+            filename=filename,
+            metadata=metadata,
+            progress=report_progress
+        ))
+
+        return {
+            **meta,
+            "status": "success",
+            "document_id": document.id,
+            "current": document.chunk_count,
+            "total": document.chunk_count
+        }
+
+    except Exception as e:
+        logger.error(f"Error ingesting {filename or title}: {str(e)}")
+        return {**meta, "status": "error", "message": str(e)}
+
+    finally:
+        db.close()
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Qdrant 컬렉션 프로파일 벤치마크
+
+Builds one scratch collection per storage profile (default, ondisk, scalar,
+binary) from the same synthetic clustered vectors. Each profile is searched
+with its own search params, and the results are checked against exact
+brute-force neighbours computed with NumPy. Reports recall@k, mean and p95
+query latency, and the resident vector + graph size estimated from the
+profile's storage layout. The size is computed, not measured on the server.
+
+Quantization and on-disk storage only take effect on a real Qdrant server.
+In-process mode (--qdrant-url "") accepts the configs but searches the
+originals, so use it only for smoke runs.
+
+    python -m benchmarks.vector_profile_benchmark --points 50000 --dim 1536
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from qdrant_client import QdrantClient  # noqa: E402
+from qdrant_client.http.models import PointStruct  # noqa: E402
+
+from app.services.collection_profiles import PROFILES, create_collection, get_profile  # noqa: E402
+
+DEFAULT_HISTORY = Path(__file__).resolve().parent / "results" / "vector_profile_benchmark.jsonl"
+COLLECTION_PREFIX = "profile_benchmark_"
+
+
+def synthetic_vectors(points: int, queries: int, dim: int, clusters: int, seed: int):
+    """Unit vectors drawn around random centroids, which resembles embedding space better than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim)).astype(np.float32)
+    data = centroids[rng.integers(clusters, size=points)] + 0.35 * rng.normal(size=(points, dim)).astype(np.float32)
+    query = centroids[rng.integers(clusters, size=queries)] + 0.35 * rng.normal(size=(queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    query /= np.linalg.norm(query, axis=1, keepdims=True)
+    return data, query
+
+
+def exact_neighbours(data: np.ndarray, query: np.ndarray, k: int) -> List[set]:
+    truth = []
+    for start in range(0, len(query), 256):
+        scores = query[start:start + 256] @ data.T
+        top = np.argpartition(-scores, k, axis=1)[:, :k]
+        truth.extend(set(row.tolist()) for row in top)
+    return truth
+
+
+def load(client: QdrantClient, collection: str, data: np.ndarray, batch_size: int = 512):
+    for start in range(0, len(data), batch_size):
+        client.upsert(
+            collection_name=collection,
+            points=[
+                PointStruct(id=start + i, vector=vector.tolist(), payload={})
+                for i, vector in enumerate(data[start:start + batch_size])
+            ],
+            wait=True
+        )
+
+
+def wait_for_indexing(client: QdrantClient, collection: str, timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = client.get_collection(collection)
+        if str(info.status).lower().endswith("green"):
+            return
+        time.sleep(1.0)
+
+
+def run_profile(client: QdrantClient, name: str, data, query, truth, k: int) -> Dict:
+    profile = get_profile(name)
+    collection = COLLECTION_PREFIX + name
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    create_collection(client, collection, profile, data.shape[1])
+
+    started = time.perf_counter()
+    load(client, collection, data)
+    wait_for_indexing(client, collection)
+    build_seconds = time.perf_counter() - started
+
+    recall, latency = [], []
+    params = profile.search_params()
+    for vector, expected in zip(query, truth):
+        started = time.perf_counter()
+        points = client.query_points(
+            collection_name=collection, query=vector.tolist(), limit=k, search_params=params
+        ).points
+        latency.append(time.perf_counter() - started)
+        recall.append(len(expected & {point.id for point in points}) / k)
+
+    client.delete_collection(collection)
+    return {
+        "recall_at_k": round(float(np.mean(recall)), 4),
+        "latency_ms": round(float(np.mean(latency)) * 1000, 3),
+        "p95_latency_ms": round(float(np.percentile(latency, 95)) * 1000, 3),
+        "estimated_ram_mb": round(profile.estimated_ram_bytes(len(data), data.shape[1]) / 2 ** 20, 1),
+        "build_seconds": round(build_seconds, 1),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Qdrant collection profile benchmark")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--qdrant-url", default="http://localhost:6333", help='"" runs Qdrant in-process')
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--no-record", action="store_true", help="do not append to the history file")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(location=":memory:")
+    data, query = synthetic_vectors(args.points, args.queries, args.dim, args.clusters, args.seed)
+    truth = exact_neighbours(data, query, args.k)
+
+    result = {name: run_profile(client, name, data, query, truth, args.k) for name in args.profiles}
+
+    print("===================================")
+    print("컬렉션 프로파일 벤치마크 결과")
+    print("===================================")
+    print(f"{'profile':>10} {'recall':>8} {'mean ms':>9} {'p95 ms':>9} {'est. RAM MB':>12}")
+    for name, row in result.items():
+        print(
+            f"{name:>10} {row['recall_at_k']:>8} {row['latency_ms']:>9} "
+            f"{row['p95_latency_ms']:>9} {row['estimated_ram_mb']:>12}"
+        )
+    print("est. RAM: computed from the profile's storage layout (CollectionProfile.estimated_ram_bytes), not measured")
+
+    if not args.no_record:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "timestamp": datetime.utcnow().isoformat(),
+                "revision": git_revision(),
+                "config": {
+                    "points": args.points, "queries": args.queries, "dim": args.dim,
+                    "k": args.k, "in_process": not args.qdrant_url,
+                },
+                "result": result,
+            }) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+WebSocket 실시간 계층 부하 벤치마크
+
+Runs N simulated clients in-process against the real websocket_endpoint and
+ConnectionManager (authentication and the conversation ACL lookup are
+replaced, nothing else), drives ping / typing / join-leave churn and server
+broadcasts at configurable rates, and reports:
+
+- broadcast fan-out latency percentiles (enqueue to last socket write)
+- typing delivery latency and ping round-trip percentiles
+- memory per connection (tracemalloc)
+- CPU time per inbound event and per delivered frame
+
+Each run is appended to a JSON-lines history file and compared with the
+previous run of the same configuration; exceeding --max-regression exits
+non-zero so CI can catch regressions in the realtime layer.
+
+    python -m benchmarks.ws_benchmark --clients 2000 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import WebSocketDisconnect  # noqa: E402
+
+from app.api.v1 import websocket as ws_module  # noqa: E402
+from app.api.v1.websocket import ConnectionManager  # noqa: E402
+
+DEFAULT_HISTORY = Path(__file__).resolve().parent / "results" / "ws_benchmark.jsonl"
+
+# Metrics compared against the previous run (lower is better)
+TRACKED_METRICS = [
+    "broadcast_p50_ms", "broadcast_p99_ms", "typing_p99_ms", "ping_p99_ms",
+    "memory_per_connection_kb", "cpu_us_per_event"
+]
+
+
+class Stats:
+    def __init__(self):
+        self.broadcast_latency: List[float] = []
+        self.broadcast_completion: Dict[int, float] = {}
+        self.broadcast_started: Dict[int, float] = {}
+        self.typing_latency: List[float] = []
+        self.typing_sent: Dict[tuple, float] = {}
+        self.ping_rtt: List[float] = []
+        self.frames_in = 0
+        self.frames_out = 0
+
+
+class BenchClient:
+    """Fake WebSocket fed from an inbox queue; records what it receives"""
+
+    def __init__(self, user_id: int, room: str, stats: Stats):
+        self.user = SimpleNamespace(
+            id=user_id, name=f"bench-{user_id}", email=f"bench-{user_id}@example.com",
+            role="user", institution_id=f"inst-{user_id % 10}"
+        )
+        self.room = room
+        self.stats = stats
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.pings = deque()
+        self.task = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def receive_json(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise WebSocketDisconnect()
+        self.stats.frames_in += 1
+        return message
+
+    async def send_text(self, data: str):
+        now = time.perf_counter()
+        self.stats.frames_out += 1
+        message = json.loads(data)
+        message_type = message.get("type")
+        if message_type == "bench_broadcast":
+            seq = message["seq"]
+            self.stats.broadcast_latency.append(now - self.stats.broadcast_started[seq])
+            self.stats.broadcast_completion[seq] = now
+        elif message_type == "user_typing":
+            sent = self.stats.typing_sent.get((message["user_id"], str(message["conversation_id"])))
+            if sent:
+                self.stats.typing_latency.append(now - sent)
+        elif message_type == "pong" and self.pings:
+            self.stats.ping_rtt.append(now - self.pings.popleft())
+
+    async def close(self, code: int = 1000):
+        self.inbox.put_nowait(None)
+
+    def send(self, message: dict):
+        self.inbox.put_nowait(message)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(len(ordered) * pct / 100), len(ordered) - 1)
+    return ordered[index] * 1000
+
+
+def poisson(rate: float) -> int:
+    """Number of events in one tick for an expected rate per tick"""
+    count, threshold, product = 0, math.exp(-rate), random.random()
+    while product > threshold:
+        count += 1
+        product *= random.random()
+    return count
+
+
+async def run_benchmark(args) -> Dict:
+    random.seed(args.seed)
+    stats = Stats()
+    manager = ConnectionManager()
+    ws_module.manager = manager
+
+    users: Dict[int, SimpleNamespace] = {}
+
+    async def fake_auth(websocket, token):
+        return users[int(token)]
+
+    ws_module.get_current_user_websocket = fake_auth
+    ws_module.can_join_conversation = lambda user, conversation_id: True
+
+    clients: Dict[int, BenchClient] = {}
+    next_user_id = 1
+
+    def open_client() -> BenchClient:
+        nonlocal next_user_id
+        user_id = next_user_id
+        next_user_id += 1
+        client = BenchClient(user_id, str(user_id // args.room_size), stats)
+        users[user_id] = client.user
+        clients[user_id] = client
+        client.task = asyncio.create_task(ws_module.websocket_endpoint(client, str(user_id)))
+        client.send({"type": "subscribe", "conversation_id": int(client.room)})
+        return client
+
+    def close_client(user_id: int):
+        client = clients.pop(user_id)
+        client.send(None)
+
+    async def settle():
+        for _ in range(20):
+            await asyncio.sleep(0)
+
+    # Connection phase: memory per connection
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(args.clients):
+        open_client()
+        if len(clients) % 200 == 0:
+            await settle()
+    await settle()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    memory_per_connection = (after - before) / max(args.clients, 1)
+
+    # Load phase
+    tick = args.tick_ms / 1000
+    ticks = int(args.duration / tick)
+    n_clients = lambda: max(len(clients), 1)  # noqa: E731
+    events = 0
+    broadcasts = 0
+    cpu_start = time.process_time()
+    frames_out_start = stats.frames_out
+    wall_start = time.perf_counter()
+
+    for _ in range(ticks):
+        ids = list(clients)
+        for _ in range(poisson(args.ping_rate * n_clients() * tick)):
+            client = clients[random.choice(ids)]
+            client.pings.append(time.perf_counter())
+            client.send({"type": "ping"})
+            events += 1
+        for _ in range(poisson(args.typing_rate * n_clients() * tick)):
+            client = clients[random.choice(ids)]
+            stats.typing_sent[(client.user.id, client.room)] = time.perf_counter()
+            client.send({"type": "typing", "conversation_id": int(client.room)})
+            events += 1
+        for _ in range(poisson(args.churn_rate * tick) if clients else 0):
+            close_client(random.choice(list(clients)))
+            open_client()
+            events += 2
+        for _ in range(poisson(args.broadcast_rate * tick)):
+            stats.broadcast_started[broadcasts] = time.perf_counter()
+            await manager.broadcast({"type": "bench_broadcast", "seq": broadcasts})
+            broadcasts += 1
+            events += 1
+        await asyncio.sleep(tick)
+
+    await settle()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    frames_out = stats.frames_out - frames_out_start
+
+    for user_id in list(clients):
+        close_client(user_id)
+    await settle()
+
+    completion = [
+        stats.broadcast_completion[seq] - stats.broadcast_started[seq]
+        for seq in stats.broadcast_completion
+    ]
+
+    return {
+        "clients": args.clients,
+        "duration_s": round(wall, 2),
+        "inbound_events": events,
+        "frames_out": frames_out,
+        "broadcasts": broadcasts,
+        "broadcast_p50_ms": round(percentile(stats.broadcast_latency, 50), 3),
+        "broadcast_p99_ms": round(percentile(stats.broadcast_latency, 99), 3),
+        "broadcast_completion_p99_ms": round(percentile(completion, 99), 3),
+        "typing_p50_ms": round(percentile(stats.typing_latency, 50), 3),
+        "typing_p99_ms": round(percentile(stats.typing_latency, 99), 3),
+        "ping_p50_ms": round(percentile(stats.ping_rtt, 50), 3),
+        "ping_p99_ms": round(percentile(stats.ping_rtt, 99), 3),
+        "memory_per_connection_kb": round(memory_per_connection / 1024, 2),
+        "cpu_us_per_event": round(cpu / max(events, 1) * 1e6, 2),
+        "cpu_us_per_frame_out": round(cpu / max(frames_out, 1) * 1e6, 2),
+        "cpu_utilization": round(cpu / wall, 3) if wall else 0.0,
+    }
+
+
+def config_of(args) -> Dict:
+    return {
+        key: getattr(args, key)
+        for key in ("clients", "duration", "ping_rate", "typing_rate", "churn_rate",
+                    "broadcast_rate", "room_size", "tick_ms")
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def load_previous(history: Path, config: Dict) -> Dict:
+    if not history.exists():
+        return {}
+    previous = {}
+    with open(history, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("config") == config:
+                previous = entry
+    return previous
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="WebSocket scale benchmark")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0, help="load phase length in seconds")
+    parser.add_argument("--ping-rate", type=float, default=0.05, help="pings per client per second")
+    parser.add_argument("--typing-rate", type=float, default=0.2, help="typing events per client per second")
+    parser.add_argument("--churn-rate", type=float, default=5.0, help="reconnects per second")
+    parser.add_argument("--broadcast-rate", type=float, default=2.0, help="server broadcasts per second")
+    parser.add_argument("--room-size", type=int, default=5, help="clients per conversation room")
+    parser.add_argument("--tick-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--no-record", action="store_true", help="do not append to the history file")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="fail when a tracked metric is this fraction worse than the previous run")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    config = config_of(args)
+
+    print("===================================")
+    print("WebSocket 벤치마크 결과")
+    print("===================================")
+    for key, value in result.items():
+        print(f"{key:>30}: {value}")
+
+    previous = load_previous(args.history, config)
+    regressions = []
+    if previous:
+        print(f"\n이전 실행 ({previous['revision']}, {previous['timestamp']}) 대비:")
+        for metric in TRACKED_METRICS:
+            old, new = previous["result"].get(metric), result[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            marker = "  <-- regression" if change > args.max_regression else ""
+            print(f"{metric:>30}: {old} -> {new} ({change:+.1%}){marker}")
+            if marker:
+                regressions.append(metric)
+
+    if not args.no_record:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "timestamp": datetime.utcnow().isoformat(),
+                "revision": git_revision(),
+                "python": sys.version.split()[0],
+                "config": config,
+                "result": result,
+            }) + "\n")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
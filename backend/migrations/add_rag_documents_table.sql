@@ -0,0 +1,24 @@
+-- Create rag_documents table
+CREATE TABLE IF NOT EXISTS rag_documents (
+    id VARCHAR(36) PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    category VARCHAR(50),
+    source VARCHAR(50),
+    filename VARCHAR(255),
+    content_hash VARCHAR(64),
+    chunk_count INT NOT NULL DEFAULT 0,
+    embedding_status ENUM('pending', 'processing', 'completed', 'failed') DEFAULT 'pending' NOT NULL,
+    point_ids JSON,
+    metadata JSON,
+    error_message TEXT,
+    uploaded_by INT,
+    institution_id VARCHAR(100),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at DATETIME,
+    FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE SET NULL,
+    INDEX idx_rag_documents_category (category),
+    INDEX idx_rag_documents_content_hash (content_hash),
+    INDEX idx_rag_documents_uploaded_by (uploaded_by),
+    INDEX idx_rag_documents_institution_created (institution_id, created_at),
+    INDEX idx_rag_documents_category_created (category, created_at)
+);
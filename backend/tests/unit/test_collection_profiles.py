@@ -0,0 +1,147 @@
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+from app.core.config import settings
+from app.services import collection_migration
+from app.services import vector_service as vector_service_module
+from app.services.collection_migration import rebuild_collection
+from app.services.collection_profiles import PROFILES, get_profile, resolve_collection
+from app.services.embedding_providers import HashingEmbeddingProvider
+from app.services.sparse_encoder import SPARSE_VECTOR_NAME
+from app.services.vector_service import VectorService
+
+
+def test_search_params_follow_profile():
+    assert PROFILES["default"].search_params() is None
+
+    params = PROFILES["binary"].search_params()
+    assert params.quantization.rescore is True
+    assert params.quantization.oversampling == 3.0
+
+    with pytest.raises(ValueError):
+        get_profile("missing")
+
+
+def test_quantized_profiles_use_less_ram():
+    ram = {name: profile.estimated_ram_bytes(100_000, 1536) for name, profile in PROFILES.items()}
+    assert ram["binary"] < ram["scalar"] < ram["default"]
+
+
+def test_rebuild_moves_legacy_collection_behind_alias():
+    client = QdrantClient(location=":memory:")
+    client.create_collection("knowledge", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    client.upsert("knowledge", points=[
+        PointStruct(id=i, vector=[1.0, float(i), 0.0, 0.5], payload={"page_content": f"프롬프트 {i}", "metadata": {}})
+        for i in range(5)
+    ])
+
+    result = rebuild_collection(client, "knowledge", PROFILES["scalar"], size=4, batch_size=2)
+    assert result["points"] == 5
+    assert resolve_collection(client, "knowledge") == result["target"]
+
+    copied = client.retrieve(result["target"], ids=[3], with_vectors=True)[0]
+    assert SPARSE_VECTOR_NAME in copied.vector
+
+    second = rebuild_collection(client, "knowledge", PROFILES["default"], size=4)
+    assert resolve_collection(client, "knowledge") == second["target"]
+    assert not client.collection_exists(result["target"])
+
+
+def test_rebuild_reembeds_at_new_size():
+    client = QdrantClient(location=":memory:")
+    client.create_collection("knowledge", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    client.upsert("knowledge", points=[
+        PointStruct(id=i, vector=[1.0, float(i), 0.0, 0.5], payload={"page_content": f"chunk {i}", "metadata": {}})
+        for i in range(3)
+    ])
+
+    with pytest.raises(ValueError):
+        rebuild_collection(client, "knowledge", PROFILES["default"], size=2)
+
+    embedded = []
+
+    def embed(texts):
+        embedded.extend(texts)
+        return [[1.0, float(len(text))] for text in texts]
+
+    result = rebuild_collection(client, "knowledge", PROFILES["default"], size=2, embed=embed)
+    assert result["points"] == 3
+    assert sorted(embedded) == ["chunk 0", "chunk 1", "chunk 2"]
+    assert len(client.retrieve("knowledge", ids=[1], with_vectors=True)[0].vector[""]) == 2
+
+
+def test_swap_replays_writes_made_just_before_the_fence(monkeypatch):
+    client = QdrantClient(location=":memory:")
+    client.create_collection("knowledge", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    client.upsert("knowledge", points=[
+        PointStruct(id=i, vector=[1.0, float(i), 0.0, 0.5], payload={"page_content": f"chunk {i}", "metadata": {}})
+        for i in range(3)
+    ])
+    monkeypatch.setattr(collection_migration.time, "sleep", lambda seconds: None)
+
+    class FenceRedis:
+        keys = {}
+
+        def set(self, key, value, ex=None):
+            self.keys[key] = value
+            # Writes that reached the old collection after the last catch-up pass
+            client.upsert("knowledge", points=[PointStruct(id=7, vector=[0.5, 0.5, 0.5, 0.5], payload={})])
+            client.delete("knowledge", points_selector=[0])
+
+        def delete(self, key):
+            del self.keys[key]
+
+    redis_client = FenceRedis()
+    result = rebuild_collection(client, "knowledge", PROFILES["default"], size=4, redis_client=redis_client)
+
+    assert sorted(point.id for point in client.scroll("knowledge", limit=10)[0]) == [1, 2, 7]
+    assert result["points"] == 3
+    assert redis_client.keys == {}
+
+
+def test_vector_service_follows_collection_size_across_migration(monkeypatch):
+    client = QdrantClient(location=":memory:")
+    for name in ("ai_tutor_knowledge", "ai_tutor_knowledge_tenant_a"):
+        client.create_collection(name, vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "hash")
+    monkeypatch.setattr(settings, "EMBEDDING_DIMENSIONS", 8)
+    monkeypatch.setattr(settings, "RAG_TENANT_COLLECTIONS", True)
+    monkeypatch.setattr(vector_service_module, "QdrantClient", lambda **kwargs: client)
+    monkeypatch.setattr(vector_service_module, "AsyncQdrantClient", lambda **kwargs: None)
+
+    # A size mismatch no longer disables the service: it embeds at the stored size
+    service = VectorService()
+    assert service.pipeline is not None
+    assert service.embeddings.dimensions == 4
+    assert service._open_tenant("a", create=False).embeddings.model == "hash:4"
+    assert not service._sync_dimensions()
+
+    monkeypatch.setattr(collection_migration.time, "sleep", lambda seconds: None)
+    embed = HashingEmbeddingProvider(dimensions=8).embed_documents
+    rebuild_collection(client, "ai_tutor_knowledge", PROFILES["default"], size=8, embed=embed)
+
+    assert service._sync_dimensions()
+    assert service.embeddings.dimensions == 8
+    assert service.pipeline.embeddings.model == "hash:8"
+    assert service.tenants["ai_tutor_knowledge_tenant_a"].embeddings.model == "hash:4"
+    assert not service._sync_dimensions()
+
+
+async def test_search_is_retried_after_the_alias_moves():
+    service = VectorService.__new__(VectorService)
+    calls = []
+
+    async def search(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise ValueError("Vector dimension error: expected dim: 8, got 4")
+        return ["hit"]
+
+    async def dimensions_changed():
+        return True
+
+    service._search = search
+    service._dimensions_changed = dimensions_changed
+    assert await service.similarity_search("프롬프트", k=3) == ["hit"]
+    assert len(calls) == 2
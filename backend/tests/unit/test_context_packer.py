@@ -0,0 +1,53 @@
+from langchain_core.documents import Document
+
+from app.services.context_packer import (
+    estimate_tokens,
+    overlap_length,
+    pack_context,
+    remove_overlaps,
+    trim_to_query
+)
+from app.services.sparse_encoder import tokenize
+
+
+def chunk(text, document_id="d1", score=0.8):
+    return Document(page_content=text, metadata={"document_id": document_id, "_score": score})
+
+
+def test_estimate_tokens_counts_hangul_per_syllable():
+    assert estimate_tokens("프롬프트") == 4
+    assert estimate_tokens("a" * 40) == 10
+
+
+def test_splitter_overlap_is_removed_from_lower_ranked_chunk():
+    shared = "Few-shot examples show the model the expected output format."
+    first = chunk("Prompts are instructions for the model. " + shared)
+    second = chunk(shared + " Chain of thought asks for reasoning steps.", score=0.7)
+    assert overlap_length(first.page_content, second.page_content) == len(shared)
+
+    kept = remove_overlaps([first, second, chunk(shared, score=0.6)])
+    assert [doc.page_content for doc in kept] == [
+        first.page_content, "Chain of thought asks for reasoning steps."
+    ]
+    # Identical text from another document is not a splitter overlap
+    assert len(remove_overlaps([first, chunk(shared, document_id="d2")])) == 2
+
+
+def test_trim_keeps_matching_sentences_and_neighbours():
+    text = "Intro line. Weather is nice. 프롬프트는 지시문입니다. Examples help. Unrelated ending. Another one."
+    trimmed = trim_to_query(text, set(tokenize("프롬프트란?")))
+    assert trimmed == "Weather is nice. 프롬프트는 지시문입니다. Examples help."
+    # Semantic-only matches stay whole
+    assert trim_to_query(text, {"zzz"}) == text
+
+
+def test_pack_respects_budget_and_top_k():
+    docs = [chunk(f"Sentence about prompts number {i}. " * 10, document_id=f"d{i}") for i in range(5)]
+    packed = pack_context(docs, "prompts", token_budget=200, max_documents=3)
+    assert 0 < len(packed) <= 3
+    assert sum(doc.metadata["_tokens"] for doc in packed) <= 200
+    assert [doc.metadata["document_id"] for doc in packed] == [f"d{i}" for i in range(len(packed))]
+
+    # The best chunk is truncated rather than leaving the context empty
+    single = pack_context(docs[:1], "prompts", token_budget=20)
+    assert len(single) == 1 and single[0].metadata["_tokens"] <= 20
@@ -0,0 +1,88 @@
+import tracemalloc
+
+import docx
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.document_parser import iter_chunks, iter_segments
+
+
+def test_markdown_segments_carry_heading_path(tmp_path):
+    path = tmp_path / "guide.md"
+    path.write_text("# 소개\n본문 하나\n\n## 설치\n본문 둘\n# 활용\n본문 셋\n", encoding="utf-8")
+
+    segments = list(iter_segments(str(path)))
+
+    assert [(s.heading, s.text) for s in segments] == [
+        ("소개", "본문 하나"),
+        ("소개 > 설치", "본문 둘"),
+        ("활용", "본문 셋"),
+    ]
+
+
+def test_legacy_korean_text_is_decoded(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes("프롬프트 엔지니어링".encode("cp949"))
+
+    assert [s.text for s in iter_segments(str(path))] == ["프롬프트 엔지니어링"]
+
+
+def test_docx_headings_and_chunk_numbering(tmp_path):
+    document = docx.Document()
+    document.add_heading("Chapter 1", level=1)
+    document.add_paragraph("alpha " * 60)
+    document.add_heading("Chapter 2", level=1)
+    document.add_paragraph("beta " * 60)
+    path = tmp_path / "manual.docx"
+    document.save(path)
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0)
+    chunks = list(iter_chunks(iter_segments(str(path)), splitter, {"document_id": "d"}))
+
+    assert [c.metadata["chunk_index"] for c in chunks] == list(range(len(chunks)))
+    assert {c.metadata["heading"] for c in chunks} == {"Chapter 1", "Chapter 2"}
+    assert all(c.metadata["document_id"] == "d" for c in chunks)
+    assert all("beta" not in c.page_content for c in chunks if c.metadata["heading"] == "Chapter 1")
+
+
+def test_docx_tables_are_read_in_body_order(tmp_path):
+    document = docx.Document()
+    document.add_heading("요금", level=1)
+    document.add_paragraph("아래 표를 참고하세요.")
+    table = document.add_table(rows=2, cols=3)
+    for row, values in zip(table.rows, [("플랜", "토큰", "가격"), ("Pro", "1M", "$20")]):
+        for cell, value in zip(row.cells, values):
+            cell.text = value
+    merged = document.add_table(rows=1, cols=2)
+    merged.cell(0, 0).merge(merged.cell(0, 1)).text = "합계"
+    document.add_heading("문의", level=1)
+    document.add_paragraph("support@example.com")
+    path = tmp_path / "pricing.docx"
+    document.save(path)
+
+    assert [(s.heading, s.text) for s in iter_segments(str(path))] == [
+        ("요금", "아래 표를 참고하세요."),
+        ("요금", "플랜 | 토큰 | 가격"),
+        ("요금", "Pro | 1M | $20"),
+        ("요금", "합계"),
+        ("문의", "support@example.com"),
+    ]
+
+
+def test_large_text_file_is_parsed_in_bounded_memory(tmp_path):
+    path = tmp_path / "manual.txt"
+    paragraph = "프롬프트 엔지니어링은 모델에게 명확한 지시를 주는 기술입니다. " * 8 + "\n\n"
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(60000):
+            f.write(paragraph)
+    assert path.stat().st_size > 40 * 1024 * 1024
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    tracemalloc.start()
+    try:
+        chunks = sum(1 for _ in iter_chunks(iter_segments(str(path)), splitter, {"document_id": "d"}))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert chunks > 20000
+    assert peak < 5 * 1024 * 1024
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from app.services.embedding_cache import CachedEmbeddings, DiskEmbeddingCache
+from app.services import embedding_pipeline
+from app.services.embedding_pipeline import EmbeddingPipeline
+from app.services.vector_common import document_id_for, point_id_for
+
+
+class FakeEmbeddings:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+
+    async def aembed_documents(self, texts):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("rate limited")
+        await asyncio.sleep(0)
+        self.batches.append(len(texts))
+        return [[float(len(text)), 0.0] for text in texts]
+
+
+class FakeQdrant:
+    def __init__(self):
+        self.calls = []
+
+    async def upsert(self, collection_name, points, wait):
+        await asyncio.sleep(0)
+        self.calls.append((points, wait))
+
+
+@pytest.mark.asyncio
+async def test_pipeline_batches_and_waits_on_last_upsert():
+    """Every chunk is written once and only the final upsert waits."""
+    embeddings, client = FakeEmbeddings(), FakeQdrant()
+    documents = [Document(page_content=f"chunk {i}", metadata={"i": i}) for i in range(250)]
+    ids = [str(i) for i in range(250)]
+
+    pipeline = EmbeddingPipeline(embeddings, client, "test", embed_batch_size=64, upsert_batch_size=32)
+    stats = await pipeline.run(documents, ids)
+
+    assert stats["chunks"] == 250
+    assert embeddings.batches == [64, 64, 64, 58]
+    written = [point.id for points, _ in client.calls for point in points]
+    assert sorted(written, key=int) == ids
+    assert [wait for _, wait in client.calls].count(True) == 1
+    assert client.calls[-1][1] is True
+    assert client.calls[0][0][0].payload == {"page_content": "chunk 0", "metadata": {"i": 0}}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_retries_transient_failures(monkeypatch):
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    embeddings, client = FakeEmbeddings(failures=2), FakeQdrant()
+    documents = [Document(page_content="a"), Document(page_content="b")]
+
+    stats = await EmbeddingPipeline(embeddings, client, "test").run(documents, ["1", "2"])
+
+    assert stats["chunks"] == 2
+    assert len(client.calls) == 1
+
+
+_real_sleep = asyncio.sleep
+
+
+async def _no_sleep(delay, *args, **kwargs):
+    await _real_sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_cached_embeddings_only_embed_changed_chunks(tmp_path):
+    """Re-ingesting an edited document embeds only the new chunk text."""
+    cache = DiskEmbeddingCache(path=str(tmp_path / "cache.sqlite3"), max_entries=100)
+    embeddings = FakeEmbeddings()
+    cached = CachedEmbeddings(embeddings, cache, model="test-model")
+
+    first = await cached.aembed_documents(["alpha", "beta", "gamma"])
+    second = await cached.aembed_documents(["alpha ", "beta", "gamma!"])
+
+    assert embeddings.batches == [3, 1]
+    assert second[:2] == first[:2]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskEmbeddingCache(path=str(tmp_path / "cache.sqlite3"), max_entries=2)
+    await cache.set_many({"a": [1.0]})
+    await cache.set_many({"b": [2.0]})
+    await cache.get_many(["a"])
+    await cache.set_many({"c": [3.0]})
+
+    assert await cache.size() == 2
+    assert set(await cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.evictions == 1
+
+
+def test_point_ids_are_content_addressed():
+    first = point_id_for("doc-1", 0, "Hello  world")
+    assert first == point_id_for("doc-1", 0, "Hello world")
+    assert first != point_id_for("doc-1", 1, "Hello world")
+    assert first != point_id_for("doc-2", 0, "Hello world")
+    assert document_id_for("same text") == document_id_for("same text")
+
+
+@pytest.mark.asyncio
+async def test_upserts_wait_for_write_fence(monkeypatch):
+    """A migration holding the fence delays upserts until it lets go."""
+    class FenceRedis:
+        checks = 0
+
+        async def exists(self, key):
+            assert key == "rag:write_fence:knowledge"
+            self.checks += 1
+            return self.checks <= 2
+
+    redis = FenceRedis()
+    monkeypatch.setattr(embedding_pipeline, "get_redis", lambda: redis)
+    client = FakeQdrant()
+    pipeline = EmbeddingPipeline(FakeEmbeddings(), client, "knowledge")
+
+    await pipeline.run([Document(page_content="chunk", metadata={})], ["1"])
+
+    assert redis.checks == 3
+    assert len(client.calls) == 1
@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from app.services.embedding_providers import HashingEmbeddingProvider, create_embedding_provider
+
+
+def cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def test_hashing_provider_is_deterministic_and_normalized():
+    provider = HashingEmbeddingProvider(dimensions=256)
+    vector = provider.embed_query("프롬프트 엔지니어링 기초")
+
+    assert len(vector) == 256
+    assert math.isclose(math.sqrt(sum(v * v for v in vector)), 1.0, rel_tol=1e-5)
+    assert HashingEmbeddingProvider(dimensions=256).embed_query("프롬프트 엔지니어링 기초") == vector
+
+
+def test_hashing_provider_similarity_is_lexical():
+    provider = HashingEmbeddingProvider(dimensions=512)
+    query, near, far = provider.embed_documents(["ChatGPT 프롬프트 작성법", "프롬프트 작성법 가이드", "엑셀 피벗 테이블"])
+    assert cosine(query, near) > cosine(query, far)
+
+
+async def test_async_batches_respect_provider_limits():
+    provider = HashingEmbeddingProvider(dimensions=32, max_batch_size=3, max_concurrency=2)
+    batches = []
+    original = provider._embed_batch
+
+    def record(texts):
+        batches.append(len(texts))
+        return original(texts)
+
+    provider._embed_batch = record
+    vectors = await provider.aembed_documents([f"chunk {i}" for i in range(7)])
+
+    assert len(vectors) == 7
+    assert sorted(batches) == [1, 3, 3]
+    assert vectors[4] == provider.embed_query("chunk 4")
+
+
+def test_unknown_provider_is_rejected():
+    assert create_embedding_provider("hash", 64).model_key == "hash:64"
+    with pytest.raises(ValueError):
+        create_embedding_provider("missing")
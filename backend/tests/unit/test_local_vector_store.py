@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from app.services.local_vector_store import LocalVectorIndex, filter_conditions
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def payload(text, **metadata):
+    return {"page_content": text, "metadata": metadata}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimensions=3)
+    index.upsert(
+        ["a", "b", "c"],
+        [unit([1, 0, 0]), unit([1, 1, 0]), unit([0, 0, 1])],
+        [
+            payload("alpha", category="guide", institution_id="inst-1"),
+            payload("beta", category="faq"),
+            payload("gamma", category="guide"),
+        ]
+    )
+    return index
+
+
+def test_search_is_exact_and_filtered(index):
+    assert [hit[0] for hit in index.search(unit([1, 0.1, 0]), k=2)] == ["a", "b"]
+    assert [hit[0] for hit in index.search(unit([1, 0, 0]), k=5, conditions=[("category", ["guide"])])] == ["a", "c"]
+    assert [hit[0] for hit in index.search(unit([1, 0, 0]), k=5, conditions=[("institution_id", [None])])] == ["b", "c"]
+    # cos(a) = 1, cos(b) = 0.71, cos(c) = 0
+    assert [hit[0] for hit in index.search(unit([1, 0, 0]), k=5, score_threshold=0.5)] == ["a", "b"]
+
+
+def test_upsert_replaces_and_delete_hides(index):
+    index.upsert(["a"], [unit([0, 0, 1])], [payload("alpha v2", category="faq")])
+    assert index.search(unit([0, 0, 1]), k=1)[0][0] in ("a", "c")
+    assert index.ids_where([("category", ["faq"])]) == ["b", "a"]
+
+    assert index.delete(["b", "missing"]) == 1
+    assert len(index) == 2
+    assert "b" not in [hit[0] for hit in index.search(unit([1, 1, 0]), k=3)]
+
+
+def test_other_instances_see_writes_and_compaction(index, tmp_path):
+    reader = LocalVectorIndex(str(tmp_path), dimensions=3)
+    assert len(reader) == 3
+
+    index.upsert(["d"], [unit([0, 1, 0])], [payload("delta")])
+    index.delete(["a"])
+    assert reader.search(unit([0, 1, 0]), k=1)[0][0] == "d"
+
+    index.compact()
+    assert index.rows == 3
+    assert sorted(hit[0] for hit in reader.search(unit([1, 1, 1]), k=10)) == ["b", "c", "d"]
+
+    with pytest.raises(ValueError):
+        LocalVectorIndex(str(tmp_path), dimensions=4)
+
+
+def test_int8_matches_float_ranking(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [str(i) for i in range(200)]
+    payloads = [payload(str(i)) for i in range(200)]
+
+    exact = LocalVectorIndex(str(tmp_path / "f32"), dimensions=16)
+    quantized = LocalVectorIndex(str(tmp_path / "i8"), dimensions=16, dtype="int8")
+    exact.upsert(ids, vectors.tolist(), payloads)
+    quantized.upsert(ids, vectors.tolist(), payloads)
+
+    query = vectors[7].tolist()
+    assert quantized.search(query, k=1)[0][0] == "7"
+    overlap = {hit[0] for hit in exact.search(query, k=10)} & {hit[0] for hit in quantized.search(query, k=10)}
+    assert len(overlap) >= 8
+
+
+def test_filter_conditions_validate_names():
+    assert filter_conditions({"uploader": 3, "document_id": ["x", "y"], "language": None}) == [
+        ("uploaded_by", [3]),
+        ("document_id", ["x", "y"]),
+    ]
+    with pytest.raises(ValueError):
+        filter_conditions({"title": "x"})
+
+
+def test_deduplicate_only_collapses_reingested_chunks(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimensions=3)
+    boilerplate = "All rights reserved."
+    index.upsert(
+        ["a1", "a2", "b1", "c1"],
+        [unit([1, 0, 0])] * 4,
+        [
+            payload(boilerplate, document_id="doc-a", institution_id="inst-1"),
+            payload(boilerplate, document_id="doc-a", institution_id="inst-1"),
+            payload(boilerplate, document_id="doc-b", institution_id="inst-1"),
+            payload(boilerplate, document_id="doc-a", institution_id="inst-2"),
+        ]
+    )
+
+    scanned, removed = index.deduplicate()
+    assert scanned == 4
+    assert removed == [("a2", "doc-a")]
+    assert sorted(index.row_of) == ["a1", "b1", "c1"]
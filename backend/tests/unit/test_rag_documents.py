@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.rag_document import EmbeddingStatus, RagDocument
+from app.models.user import User
+from app.services import rag_document_service
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    RagDocument.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_registry_lists_newest_first_with_filters(db):
+    for i, (category, institution) in enumerate([("guide", "a"), ("faq", "a"), ("guide", "b")]):
+        document = rag_document_service.register_document(
+            db, document_id=f"doc-{i}", title=f"Doc {i}", content_hash=str(i),
+            institution_id=institution, category=category
+        )
+        document.created_at = datetime(2024, 1, 1) + timedelta(days=i)
+        rag_document_service.mark_completed(db, document, [f"p{i}-0", f"p{i}-1"])
+
+    documents, total = rag_document_service.list_documents(db, category="guide")
+    assert total == 2
+    assert [d.id for d in documents] == ["doc-2", "doc-0"]
+
+    documents, total = rag_document_service.list_documents(db, institution_id="a", limit=1)
+    assert total == 2
+    assert [d.id for d in documents] == ["doc-1"]
+    assert documents[0].chunk_count == 2
+    assert documents[0].embedding_status == EmbeddingStatus.completed
+
+
+def test_reupload_resets_existing_row(db):
+    document = rag_document_service.register_document(db, document_id="doc", title="Old", content_hash="h")
+    rag_document_service.mark_failed(db, document, "boom")
+
+    document = rag_document_service.register_document(db, document_id="doc", title="New", content_hash="h")
+
+    assert db.query(RagDocument).count() == 1
+    assert document.title == "New"
+    assert document.embedding_status == EmbeddingStatus.processing
+    assert document.error_message is None
+
+
+def test_remove_points_updates_chunk_counts(db):
+    document = rag_document_service.register_document(db, document_id="doc", title="Doc", content_hash="h")
+    rag_document_service.mark_completed(db, document, ["p0", "p1", "p2"])
+
+    assert rag_document_service.remove_points(db, {"doc": ["p1"], "missing": ["x"]}) == 1
+    db.refresh(document)
+    assert document.point_ids == ["p0", "p2"]
+    assert document.chunk_count == 2
+
+
+def test_exact_institution_scope_hides_other_tenants(db):
+    for document_id, institution in [("shared", None), ("mine", "a"), ("theirs", "b")]:
+        rag_document_service.register_document(
+            db, document_id=document_id, title=document_id, content_hash=document_id, institution_id=institution
+        )
+
+    documents, _ = rag_document_service.list_documents(db, institution_id="a", exact_institution=True)
+    assert [d.id for d in documents] == ["mine"]
+    documents, _ = rag_document_service.list_documents(db, institution_id=None, exact_institution=True)
+    assert [d.id for d in documents] == ["shared"]
+    _, total = rag_document_service.list_documents(db)
+    assert total == 3
+
+
+def test_listing_rows_keep_point_ids_server_side(db):
+    document = rag_document_service.register_document(db, document_id="doc", title="Doc", content_hash="h")
+    rag_document_service.mark_completed(db, document, ["p0", "p1"])
+
+    row = rag_document_service.to_dict(document)
+    assert "point_ids" not in row
+    assert row["chunk_count"] == 2
+
+
+async def test_same_file_ingested_by_two_tenants_stays_separate(db, tmp_path, monkeypatch):
+    from app.services import rag_service as rag_module
+
+    indexed = []
+
+    async def add_documents(documents, progress=None):
+        indexed.extend(documents)
+        return [f"{doc.metadata['document_id']}-{doc.metadata['chunk_index']}" for doc in documents]
+
+    monkeypatch.setattr(rag_module.vector_service, "add_documents", add_documents)
+    path = tmp_path / "manual.txt"
+    path.write_text("Prompt engineering basics.\n\nWrite clear instructions.", encoding="utf-8")
+
+    service = rag_module.RAGService()
+    first = await service.ingest_file(db, str(path), "Manual", uploaded_by=1, institution_id="inst-a", filename="manual.txt")
+    second = await service.ingest_file(db, str(path), "Manual", uploaded_by=2, institution_id="inst-b", filename="manual.txt")
+
+    assert first.id != second.id
+    rows = {row.id: row for row in db.query(RagDocument).all()}
+    assert rows[first.id].institution_id == "inst-a" and rows[first.id].uploaded_by == 1
+    assert rows[second.id].institution_id == "inst-b" and rows[second.id].uploaded_by == 2
+    assert {doc.metadata["document_id"] for doc in indexed} == {first.id, second.id}
@@ -0,0 +1,37 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.services import rag_service as rag_module
+
+
+@pytest.fixture
+def service(monkeypatch):
+    async def fake_search(query, k=5, filter_dict=None, institution_id=None, score_threshold=None):
+        return [Document(page_content="프롬프트는 AI에게 주는 지시문입니다.", metadata={"document_id": "d1", "_score": 0.9})]
+
+    monkeypatch.setattr(rag_module.vector_service, "similarity_search", fake_search)
+    service = rag_module.RAGService()
+    service.llm = GenericFakeChatModel(messages=iter([AIMessage(content="프롬프트는 지시문 입니다")]))
+    return service
+
+
+async def test_stream_sends_sources_then_tokens_then_done(service):
+    events = [event async for event in service.ask_stream("프롬프트란?")]
+    names = [name for name, _ in events]
+
+    assert names[0] == "sources"
+    assert events[0][1]["sources"][0]["document_id"] == "d1"
+    assert names[-1] == "done"
+    assert names.count("token") > 1
+
+    tokens = "".join(data["text"] for name, data in events if name == "token")
+    done = events[-1][1]
+    assert tokens == done["answer"] == "프롬프트는 지시문 입니다"
+    assert done["retrieval_ms"] <= done["time_to_first_token_ms"] <= done["total_ms"]
+
+
+def test_stream_rejects_unknown_filters_up_front(service):
+    with pytest.raises(ValueError):
+        service.ask_stream("질문", filters={"title": "x"})
@@ -0,0 +1,68 @@
+import time
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+from app.services.retrieval_cache import LRUCache, RetrievalCache, result_key
+from app.services.vector_service import VectorService
+
+
+def test_lru_cache_evicts_oldest_and_expires():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    expiring = LRUCache(max_entries=2, ttl=0.01)
+    expiring.set("a", 1)
+    time.sleep(0.02)
+    assert expiring.get("a") is None
+
+
+def test_result_key_changes_with_corpus_version():
+    vector = [0.1, 0.2, 0.3]
+    key = result_key(vector, 5, {"category": "guide"}, "inst", {"kb": 3})
+    assert key == result_key(vector, 5, {"category": "guide"}, "inst", {"kb": 3})
+    assert key != result_key(vector, 5, {"category": "guide"}, "inst", {"kb": 4})
+    assert key != result_key(vector, 5, {"category": "guide"}, None, {"kb": 3})
+    assert key != result_key(vector, 10, {"category": "guide"}, "inst", {"kb": 3})
+
+
+async def test_query_embeddings_are_reused():
+    class CountingEmbeddings:
+        calls = 0
+
+        async def aembed_query(self, text):
+            self.calls += 1
+            return [1.0, 0.0]
+
+    embeddings = CountingEmbeddings()
+    cache = RetrievalCache(model="test")
+    assert await cache.embed_query(embeddings, "프롬프트란?") == [1.0, 0.0]
+    assert await cache.embed_query(embeddings, "  프롬프트란? ") == [1.0, 0.0]
+    assert embeddings.calls == 1
+    assert cache.query_hits == 1
+
+
+async def test_cached_hits_are_hydrated_from_qdrant():
+    client = AsyncQdrantClient(location=":memory:")
+    for name in ("shared", "tenant"):
+        await client.create_collection(name, vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    await client.upsert("shared", points=[PointStruct(id=1, vector=[1.0, 0.0], payload={
+        "page_content": "공용 문서", "metadata": {"document_id": "s"}
+    })])
+    await client.upsert("tenant", points=[PointStruct(id=1, vector=[0.0, 1.0], payload={
+        "page_content": "기관 문서", "metadata": {"document_id": "t"}
+    })])
+    service = VectorService.__new__(VectorService)
+    service.async_client = client
+
+    documents = await service._hydrate([("tenant", 1, 0.9), ("shared", 1, 0.4)])
+    assert [(doc.page_content, doc.metadata["_score"]) for doc in documents] == [("기관 문서", 0.9), ("공용 문서", 0.4)]
+
+    # A point deleted since the search was cached forces a fresh search
+    await client.delete("tenant", points_selector=[1])
+    assert await service._hydrate([("tenant", 1, 0.9), ("shared", 1, 0.4)]) is None
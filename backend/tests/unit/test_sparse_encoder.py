@@ -0,0 +1,19 @@
+from app.services.sparse_encoder import encode, term_index, tokenize
+
+
+def test_tokenize_korean_bigrams_and_terms():
+    tokens = tokenize("Midjourney로 GPT-4o 프롬프트")
+
+    assert "midjourney" in tokens
+    assert "gpt-4o" in tokens
+    assert "로" in tokens
+    assert {"프롬", "롬프", "프트"} <= set(tokens)
+
+
+def test_encode_counts_terms_with_sorted_indices():
+    vector = encode("RAG rag 검색")
+
+    assert vector.indices == sorted(vector.indices)
+    weights = dict(zip(vector.indices, vector.values))
+    assert weights[term_index("rag")] == 2.0
+    assert weights[term_index("검색")] == 1.0
@@ -0,0 +1,166 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.v1 import auth
+from app.core import token_revocation
+from app.core.database import get_db
+from app.core.security import create_access_token, create_refresh_token, decode_token, get_password_hash
+from app.core.token_revocation import BloomFilter
+from app.models.user import User
+
+
+def test_bloom_filter_membership():
+    """Added keys are always reported; unknown keys are mostly rejected."""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"session-{i}")
+
+    assert all(f"session-{i}" in bloom for i in range(1000))
+
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_refresh_token_claims():
+    """Refresh tokens carry a unique jti and share the session id."""
+    first = decode_token(create_refresh_token({"sub": "a@example.com"}, session_id="s1"))
+    second = decode_token(create_refresh_token({"sub": "a@example.com"}, session_id="s1"))
+
+    assert first["type"] == "refresh"
+    assert first["sid"] == second["sid"] == "s1"
+    assert first["jti"] != second["jti"]
+
+
+def test_access_token_session_claim():
+    payload = decode_token(create_access_token({"sub": "a@example.com"}, session_id="s1"))
+    assert payload["type"] == "access"
+    assert payload["sid"] == "s1"
+
+
+class FakeRedis:
+    """The handful of Redis commands the revocation store uses, in memory"""
+
+    def __init__(self):
+        self.values = {}
+        self.zsets = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value)
+        return True
+
+    async def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    async def zremrangebyscore(self, key, low, high):
+        high = float(high)
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    async def zrangebyscore(self, key, low, high):
+        low = float(low)
+        return [m for m, score in self.zsets.get(key, {}).items() if score >= low]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append(getattr(self.redis, name)(*args, **kwargs))
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    User.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(email="a@example.com", password_hash=get_password_hash("secret123"), name="A"))
+    session.commit()
+
+    redis = FakeRedis()
+    monkeypatch.setattr(token_revocation, "get_redis", lambda: redis)
+    monkeypatch.setattr(token_revocation.revocation_store, "_filter", BloomFilter(1000, 0.01))
+    monkeypatch.setattr(token_revocation.revocation_store, "_version", None)
+
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/auth")
+    app.dependency_overrides[get_db] = lambda: session
+    yield TestClient(app)
+    session.close()
+
+
+def login(client):
+    response = client.post("/auth/login", data={"username": "a@example.com", "password": "secret123"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_refresh_rotates_and_each_token_is_single_use(client):
+    tokens = login(client)
+    rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200
+    assert rotated.json()["refresh_token"] != tokens["refresh_token"]
+    assert decode_token(rotated.json()["refresh_token"])["sid"] == decode_token(tokens["refresh_token"])["sid"]
+
+    # The rotated token still works once
+    again = client.post("/auth/refresh", json={"refresh_token": rotated.json()["refresh_token"]})
+    assert again.status_code == 200
+
+
+def test_replayed_refresh_token_revokes_the_session(client):
+    tokens = login(client)
+    rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    replay = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert replay.status_code == 401
+
+    # Every token of the compromised session is now dead, including the fresh pair
+    assert client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert me.status_code == 401
+
+
+def test_logout_revokes_access_tokens(client):
+    tokens = login(client)
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    assert client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+    # Other processes learn about the revocation from Redis, not the local filter
+    token_revocation.revocation_store._filter = BloomFilter(1000, 0.01)
+    token_revocation.revocation_store._last_sync = time.time() - 3600
+    assert client.get("/auth/me", headers=headers).status_code == 401
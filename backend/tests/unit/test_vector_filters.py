@@ -0,0 +1,68 @@
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointStruct, ScoredPoint, VectorParams
+
+from app.services.document_parser import detect_language
+from app.services.vector_common import build_filter
+from app.services.vector_service import (
+    combine_filters,
+    merge_results,
+    tenant_collection_name,
+    tenant_isolation_filter
+)
+
+
+def test_build_filter_maps_names_and_lists():
+    query_filter = build_filter({"category": "guide", "uploader": 7, "document_id": ["a", "b"], "language": None})
+
+    conditions = {condition.key: condition.match for condition in query_filter.must}
+    assert conditions["metadata.category"].value == "guide"
+    assert conditions["metadata.uploaded_by"].value == 7
+    assert conditions["metadata.document_id"].any == ["a", "b"]
+    assert "metadata.language" not in conditions
+
+
+def test_build_filter_rejects_unindexed_fields():
+    assert build_filter({}) is None
+    with pytest.raises(ValueError):
+        build_filter({"title": "x"})
+
+
+def test_detect_language():
+    assert detect_language("프롬프트 엔지니어링 가이드") == "ko"
+    assert detect_language("Prompt engineering with GPT-4o") == "en"
+    assert detect_language("") == "unknown"
+    assert detect_language("1,234 / 5.6%") == "unknown"
+
+
+def test_tenant_isolation_hides_other_institutions():
+    client = QdrantClient(location=":memory:")
+    client.create_collection("shared", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    client.upsert("shared", points=[
+        PointStruct(id=1, vector=[1.0, 0.0], payload={"metadata": {"institution_id": None}}),
+        PointStruct(id=2, vector=[1.0, 0.0], payload={"metadata": {}}),
+        PointStruct(id=3, vector=[1.0, 0.0], payload={"metadata": {"institution_id": "a"}}),
+        PointStruct(id=4, vector=[1.0, 0.0], payload={"metadata": {"institution_id": "b"}}),
+    ])
+
+    def visible(institution_id):
+        query_filter = combine_filters(build_filter({"language": None}), tenant_isolation_filter(institution_id))
+        points = client.query_points("shared", query=[1.0, 0.0], query_filter=query_filter, limit=10).points
+        return sorted(point.id for point in points)
+
+    assert visible(None) == [1, 2]
+    assert visible("a") == [1, 2, 3]
+
+
+def test_tenant_collection_names_are_safe_and_distinct():
+    assert tenant_collection_name("kb", "inst-1") == "kb_tenant_inst-1"
+    assert tenant_collection_name("kb", "Seoul Univ").startswith("kb_tenant_seoul_univ_")
+    assert tenant_collection_name("kb", "Seoul Univ") != tenant_collection_name("kb", "seoul univ")
+
+
+def test_merge_results_orders_by_score_and_dedupes():
+    def hit(point_id, score):
+        return ScoredPoint(id=point_id, version=0, score=score)
+
+    merged = merge_results([[hit(1, 0.9), hit(2, 0.5)], [hit(3, 0.7), hit(1, 0.95)]], k=2)
+    assert [(point.id, point.score) for point in merged] == [(1, 0.95), (3, 0.7)]
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+
+from fastapi import WebSocketDisconnect
+
+from app.api.v1.websocket import ConnectionManager, UserSnapshot, get_current_user_websocket
+from app.core.config import settings
+from app.core.security import create_access_token, create_refresh_token
+from app.core.token_revocation import revocation_store
+from app.services.ws_backplane import Backplane
+from app.services.ws_protocol import EVENT_CODES, MSGPACK_SUBPROTOCOL, MalformedFrame, MsgPackCodec
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket."""
+
+    def __init__(self, stalled: bool = False, subprotocols=()):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.subprotocol = None
+        self.sent = []
+        self.binary_frames = []
+        self.closed_with = None
+        self.stalled = stalled
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, data):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.binary_frames.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+@pytest.fixture
+async def manager():
+    manager = ConnectionManager()
+    yield manager
+    for websocket in list(manager.user_sockets):
+        manager.disconnect(websocket)
+    await settle()
+
+
+async def settle():
+    """Let writer and background tasks run."""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def make_user(user_id: int):
+    return SimpleNamespace(
+        id=user_id, name=f"User {user_id}", email=f"u{user_id}@example.com", role="user", institution_id=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_room_messages_reach_only_subscribers(manager):
+    alice, bob, carol = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(alice, make_user(1))
+    await manager.connect(bob, make_user(2))
+    await manager.connect(carol, make_user(3))
+    await manager.subscribe(alice, "10")
+    await manager.subscribe(bob, "10")
+
+    await manager.send_to_room({"type": "user_typing"}, "10", exclude_user_id=1)
+    await settle()
+
+    def received(ws):
+        return [m["type"] for m in ws.sent if m["type"] not in ("connection", "user_joined")]
+
+    assert received(bob) == ["user_typing"]
+    assert received(alice) == []
+    assert received(carol) == []
+
+    manager.disconnect(bob)
+    assert manager.rooms["10"] == {alice}
+
+
+def test_typing_events_are_throttled():
+    manager = ConnectionManager()
+
+    assert manager.should_forward_typing(1, "10", typing=True)
+    assert not manager.should_forward_typing(1, "10", typing=True)
+    assert manager.should_forward_typing(2, "10", typing=True)
+    assert manager.should_forward_typing(1, "10", typing=False)
+    assert not manager.should_forward_typing(1, "10", typing=False)
+
+
+@pytest.mark.asyncio
+async def test_presence_sends_deltas_not_full_list(manager):
+    alice, bob, bob_second_tab = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(alice, make_user(1))
+    await manager.connect(bob, make_user(2))
+    await manager.connect(bob_second_tab, make_user(2))
+    await settle()
+
+    joined = [m for m in alice.sent if m["type"] == "user_joined"]
+    assert len(joined) == 1
+    assert joined[0]["user"]["id"] == 2
+    assert "online_users" not in joined[0]
+
+    users, total = await manager.get_online_users(limit=1)
+    assert total == 2
+    assert len(users) == 1
+
+    manager.disconnect(bob)
+    await settle()
+    assert not any(m["type"] == "user_left" for m in alice.sent)
+
+    manager.disconnect(bob_second_tab)
+    await settle()
+    assert [m["user"]["id"] for m in alice.sent if m["type"] == "user_left"] == [2]
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_does_not_block_broadcast(manager):
+    stalled, healthy = FakeWebSocket(stalled=True), FakeWebSocket()
+    await manager.connect(stalled, make_user(1))
+    await manager.connect(healthy, make_user(2))
+    await settle()
+
+    queue_size = manager.outboxes[stalled].queue.maxsize
+    for i in range(queue_size + 5):
+        await manager.broadcast({"type": "user_typing", "seq": i})
+        await settle()
+
+    # Ephemeral events overflowing the queue are dropped, not fatal
+    assert stalled in manager.outboxes
+    assert sum(m["type"] == "user_typing" for m in healthy.sent) == queue_size + 5
+
+    for _ in range(queue_size):
+        await manager.broadcast({"type": "notification"})
+        await settle()
+
+    # Events that must not be lost evict the slow client instead
+    assert stalled not in manager.outboxes
+    assert stalled.closed_with is not None
+
+
+@pytest.mark.asyncio
+async def test_msgpack_subprotocol_is_negotiated(manager):
+    legacy, compact = FakeWebSocket(), FakeWebSocket(subprotocols=[MSGPACK_SUBPROTOCOL])
+    await manager.connect(legacy, make_user(1))
+    await manager.connect(compact, make_user(2))
+    await manager.broadcast({"type": "user_typing", "user_id": 3, "timestamp": "2024-01-20T10:00:00"})
+    await settle()
+
+    assert legacy.subprotocol is None
+    assert legacy.sent[-1]["timestamp"] == "2024-01-20T10:00:00"
+
+    assert compact.subprotocol == MSGPACK_SUBPROTOCOL
+    event = MsgPackCodec().decode(compact.binary_frames[-1])
+    assert event["type"] == "user_typing"
+    assert event["ts"] == 1705744800000
+    assert event["user_id"] == 3
+
+
+def test_msgpack_codec_uses_integer_event_codes():
+    codec = MsgPackCodec()
+    frame = codec.encode({"type": "pong", "timestamp": "2024-01-20T10:00:00"})
+
+    import msgpack
+    assert msgpack.unpackb(frame) == {"t": EVENT_CODES["pong"], "ts": 1705744800000}
+
+
+@pytest.mark.asyncio
+async def test_per_user_connection_cap_evicts_oldest(manager, monkeypatch):
+    monkeypatch.setattr(settings, "WS_MAX_CONNECTIONS_PER_USER", 2)
+    tabs = [FakeWebSocket() for _ in range(3)]
+    for tab in tabs:
+        await manager.connect(tab, make_user(1))
+    await settle()
+
+    assert manager.active_connections[1] == tabs[1:]
+    assert tabs[0].closed_with is not None
+    assert manager.counters["cap_evicted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sweep_closes_idle_sockets(manager, monkeypatch):
+    idle, active = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(idle, make_user(1))
+    await manager.connect(active, make_user(2))
+    manager.last_seen[idle] -= settings.WS_IDLE_TIMEOUT_SECONDS + 1
+
+    await manager.sweep()
+    await settle()
+
+    assert idle.closed_with is not None
+    assert idle not in manager.user_sockets
+    assert active in manager.user_sockets
+    assert isinstance(manager.user_sockets[active], UserSnapshot)
+
+
+@pytest.mark.parametrize("revoked_session, make_token", [
+    (False, lambda: create_refresh_token({"sub": "u1@example.com"}, session_id="s1")),
+    (True, lambda: create_access_token({"sub": "u1@example.com"}, session_id="s1")),
+])
+async def test_websocket_refuses_refresh_and_revoked_tokens(monkeypatch, revoked_session, make_token):
+    async def is_session_revoked(session_id):
+        return revoked_session
+
+    monkeypatch.setattr(revocation_store, "is_session_revoked", is_session_revoked)
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        await get_current_user_websocket(FakeWebSocket(), make_token())
+    assert excinfo.value.code == 1008
+
+
+async def test_malformed_frames_raise_malformed_frame(manager):
+    class FrameSocket(FakeWebSocket):
+        def __init__(self, frame, **kwargs):
+            super().__init__(**kwargs)
+            self.frame = frame
+
+        async def receive(self):
+            return self.frame
+
+    plain = FrameSocket({"type": "websocket.receive", "text": "[1, 2]"})
+    await manager.connect(plain, make_user(1))
+    with pytest.raises(MalformedFrame):
+        await manager.receive(plain)
+
+    packed = FrameSocket({"type": "websocket.receive", "bytes": b"\xc1"}, subprotocols=[MSGPACK_SUBPROTOCOL])
+    await manager.connect(packed, make_user(2))
+    with pytest.raises(MalformedFrame):
+        await manager.receive(packed)
+
+    packed.frame = {"type": "websocket.receive", "bytes": MsgPackCodec().encode({"type": "ping"})}
+    assert (await manager.receive(packed))["type"] == "ping"
+
+
+async def test_fast_reconnect_keeps_backplane_route():
+    class SlowBackplane(Backplane):
+        def __init__(self):
+            super().__init__()
+            self.user_routes = set()
+
+        async def register_user(self, user_id):
+            self.user_routes.add(user_id)
+
+        async def unregister_user(self, user_id):
+            await asyncio.sleep(0)
+            self.user_routes.discard(user_id)
+
+    backplane = SlowBackplane()
+    manager = ConnectionManager(backplane=backplane)
+    first, second = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(first, make_user(1))
+
+    # Tab reload: the old socket closes and a new one connects before the removal runs
+    manager.disconnect(first)
+    await manager.connect(second, make_user(1))
+    await settle()
+    assert backplane.user_routes == {1}
+
+    manager.disconnect(second)
+    await settle()
+    assert backplane.user_routes == set()
+
+
+async def test_chat_stream_keeps_database_calls_off_the_event_loop(manager, monkeypatch):
+    import threading
+    from app.api.v1 import websocket as ws_module
+    from app.core import database
+    from app.services import ai_service, chat_service
+
+    loop_thread = threading.get_ident()
+    db_threads = []
+
+    class FakeSession:
+        def close(self):
+            db_threads.append(threading.get_ident())
+
+    def get_conversation_by_id(db, conversation_id):
+        db_threads.append(threading.get_ident())
+        return SimpleNamespace(user_id=1, messages=["history"])
+
+    def add_message_to_conversation(db, conversation_id, content, role):
+        db_threads.append(threading.get_ident())
+        return SimpleNamespace(id=len(db_threads))
+
+    async def get_ai_response_stream(content, history, user):
+        assert history == ["history"]
+        yield "answer"
+
+    monkeypatch.setattr(database, "SessionLocal", FakeSession)
+    monkeypatch.setattr(chat_service, "get_conversation_by_id", get_conversation_by_id)
+    monkeypatch.setattr(chat_service, "add_message_to_conversation", add_message_to_conversation)
+    monkeypatch.setattr(ai_service, "get_ai_response_stream", get_ai_response_stream)
+    monkeypatch.setattr(ws_module, "manager", manager)
+
+    websocket = FakeWebSocket()
+    user = UserSnapshot.from_user(make_user(1))
+    await manager.connect(websocket, user)
+    await ws_module.stream_chat_response(websocket, user, "r1", 5, "question")
+    await settle()
+
+    assert [frame["type"] for frame in websocket.sent if frame["type"].startswith("chat_")] == [
+        "chat_start", "chat_chunk", "chat_complete"
+    ]
+    assert len(db_threads) == 4
+    assert loop_thread not in db_threads